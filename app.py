@@ -1,50 +1,99 @@
 '''
 Arquivo principal da aplicação Flask. 
 Inicializa a aplicação, registra os blueprints e define a rota principal.
+
+create_app() monta uma aplicação nova (útil para testes e ferramentas); o
+módulo expõe `app = create_app()` para o gunicorn (app:app). Os subsistemas
+pesados só são importados quando usados: o cliente da IA (e o requests) na
+primeira conversa e o Pillow no primeiro upload de imagem.
 '''
 import os
 import logging
 from flask import Flask, render_template
 
-# Importar Blueprints e funções de inicialização
 import db
-from routes.auth import auth_bp
-from routes.feed import feed_bp
-from routes.games import games_bp
-from routes.ia import ia_bp
-
-# Criação da aplicação Flask
-app = Flask(__name__)
 
-# Configuração da aplicação
 BASE_DIR = os.path.dirname(__file__)
 UPLOAD_ROOT = os.path.join(BASE_DIR, 'static', 'uploads')
 
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'supersecretkey')
-app.config['UPLOAD_FOLDER'] = UPLOAD_ROOT
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB
 
-# Configuração de logging
-app.logger.setLevel(logging.INFO)
-if not app.logger.handlers:
-    logging.basicConfig(level=logging.INFO)
+def _configure(app, config):
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'supersecretkey')
+    app.config['UPLOAD_FOLDER'] = UPLOAD_ROOT
+    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB
+    app.config['FEED_PAGE_SIZE'] = int(os.environ.get('FEED_PAGE_SIZE', 20))
+    app.config['FEED_COMMENTS_PREVIEW'] = int(os.environ.get('FEED_COMMENTS_PREVIEW', 3))
+    app.config['USER_CACHE_TTL'] = float(os.environ.get('USER_CACHE_TTL', 0))  # 0 = desativado
+    app.config['SCORE_WRITE_MODE'] = os.environ.get('SCORE_WRITE_MODE', 'direct')  # direct | group | async
+    # 0 = aceita score direto em /api/jogos/score(s) (benchmarks); 1 = só via sessão com log
+    app.config['GAME_REQUIRE_SESSION'] = os.environ.get('GAME_REQUIRE_SESSION', '1') == '1'
+    app.config['IA_HISTORY_SIZE'] = int(os.environ.get('IA_HISTORY_SIZE', 30))
+    if config:
+        app.config.update(config)
+
+
+def _register_blueprints(app):
+    # Importados aqui, e não no topo do módulo, para só pesarem quando a aplicação é montada
+    from routes.auth import auth_bp
+    from routes.feed import feed_bp
+    from routes.games import games_bp
+    from routes.ia import ia_bp
+    from routes.search import search_bp
+    from routes.live import live_bp
+    from routes.api import api_bp
+
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(feed_bp)
+    app.register_blueprint(games_bp)
+    app.register_blueprint(ia_bp)
+    app.register_blueprint(search_bp)
+    app.register_blueprint(live_bp)
+    app.register_blueprint(api_bp)
+
+
+def create_app(config=None):
+    '''Cria e configura a aplicação Flask; `config` sobrescreve as chaves lidas do ambiente.'''
+    import assets
+    import media
+    import metrics
+
+    app = Flask(__name__)
+    _configure(app, config)
+
+    # Configuração de logging
+    app.logger.setLevel(logging.INFO)
+    if not app.logger.handlers:
+        logging.basicConfig(level=logging.INFO)
+
+    # Pool de conexões SQLite (uma por thread, liberada ao fim da requisição)
+    db.init_app(app)
+
+    # Latência, SQL e templates por endpoint em /metrics (registrado antes dos outros hooks)
+    metrics.init_app(app)
+
+    # URLs versionadas e cabeçalhos de cache para static/
+    assets.init_app(app)
+
+    # Cache imutável para os arquivos do store de mídia (nome = hash do conteúdo)
+    media.init_app(app)
+
+    _register_blueprints(app)
+
+    # Rota principal
+    @app.route('/')
+    def home():
+        '''Página inicial da aplicação.'''
+        user = db.current_user()
+        return render_template('home.html', user=user)
+
+    return app
 
-# Registrar Blueprints
-app.register_blueprint(auth_bp)
-app.register_blueprint(feed_bp)
-app.register_blueprint(games_bp)
-app.register_blueprint(ia_bp)
 
-# Rota principal
-@app.route('/')
-def home():
-    '''Página inicial da aplicação.'''
-    user = db.current_user()
-    return render_template('home.html', user=user)
+app = create_app()
 
 # Ponto de entrada da aplicação
 if __name__ == '__main__':
-    # Garante que o DB seja inicializado antes de rodar a aplicação
+    # Garante que o DB esteja no schema atual (só um PRAGMA se já estiver)
     with app.app_context():
         db.init_db()
     
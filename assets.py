@@ -0,0 +1,165 @@
+'''
+Fingerprint dos arquivos estáticos e cabeçalhos de cache.
+
+Na inicialização (ou no build, com build_assets.py) cada arquivo de static/
+recebe um hash do conteúdo, e url_for('static', ...) passa a gerar
+/static/<arquivo>?v=<hash>. Uma URL com o hash atual é servida com
+Cache-Control: immutable por um ano; as demais (inclusive uploads) continuam
+com validação por ETag/Last-Modified. Se existir um irmão .br/.gz pré-comprimido
+do conteúdo atual e o cliente aceitar a codificação (q > 0), ele é servido no
+lugar do original. O precompress() põe o hash do manifesto no nome do irmão
+(<arquivo>.<hash>.gz); um irmão gerado de outro conteúdo tem outro nome e é
+ignorado, mesmo que o deploy (Docker COPY, rsync -t) preserve os mtimes.
+'''
+import os
+import glob
+import json
+import gzip
+import hashlib
+import logging
+import mimetypes
+
+from flask import request, send_from_directory
+from werkzeug.security import safe_join
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'manifest.json'
+# uploads/ é conteúdo de usuário: fora do manifesto (o store de mídia tem cache próprio)
+EXCLUDED_DIRS = {'uploads'}
+COMPRESSED_SUFFIXES = (('br', '.br'), ('gzip', '.gz'))
+COMPRESSIBLE_TYPES = ('.css', '.js', '.html', '.svg', '.json', '.txt')
+IMMUTABLE_MAX_AGE = 31536000
+
+
+def _iter_files(static_root):
+    for dirpath, dirnames, filenames in os.walk(static_root):
+        if os.path.relpath(dirpath, static_root) == '.':
+            dirnames[:] = [d for d in dirnames if d not in EXCLUDED_DIRS]
+        for filename in filenames:
+            if filename == MANIFEST_NAME or filename.endswith(('.gz', '.br')):
+                continue
+            full_path = os.path.join(dirpath, filename)
+            yield os.path.relpath(full_path, static_root).replace(os.sep, '/'), full_path
+
+
+def file_hash(full_path):
+    digest = hashlib.sha256()
+    with open(full_path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def build_manifest(static_root):
+    """Calcula {caminho relativo: hash} para todos os arquivos de static/ (exceto uploads)."""
+    return {rel: file_hash(full) for rel, full in _iter_files(static_root)}
+
+
+def load_manifest(static_root):
+    """Lê static/manifest.json gerado no build ou, se não existir, calcula na hora."""
+    path = os.path.join(static_root, MANIFEST_NAME)
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as fh:
+            return json.load(fh)
+    return build_manifest(static_root)
+
+
+def compressed_name(rel, version, suffix):
+    """Nome do irmão pré-comprimido de rel com o hash `version` do manifesto."""
+    return f'{rel}.{version}{suffix}'
+
+
+def precompress(static_root, manifest):
+    """Gera irmãos .gz (e .br, se o módulo brotli estiver instalado) dos arquivos de texto.
+
+    Os irmãos de builds anteriores (outro hash no nome) são apagados.
+    Retorna a quantidade de arquivos gerados.
+    """
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+    written = 0
+    for rel, version in manifest.items():
+        if not rel.endswith(COMPRESSIBLE_TYPES):
+            continue
+        full_path = os.path.join(static_root, rel)
+        with open(full_path, 'rb') as fh:
+            data = fh.read()
+        siblings = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            siblings.append(('.br', brotli.compress(data)))
+        for suffix, compressed in siblings:
+            for old in glob.glob(glob.escape(full_path) + '.' + '[0-9a-f]' * len(version) + suffix):
+                os.unlink(old)
+            with open(os.path.join(static_root, compressed_name(rel, version, suffix)), 'wb') as out:
+                out.write(compressed)
+            written += 1
+    return written
+
+
+def _accepted_encodings():
+    """Codificações aceitas pelo cliente (q > 0); '*' vale para as não listadas."""
+    accepted, refused = set(), set()
+    for part in request.headers.get('Accept-Encoding', '').split(','):
+        coding, *params = [item.strip() for item in part.split(';')]
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        (accepted if quality > 0 else refused).add(coding.lower())
+    if '*' in accepted:
+        accepted.update(encoding for encoding, _ in COMPRESSED_SUFFIXES if encoding not in refused)
+    return accepted
+
+
+def init_app(app):
+    """Registra o manifesto, o url_for com versão e a view de static com cache."""
+    if not app.config.get('ASSET_FINGERPRINT', True):
+        return
+    static_root = app.static_folder
+    manifest = load_manifest(static_root)
+    app.extensions['asset_manifest'] = manifest
+    logger.info("Asset manifest loaded with %s files", len(manifest))
+
+    @app.url_defaults
+    def add_asset_version(endpoint, values):
+        if endpoint == 'static' and 'v' not in values:
+            version = manifest.get(values.get('filename'))
+            if version:
+                values['v'] = version
+
+    def static_with_cache(filename):
+        response = None
+        accepted = _accepted_encodings()
+        current = manifest.get(filename)
+        for encoding, suffix in COMPRESSED_SUFFIXES:
+            if encoding not in accepted or not current:
+                continue
+            sibling = compressed_name(filename, current, suffix)
+            candidate = safe_join(static_root, sibling)
+            if candidate and os.path.isfile(candidate):
+                mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+                response = send_from_directory(static_root, sibling, mimetype=mimetype)
+                response.headers['Content-Encoding'] = encoding
+                break
+        if response is None:
+            response = app.send_static_file(filename)
+        if filename.endswith(COMPRESSIBLE_TYPES):
+            response.vary.add('Accept-Encoding')
+        version = request.args.get('v')
+        if version and version == manifest.get(filename) and response.status_code in (200, 304):
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = IMMUTABLE_MAX_AGE
+            response.cache_control.immutable = True
+        return response
+
+    app.view_functions['static'] = static_with_cache
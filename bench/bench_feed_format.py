@@ -0,0 +1,104 @@
+'''
+Benchmark: custo por linha da formatação dos posts do feed.
+
+Gera um banco temporário com N posts (com mídia e poucos autores distintos) e
+mede, dentro de um contexto de requisição, a formatação antiga (fromisoformat +
+strftime, url_for do avatar por post, tipo da mídia pelo nome do arquivo)
+contra a atual (routes.common.format_post: media_type gravado no upload, avatar
+resolvido uma vez por usuário e timestamp memoizado).
+
+Uso: python bench/bench_feed_format.py --rows 10000 --users 200
+'''
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import db  # noqa: E402
+import media  # noqa: E402
+
+
+def seed(rows, users):
+    conn = db.get_db_connection()
+    with conn:
+        conn.executemany('INSERT INTO users (id, username, email, password_hash, avatar_path) VALUES (?, ?, ?, ?, ?)',
+                         ((i, f'u{i}', f'u{i}@bench', 'x', f'uploads/avatar_{i}.png') for i in range(1, users + 1)))
+        posts = []
+        for i in range(rows):
+            media_path = random.choice((None, f'uploads/p{i}.jpg', f'uploads/p{i}.mp4'))
+            created_at = f'2025-{random.randint(1, 12):02d}-{random.randint(1, 28):02d} ' \
+                         f'{random.randint(0, 23):02d}:{random.randint(0, 59):02d}:{random.randint(0, 59):02d}'
+            posts.append((random.randint(1, users), f'post {i}', media_path, media.media_kind(media_path), created_at))
+        conn.executemany('INSERT INTO posts (user_id, content, media_path, media_type, created_at) VALUES (?, ?, ?, ?, ?)',
+                         posts)
+    rows = conn.execute('''SELECT p.*, u.username, u.display_name, u.avatar_path, u.avatar_thumb_path
+                           FROM posts p JOIN users u ON p.user_id = u.id''').fetchall()
+    conn.close()
+    return rows
+
+
+def legacy_format(p, url_for):
+    """Formatação como era antes: tudo recalculado a cada linha."""
+    avatar = url_for('static', filename=p['avatar_path']) if p['avatar_path'] \
+        else url_for('static', filename='img/default-avatar.png')
+    return {
+        'id': p['id'],
+        'content': p['content'],
+        'media_url': url_for('static', filename=p['media_path']) if p['media_path'] else None,
+        'media_preview_url': url_for('static', filename=p['media_preview_path'] or p['media_path']) if p['media_path'] else None,
+        'media_poster_url': url_for('static', filename=p['media_poster_path']) if p['media_poster_path'] else None,
+        'is_image': p['media_path'] and p['media_path'].split('.')[-1].lower() in {'png', 'jpg', 'jpeg', 'gif'},
+        'is_video': p['media_path'] and p['media_path'].split('.')[-1].lower() in {'mp4', 'mov', 'webm'},
+        'author': {'id': p['user_id'], 'username': p['username'], 'display_name': p['display_name'],
+                   'avatar_url': avatar},
+        'created_at_human': datetime.fromisoformat(p['created_at']).strftime('%d/%m/%Y %H:%M'),
+        'comments': [],
+        'comments_total': 0,
+        'comments_hidden': 0,
+    }
+
+
+def timed(label, fn, rows):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<28} {elapsed * 1000:9.1f} ms total  {elapsed / rows * 1e6:7.2f} µs/linha")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Comparar a formatação antiga e a atual dos posts do feed.")
+    parser.add_argument("--rows", type=int, default=10_000, help="Posts no feed")
+    parser.add_argument("--users", type=int, default=200, help="Autores distintos")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix='bench_feed_')
+    db.DB_PATH = os.path.join(tmp_dir, 'database.db')
+    try:
+        db.init_db()
+        rows = seed(args.rows, args.users)
+
+        from flask import url_for
+        from app import app
+        from routes.common import format_post
+
+        print(f"{args.rows} posts, {args.users} autores")
+        with app.test_request_context('/feed'):
+            before = timed('formatação antiga', lambda: [legacy_format(p, url_for) for p in rows], args.rows)
+        db.format_timestamp.cache_clear()
+        with app.test_request_context('/feed'):
+            after = timed('formatação atual', lambda: [format_post(p, [], 0) for p in rows], args.rows)
+        print(f"  ganho: {before / after:.1f}x")
+    finally:
+        db.close_pool()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
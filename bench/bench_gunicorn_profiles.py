@@ -0,0 +1,82 @@
+'''
+Benchmark: perfis do gunicorn.conf.py (sync, gthread, gevent) na mistura de rotas.
+
+Sobe um gunicorn por perfil contra o mesmo banco e o mesmo modelo falso (com
+atraso por palavra, para a rota /ia ser lenta como a de verdade) e roda a
+mistura do bench/load_routes.py. O que interessa é como /feed se comporta
+enquanto há chamadas lentas à IA ocupando workers.
+
+Uso: python bench/bench_gunicorn_profiles.py --db /tmp/bench.db --clients 32 --duration 15
+'''
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+import threading
+import importlib.util
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import load_routes  # noqa: E402
+import seed_db  # noqa: E402
+import stub_model_server  # noqa: E402
+
+PROFILES = ('sync', 'gthread', 'gevent')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Comparar os perfis de worker do gunicorn.")
+    parser.add_argument("--db", help="Banco gerado pelo bench/seed_db.py (padrão: um pequeno, temporário)")
+    parser.add_argument("--profiles", default=','.join(PROFILES), help="Perfis a medir, separados por vírgula")
+    parser.add_argument("--clients", type=int, default=32, help="Clientes concorrentes")
+    parser.add_argument("--duration", type=float, default=10, help="Segundos de medição por perfil")
+    parser.add_argument("--ia-delay", type=float, default=0.02, help="Atraso por palavra do modelo falso")
+    args = parser.parse_args()
+
+    tmp = None
+    if args.db:
+        db_path = os.path.abspath(args.db)
+    else:
+        tmp = tempfile.mkdtemp(prefix='bench_profiles_')
+        db_path = os.path.join(tmp, 'bench.db')
+        seed_db.seed(db_path, **seed_db.SCALES['small'])
+    load_routes.db.DB_PATH = db_path
+    conn = load_routes.db.get_db_connection()
+    users = conn.execute('SELECT MAX(id) FROM users').fetchone()[0]
+    conn.close()
+
+    stub = stub_model_server.serve(port=0, delay=args.ia_delay)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    ia_url = f'http://127.0.0.1:{stub.server_address[1]}'
+
+    results = {}
+    for profile in args.profiles.split(','):
+        if profile == 'gevent' and importlib.util.find_spec('gevent') is None:
+            print("[bench_gunicorn_profiles] gevent não instalado, perfil ignorado")
+            continue
+        proc, base_url = load_routes.start_gunicorn(db_path, ia_url, env={'GUNICORN_PROFILE': profile})
+        try:
+            samples, errors, elapsed = load_routes.run_load(load_routes.HttpTarget(base_url), users,
+                                                            args.clients, args.duration, warmup=2)
+        finally:
+            proc.terminate()
+            proc.wait()
+        results[profile] = load_routes.summarize(samples, errors, elapsed)
+        print(f"Perfil {profile} ({os.cpu_count()} núcleos):")
+        load_routes.print_report(results[profile])
+    stub.shutdown()
+    if tmp:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print(f"  {'perfil':<10} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'/feed p99':>10} {'/ia p99':>9}")
+    for profile, report in results.items():
+        total = report.get('total', {})
+        feed = report.get('GET /feed', {})
+        ia = report.get('POST /ia', {})
+        print(f"  {profile:<10} {total.get('rps', 0):9.1f} {total.get('p50_ms', 0):9.2f} {total.get('p99_ms', 0):9.2f} "
+              f"{feed.get('p99_ms', 0):10.2f} {ia.get('p99_ms', 0):9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+'''
+Benchmark: ranking em memória (leaderboard.py) x consultas SQL com GROUP BY.
+
+Gera um banco temporário com N linhas em scores, aquece o ranking e mede
+"posição do usuário" e "posições X..Y" nos dois caminhos.
+
+Uso: python bench/bench_leaderboard.py --rows 1000000 --users 100000
+'''
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import db  # noqa: E402
+import leaderboard  # noqa: E402
+
+GAMES = ('tetris', 'pacman')
+
+SQL_RANK = (
+    'WITH best AS (SELECT user_id, MAX(score) AS s FROM scores WHERE game = ? GROUP BY user_id) '
+    'SELECT COUNT(*) + 1 FROM best WHERE s > (SELECT s FROM best WHERE user_id = ?)'
+)
+SQL_RANGE = (
+    'SELECT user_id, MAX(score) AS s FROM scores WHERE game = ? '
+    'GROUP BY user_id ORDER BY s DESC LIMIT ? OFFSET ?'
+)
+
+
+def seed(rows, users):
+    conn = db.get_db_connection()
+    with conn:
+        conn.executemany('INSERT INTO users (id, username, email, password_hash) VALUES (?, ?, ?, ?)',
+                         ((i, f'u{i}', f'u{i}@bench', 'x') for i in range(1, users + 1)))
+        conn.executemany('INSERT INTO scores (user_id, game, score) VALUES (?, ?, ?)',
+                         ((random.randint(1, users), random.choice(GAMES), random.randint(0, 100000))
+                          for _ in range(rows)))
+    db.rebuild_best_scores(conn)
+    conn.close()
+
+
+def timed(label, fn, queries):
+    start = time.perf_counter()
+    for _ in range(queries):
+        fn()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<28} {elapsed / queries * 1000:9.3f} ms/consulta")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Comparar ranking em memória com SQL.")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Linhas em scores")
+    parser.add_argument("--users", type=int, default=100_000, help="Usuários distintos")
+    parser.add_argument("--queries", type=int, default=20, help="Consultas por medição")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='bench_leaderboard_')
+    db.DB_PATH = os.path.join(tmp, 'bench.db')
+    db.init_db()
+    print(f"[bench_leaderboard] Gerando {args.rows} scores para {args.users} usuários em {db.DB_PATH}")
+    t0 = time.perf_counter()
+    seed(args.rows, args.users)
+    print(f"[bench_leaderboard] Seed em {time.perf_counter() - t0:.1f}s")
+
+    board = leaderboard.Leaderboard()
+    t0 = time.perf_counter()
+    board.warm()
+    print(f"[bench_leaderboard] Aquecimento do ranking em {time.perf_counter() - t0:.2f}s")
+
+    conn = db.get_db_connection()
+    game = 'tetris'
+    sample = [random.randint(1, args.users) for _ in range(args.queries)]
+    it = iter(sample * 2)
+
+    print("Posição do usuário:")
+    timed('SQL (GROUP BY)', lambda: conn.execute(SQL_RANK, (game, next(it))).fetchone(), args.queries)
+    timed('memória (skip list)', lambda: board.rank(game, next(it)), args.queries)
+
+    print("Posições 500..520:")
+    timed('SQL (GROUP BY + OFFSET)', lambda: conn.execute(SQL_RANGE, (game, 21, 499)).fetchall(), args.queries)
+    timed('memória (skip list)', lambda: board.range(game, 500, 520), args.queries)
+
+    print("Atualização de recorde:")
+    timed('memória (skip list)',
+          lambda: board.record(game, random.randint(1, args.users), random.randint(0, 200000)),
+          args.queries * 100)
+    conn.close()
+    shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+'''
+Benchmark: busca em posts.content com LIKE '%termo%' x FTS5 (posts_fts + bm25).
+
+Gera um banco temporário com N posts de texto sintético (os triggers do FTS5
+indexam na inserção) e mede a primeira página de resultados para termos raros,
+médios e comuns nos dois caminhos. O LIKE devolve os mais recentes que casam
+(sem relevância); o FTS5 ordena por bm25 entre os MAX_CANDIDATES mais novos.
+
+Uso: python bench/bench_search.py --rows 1000000
+'''
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import itertools
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import db  # noqa: E402
+from routes.search import search  # noqa: E402
+
+# Vocabulário com frequências bem diferentes (distribuição de Zipf)
+WORDS = [f'palavra{i}' for i in range(20000)]
+CUM_WEIGHTS = list(itertools.accumulate(1 / (i + 1) for i in range(len(WORDS))))
+QUERIES = {'comum': 'palavra1', 'médio': 'palavra500', 'raro': 'palavra15000'}
+
+LIKE_SQL = '''SELECT p.id, p.content FROM posts p
+              WHERE p.content LIKE ? ORDER BY p.created_at DESC, p.id DESC LIMIT ?'''
+
+
+def seed(rows):
+    conn = db.get_db_connection()
+    with conn:
+        conn.execute("INSERT INTO users (id, username, email, password_hash) VALUES (1, 'bench', 'bench@x', 'x')")
+        batch = 50_000
+        for start in range(0, rows, batch):
+            conn.executemany('INSERT INTO posts (user_id, content) VALUES (1, ?)',
+                             ((' '.join(random.choices(WORDS, cum_weights=CUM_WEIGHTS, k=12)),)
+                              for _ in range(min(batch, rows - start))))
+    conn.close()
+
+
+def timed(label, fn, queries):
+    start = time.perf_counter()
+    for _ in range(queries):
+        fn()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<28} {elapsed / queries * 1000:9.3f} ms/consulta")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Comparar busca com LIKE e com FTS5.")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Posts no banco")
+    parser.add_argument("--queries", type=int, default=5, help="Consultas por medição")
+    parser.add_argument("--limit", type=int, default=20, help="Tamanho da página de resultados")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='bench_search_')
+    db.DB_PATH = os.path.join(tmp, 'database.db')
+    db.init_db()
+    t0 = time.perf_counter()
+    seed(args.rows)
+    print(f"[bench_search] {args.rows} posts inseridos e indexados em {time.perf_counter() - t0:.2f}s")
+
+    conn = db.get_db_connection()
+    for label, term in QUERIES.items():
+        print(f"Termo {label} ({term}):")
+        timed('LIKE %termo%', lambda: conn.execute(LIKE_SQL, (f'%{term} %', args.limit)).fetchall(), args.queries)
+        timed('FTS5 MATCH + bm25', lambda: search(conn, 'posts', term, 1, args.limit), args.queries)
+    conn.close()
+    shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+'''
+Benchmark: tempo de inicialização (imports da aplicação e init_db).
+
+Roda "python -X importtime -c 'import app'" em processos novos e soma o tempo
+cumulativo dos imports de primeiro nível que o interpretador vazio não faz
+(site, .pth etc. ficam de fora). A variante "eager" importa junto o requests e
+o Pillow, como acontecia antes do carregamento sob demanda. Também mede
+db.init_db() num banco novo (todo o DDL) e num banco já atualizado (só o
+PRAGMA user_version).
+
+Uso: python bench/bench_startup.py --runs 7
+'''
+import os
+import re
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+VARIANTS = {
+    'lazy (import app)': 'import app',
+    'eager (+ requests, PIL)': 'import app, requests, PIL.Image, PIL.ImageOps',
+}
+_LINE_RE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)')
+
+
+def importtime(code, env):
+    """Retorna ({módulo de primeiro nível: µs cumulativos}, {módulo: µs}, segundos de parede)."""
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    wall = time.perf_counter() - start
+    top, everything = {}, {}
+    for line in result.stderr.splitlines():
+        match = _LINE_RE.match(line)
+        if not match:
+            continue
+        cumulative, indent, name = int(match.group(2)), len(match.group(3)), match.group(4)
+        everything[name] = cumulative
+        if indent == 1:
+            top[name] = cumulative
+    return top, everything, wall
+
+
+def measure(code, runs, env, baseline):
+    totals, walls, heaviest = [], [], {}
+    for _ in range(runs):
+        top, everything, wall = importtime(code, env)
+        totals.append(sum(us for name, us in top.items() if name not in baseline) / 1000)
+        walls.append(wall * 1000)
+        for name, us in everything.items():
+            if name not in baseline:
+                heaviest.setdefault(name, []).append(us / 1000)
+    return statistics.median(totals), statistics.median(walls), heaviest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Medir o tempo de inicialização da aplicação.")
+    parser.add_argument("--runs", type=int, default=5, help="Processos por variante (usa a mediana)")
+    parser.add_argument("--top", type=int, default=10, help="Módulos mais pesados a listar")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='bench_startup_')
+    env = dict(os.environ, DATABASE_PATH=os.path.join(tmp, 'database.db'))
+    _, baseline_all, _ = importtime('pass', env)
+    _, empty_wall, _ = measure('pass', args.runs, env, baseline_all)
+    print(f"[bench_startup] interpretador vazio: {empty_wall:.1f} ms de parede (descontado abaixo)")
+    for label, code in VARIANTS.items():
+        total, wall, heaviest = measure(code, args.runs, env, baseline_all)
+        print(f"  {label:<26} imports {total:7.1f} ms   processo {wall - empty_wall:7.1f} ms")
+        if code == 'import app':
+            ranked = sorted(heaviest.items(), key=lambda item: statistics.median(item[1]), reverse=True)
+            for name, values in ranked[1:args.top + 1]:
+                print(f"      {name:<32} {statistics.median(values):7.1f} ms")
+
+    import db
+    db.DB_PATH = env['DATABASE_PATH']
+    t0 = time.perf_counter()
+    db.init_db()
+    fresh = time.perf_counter() - t0
+    current = []
+    for _ in range(args.runs):
+        t0 = time.perf_counter()
+        db.init_db()
+        current.append(time.perf_counter() - t0)
+    print(f"  init_db banco novo        {fresh * 1000:7.1f} ms")
+    print(f"  init_db schema atual      {statistics.median(current) * 1000:7.2f} ms")
+    shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
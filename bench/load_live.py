@@ -0,0 +1,156 @@
+'''
+Teste de carga das conexões ao vivo (/api/eventos) ociosas.
+
+Sobe um gunicorn "web" (GUNICORN_PROFILE=gthread) e, com --live, um segundo
+gunicorn só para as conexões SSE (GUNICORN_PROFILE=live), os dois com
+EVENT_BUS=sqlite. Abre --streams conexões SSE ociosas com a mesma sessão e
+mede, com elas abertas:
+
+  - quantas foram aceitas (200) e quantas caíram no polling (503);
+  - a latência de GET /feed no processo web;
+  - quanto tempo um post novo leva para chegar a todas as conexões aceitas.
+
+Sem --live as conexões vão para o próprio processo web, o que mostra o limite
+de conexões SSE do perfil gthread.
+
+Uso: python bench/load_live.py --db /tmp/bench.db --streams 2000 --live
+'''
+import os
+import sys
+import time
+import shutil
+import socket
+import argparse
+import tempfile
+import selectors
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import load_routes  # noqa: E402
+import seed_db  # noqa: E402
+import stub_model_server  # noqa: E402
+
+
+def _login(base_url):
+    import requests
+    session = requests.Session()
+    resp = session.post(base_url + '/login', data={'identifier': 'user1', 'password': seed_db.PASSWORD},
+                        allow_redirects=False, timeout=30)
+    if resp.status_code != 302 or 'session' not in session.cookies:
+        raise SystemExit(f"[load_live] Login falhou ({resp.status_code})")
+    return session
+
+
+def open_streams(base_url, cookie, count):
+    """Abre `count` conexões SSE; retorna (sockets aceitos, {status: quantidade})."""
+    host, port = base_url.rsplit('/', 1)[1].split(':')
+    request = (f'GET /api/eventos?tipos=post HTTP/1.1\r\nHost: {host}:{port}\r\n'
+               f'Cookie: session={cookie}\r\nAccept: text/event-stream\r\n\r\n').encode()
+    pending = []
+    for _ in range(count):
+        sock = socket.create_connection((host, int(port)), timeout=30)
+        sock.sendall(request)
+        pending.append(sock)
+    accepted, statuses = [], {}
+    for sock in pending:
+        try:
+            status = int(sock.recv(4096).split(b' ', 2)[1])
+        except (OSError, IndexError, ValueError):
+            status = 0
+        statuses[status] = statuses.get(status, 0) + 1
+        if status == 200:
+            accepted.append(sock)
+        else:
+            sock.close()
+    return accepted, statuses
+
+
+def wait_for_post(socks, timeout):
+    """Espera o evento 'post' em todas as conexões; retorna (recebidas, segundos)."""
+    selector = selectors.DefaultSelector()
+    for sock in socks:
+        sock.setblocking(False)
+        selector.register(sock, selectors.EVENT_READ)
+    start = time.perf_counter()
+    received = 0
+    while received < len(socks) and time.perf_counter() - start < timeout:
+        for key, _ in selector.select(timeout=0.5):
+            try:
+                chunk = key.fileobj.recv(65536)
+            except BlockingIOError:
+                continue
+            if b'event: post' in chunk or not chunk:
+                selector.unregister(key.fileobj)
+                received += bool(chunk)
+    selector.close()
+    return received, time.perf_counter() - start
+
+
+def feed_latency(session, base_url, requests_count):
+    samples = []
+    for _ in range(requests_count):
+        start = time.perf_counter()
+        session.get(base_url + '/feed', timeout=60)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples[len(samples) // 2] * 1000, samples[min(len(samples) - 1, len(samples) * 99 // 100)] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga das conexões SSE ociosas.")
+    parser.add_argument("--db", help="Banco gerado pelo bench/seed_db.py (padrão: um pequeno, temporário)")
+    parser.add_argument("--streams", type=int, default=1000, help="Conexões SSE abertas")
+    parser.add_argument("--live", action="store_true", help="Conexões SSE num gunicorn separado (perfil live)")
+    parser.add_argument("--feed-requests", type=int, default=50, help="GET /feed medidos com as conexões abertas")
+    args = parser.parse_args()
+
+    tmp = None
+    if args.db:
+        db_path = os.path.abspath(args.db)
+    else:
+        tmp = tempfile.mkdtemp(prefix='load_live_')
+        db_path = os.path.join(tmp, 'bench.db')
+        seed_db.seed(db_path, **seed_db.SCALES['small'])
+    stub = stub_model_server.serve(port=0)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    ia_url = f'http://127.0.0.1:{stub.server_address[1]}'
+
+    procs = []
+    socks = []
+    try:
+        web, web_url = load_routes.start_gunicorn(db_path, ia_url, env={'GUNICORN_PROFILE': 'gthread',
+                                                                        'EVENT_BUS': 'sqlite'})
+        procs.append(web)
+        live_url = web_url
+        if args.live:
+            live, live_url = load_routes.start_gunicorn(db_path, ia_url, env={'GUNICORN_PROFILE': 'live',
+                                                                              'EVENT_BUS': 'sqlite'})
+            procs.append(live)
+        session = _login(web_url)
+        print(f"[load_live] web={web_url} sse={live_url} conexões={args.streams}")
+
+        start = time.perf_counter()
+        socks, statuses = open_streams(live_url, session.cookies['session'], args.streams)
+        print(f"[load_live] Conexões abertas em {time.perf_counter() - start:.1f}s: "
+              + ', '.join(f'{status}={count}' for status, count in sorted(statuses.items())))
+
+        p50, p99 = feed_latency(session, web_url, args.feed_requests)
+        print(f"[load_live] GET /feed com as conexões abertas: p50={p50:.1f} ms p99={p99:.1f} ms")
+
+        session.post(web_url + '/api/posts', json={'content': 'post de carga ao vivo'}, timeout=30)
+        received, elapsed = wait_for_post(socks, timeout=30)
+        print(f"[load_live] Post entregue a {received}/{len(socks)} conexões em {elapsed:.2f}s")
+    finally:
+        for sock in socks:
+            sock.close()
+        for proc in procs:
+            proc.terminate()
+            proc.wait()
+        stub.shutdown()
+        if tmp:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+'''
+Teste de carga das rotas principais com latência p50/p99 e baseline salvo.
+
+Mistura ponderada de /feed, /jogos/ranking, POST /api/jogos/score,
+/user/<id> e POST /ia (contra o bench/stub_model_server.py), disparada por
+clientes concorrentes já logados. Dois alvos:
+
+  --target client    test client do Flask no próprio processo (sem rede)
+  --target gunicorn  um gunicorn de verdade, iniciado com DATABASE_PATH e
+                     IA_URL apontando para o banco e o modelo falso
+
+Nos dois alvos GAME_REQUIRE_SESSION=0: com o padrão (1) o POST /api/jogos/score
+responde 403 e a mistura mediria só a recusa. A rota mede a gravação do score
+(escrita em grupo, ranking, evento); a validação do log da sessão de jogo roda
+fora da requisição, num pool próprio, e não entra nesta conta.
+
+Sem --db, um banco pequeno é gerado com bench/seed_db.py num diretório
+temporário. --save-baseline grava os números em bench/baselines/ e --compare
+falha (código de saída 1) se o p50 ou o p99 de alguma rota piorar mais que
+--tolerance em relação ao baseline. Os baselines versionados em
+bench/baselines/ foram gravados com o banco pequeno padrão, 8 clientes e 10 s;
+compare na mesma máquina ou grave um novo (o arquivo guarda o número de núcleos),
+e --save-baseline se recusa a gravar se alguma rota respondeu com erro.
+
+Uso: python bench/load_routes.py --db /tmp/bench.db --clients 8 --duration 15
+     python bench/load_routes.py --db /tmp/bench.db --target gunicorn --workers 4 --compare
+'''
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import socket
+import argparse
+import itertools
+import tempfile
+import threading
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import db  # noqa: E402
+import seed_db  # noqa: E402
+import stub_model_server  # noqa: E402
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+
+# (rota, peso): proporção aproximada de um dia normal de uso
+MIX = (
+    ('GET /feed', 40),
+    ('GET /jogos/ranking', 20),
+    ('POST /api/jogos/score', 20),
+    ('GET /user/<id>', 15),
+    ('POST /ia', 5),
+)
+
+
+class TestClientTarget:
+    """Requisições pelo test client do Flask (um cliente com cookies por thread)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def client(self):
+        return self.app.test_client()
+
+    @staticmethod
+    def get(client, path):
+        return client.get(path).status_code
+
+    @staticmethod
+    def post(client, path, data=None, json_body=None):
+        return client.post(path, data=data, json=json_body).status_code
+
+
+class HttpTarget:
+    """Requisições HTTP de verdade (requests.Session por thread) contra base_url."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+
+    def client(self):
+        import requests
+        return requests.Session()
+
+    def get(self, client, path):
+        return client.get(self.base_url + path, allow_redirects=False, timeout=60).status_code
+
+    def post(self, client, path, data=None, json_body=None):
+        return client.post(self.base_url + path, data=data, json=json_body,
+                           allow_redirects=False, timeout=60).status_code
+
+
+def _request(target, client, route, rng, users, counter):
+    if route == 'GET /feed':
+        return target.get(client, '/feed')
+    if route == 'GET /jogos/ranking':
+        return target.get(client, '/jogos/ranking')
+    if route == 'POST /api/jogos/score':
+        return target.post(client, '/api/jogos/score',
+                           json_body={'game': rng.choice(seed_db.GAMES), 'score': rng.randint(0, 500) * 10})
+    if route == 'GET /user/<id>':
+        return target.get(client, f'/user/{rng.randint(1, users)}')
+    # Mensagem única para não cair no cache de respostas da IA
+    return target.post(client, '/ia', data={'message': f'mensagem de carga {next(counter)}'})
+
+
+def run_load(target, users, clients, duration, warmup, seed=42):
+    """Roda a mistura por `duration` segundos; retorna ({rota: [latências]}, erros, segundos)."""
+    routes = [route for route, _ in MIX]
+    weights = [weight for _, weight in MIX]
+    counter = itertools.count()
+    samples = {route: [] for route in routes}
+    errors = {}
+    lock = threading.Lock()
+    ready = threading.Barrier(clients + 1)
+    stop_at = [0.0]
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        client = target.client()
+        credentials = {'identifier': f'user{rng.randint(1, users)}', 'password': seed_db.PASSWORD}
+        login = target.post(client, '/login', data=credentials)
+        for _ in range(20):
+            if login != 429:
+                break
+            time.sleep(0.2 + rng.random())  # fila de hash de senhas cheia: tenta de novo, como um usuário
+            login = target.post(client, '/login', data=credentials)
+        if login != 302:
+            ready.abort()
+            raise RuntimeError(f"login falhou (HTTP {login})")
+        for _ in range(warmup):
+            _request(target, client, rng.choices(routes, weights)[0], rng, users, counter)
+        local = {route: [] for route in routes}
+        local_errors = {}
+        ready.wait()
+        while time.perf_counter() < stop_at[0]:
+            route = rng.choices(routes, weights)[0]
+            start = time.perf_counter()
+            status = _request(target, client, route, rng, users, counter)
+            local[route].append(time.perf_counter() - start)
+            if status >= 400:
+                local_errors[route] = local_errors.get(route, 0) + 1
+        with lock:
+            for route, values in local.items():
+                samples[route].extend(values)
+            for route, count in local_errors.items():
+                errors[route] = errors.get(route, 0) + count
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    try:
+        ready.wait()  # todos logados e aquecidos
+    except threading.BrokenBarrierError:
+        raise SystemExit("[load_routes] Um cliente não conseguiu fazer login")
+    start = time.perf_counter()
+    stop_at[0] = start + duration
+    for t in threads:
+        t.join()
+    return samples, errors, time.perf_counter() - start
+
+
+def _percentile(values, pct):
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def summarize(samples, errors, elapsed):
+    """Resumo por rota (p50/p99 em ms, req/s, erros) e do total."""
+    report = {}
+    everything = []
+    for route, values in samples.items():
+        if not values:
+            continue
+        values.sort()
+        everything.extend(values)
+        report[route] = {'requests': len(values), 'p50_ms': round(_percentile(values, 50) * 1000, 2),
+                         'p99_ms': round(_percentile(values, 99) * 1000, 2),
+                         'rps': round(len(values) / elapsed, 1), 'errors': errors.get(route, 0)}
+    everything.sort()
+    if everything:
+        report['total'] = {'requests': len(everything), 'p50_ms': round(_percentile(everything, 50) * 1000, 2),
+                           'p99_ms': round(_percentile(everything, 99) * 1000, 2),
+                           'rps': round(len(everything) / elapsed, 1), 'errors': sum(errors.values())}
+    return report
+
+
+def print_report(report):
+    print(f"  {'rota':<24} {'reqs':>7} {'p50 ms':>9} {'p99 ms':>9} {'req/s':>9} {'erros':>6}")
+    for route, row in report.items():
+        print(f"  {route:<24} {row['requests']:7d} {row['p50_ms']:9.2f} {row['p99_ms']:9.2f} "
+              f"{row['rps']:9.1f} {row['errors']:6d}")
+
+
+def compare(report, baseline, tolerance):
+    """Lista as rotas cujo p50/p99 piorou mais que `tolerance` (fração) sobre o baseline."""
+    regressions = []
+    for route, row in report.items():
+        old = baseline.get(route)
+        if not old:
+            continue
+        for key in ('p50_ms', 'p99_ms'):
+            if old[key] and row[key] > old[key] * (1 + tolerance):
+                regressions.append(f"{route} {key}: {old[key]:.2f} -> {row[key]:.2f}")
+    return regressions
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_gunicorn(db_path, ia_url, workers=None, extra_args=(), env=None):
+    """Sobe o gunicorn (com o gunicorn.conf.py do projeto) numa porta livre; retorna (processo, url)."""
+    port = _free_port()
+    env = dict(os.environ, DATABASE_PATH=db_path, IA_URL=ia_url, GAME_REQUIRE_SESSION='0', **(env or {}))
+    cmd = [sys.executable, '-m', 'gunicorn', 'app:app', '-c', os.path.join(ROOT, 'gunicorn.conf.py'),
+           '--bind', f'127.0.0.1:{port}', '--log-level', 'warning', *extra_args]
+    if workers:
+        cmd += ['--workers', str(workers)]
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env)
+    base_url = f'http://127.0.0.1:{port}'
+    import requests
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            requests.get(base_url + '/login', timeout=1)
+            return proc, base_url
+        except requests.ConnectionError:
+            if proc.poll() is not None:
+                raise SystemExit("[load_routes] o gunicorn terminou antes de aceitar conexões")
+            time.sleep(0.2)
+    proc.terminate()
+    raise SystemExit("[load_routes] o gunicorn não respondeu em 30s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga das rotas principais.")
+    parser.add_argument("--db", help="Banco gerado pelo bench/seed_db.py (padrão: um pequeno, temporário)")
+    parser.add_argument("--target", choices=("client", "gunicorn"), default="client")
+    parser.add_argument("--clients", type=int, default=8, help="Clientes concorrentes")
+    parser.add_argument("--duration", type=float, default=10, help="Segundos de medição")
+    parser.add_argument("--warmup", type=int, default=5, help="Requisições de aquecimento por cliente")
+    parser.add_argument("--workers", type=int, help="Workers do gunicorn (padrão: o do gunicorn.conf.py)")
+    parser.add_argument("--gunicorn-arg", action="append", default=[],
+                        help="Argumento extra para o gunicorn (repetível, ex.: --gunicorn-arg=--threads=4)")
+    parser.add_argument("--ia-delay", type=float, default=0.0, help="Atraso por palavra do modelo falso")
+    parser.add_argument("--baseline", help="Arquivo de baseline (padrão: bench/baselines/load_routes-<alvo>.json)")
+    parser.add_argument("--save-baseline", action="store_true", help="Grava os resultados como novo baseline")
+    parser.add_argument("--compare", action="store_true", help="Compara com o baseline e falha se piorar")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Piora aceita no --compare (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    tmp = None
+    if args.db:
+        db_path = os.path.abspath(args.db)
+    else:
+        tmp = tempfile.mkdtemp(prefix='load_routes_')
+        db_path = os.path.join(tmp, 'bench.db')
+        seed_db.seed(db_path, **seed_db.SCALES['small'])
+    db.DB_PATH = db_path
+    conn = db.get_db_connection()
+    users = conn.execute('SELECT MAX(id) FROM users').fetchone()[0]
+    conn.close()
+
+    stub = stub_model_server.serve(port=0, delay=args.ia_delay)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    ia_url = f'http://127.0.0.1:{stub.server_address[1]}'
+
+    proc = None
+    if args.target == 'gunicorn':
+        proc, base_url = start_gunicorn(db_path, ia_url, args.workers, args.gunicorn_arg)
+        target = HttpTarget(base_url)
+    else:
+        import ia_client
+        ia_client.IA_URL = ia_url
+        import app as app_module
+        app_module.app.config['TESTING'] = True
+        app_module.app.config['GAME_REQUIRE_SESSION'] = False
+        target = TestClientTarget(app_module.app)
+
+    print(f"[load_routes] alvo={args.target} clientes={args.clients} duração={args.duration}s banco={db_path}")
+    try:
+        samples, errors, elapsed = run_load(target, users, args.clients, args.duration, args.warmup)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+        stub.shutdown()
+        if tmp:
+            shutil.rmtree(tmp, ignore_errors=True)
+    report = summarize(samples, errors, elapsed)
+    print_report(report)
+
+    baseline_path = args.baseline or os.path.join(BASELINE_DIR, f'load_routes-{args.target}.json')
+    status = 0
+    if args.compare:
+        if not os.path.exists(baseline_path):
+            print(f"[load_routes] Sem baseline em {baseline_path}")
+        else:
+            with open(baseline_path) as f:
+                regressions = compare(report, json.load(f)['routes'], args.tolerance)
+            for line in regressions:
+                print(f"[load_routes] REGRESSÃO {line}")
+            if regressions:
+                status = 1
+            else:
+                print(f"[load_routes] Dentro de {args.tolerance:.0%} do baseline")
+    if args.save_baseline and report.get('total', {}).get('errors'):
+        # Um 403/500 responde rápido e faria o baseline parecer melhor do que é
+        print("[load_routes] Baseline não salvo: houve respostas com erro")
+        status = 1
+    elif args.save_baseline:
+        os.makedirs(os.path.dirname(baseline_path), exist_ok=True)
+        with open(baseline_path, 'w') as f:
+            json.dump({'target': args.target, 'clients': args.clients, 'duration': args.duration,
+                       'cores': os.cpu_count(), 'saved_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+                       'routes': report}, f, indent=2)
+        print(f"[load_routes] Baseline salvo em {baseline_path}")
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+'''
+Teste de carga do envio de scores (/api/jogos/score e /api/jogos/scores).
+
+Dispara requisições concorrentes pelo test client do Flask contra um banco
+temporário e mede scores gravados por segundo em cada SCORE_WRITE_MODE.
+
+Uso: python bench/load_scores.py --threads 16 --requests 200
+'''
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import db  # noqa: E402
+
+
+def make_app(tmp):
+    db.DB_PATH = os.path.join(tmp, 'load.db')
+    import app as app_module
+    app = app_module.app
+    app.config['TESTING'] = True
+    app.config['GAME_REQUIRE_SESSION'] = False  # mede a gravação, sem sessão de jogo
+    db.init_db()
+    return app
+
+
+def seed_users(count):
+    from werkzeug.security import generate_password_hash
+    password_hash = generate_password_hash('senha')
+    conn = db.get_db_connection()
+    with conn:
+        conn.executemany('INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)',
+                         ((f'load{i}', f'load{i}@bench', password_hash) for i in range(count)))
+    conn.close()
+
+
+def run(app, mode, threads, requests_per_thread, batch):
+    app.config['SCORE_WRITE_MODE'] = mode
+    errors = []
+
+    def worker(index):
+        client = app.test_client()
+        client.post('/login', data={'identifier': f'load{index}', 'password': 'senha'})
+        for _ in range(requests_per_thread):
+            if batch:
+                payload = {'scores': [{'game': 'tetris', 'score': random.randint(0, 5000)} for _ in range(batch)]}
+                resp = client.post('/api/jogos/scores', json=payload)
+            else:
+                resp = client.post('/api/jogos/score', json={'game': 'tetris', 'score': random.randint(0, 5000)})
+            if resp.status_code not in (200, 202):
+                errors.append(resp.status_code)
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    import score_writer
+    score_writer.writer.flush()
+    elapsed = time.perf_counter() - start
+    total = threads * requests_per_thread * (batch or 1)
+    label = f"{mode}{f' + lote de {batch}' if batch else ''}"
+    print(f"  {label:<22} {total:7d} scores em {elapsed:6.2f}s -> {total / elapsed:9.1f} scores/s"
+          f"{f' ({len(errors)} erros)' if errors else ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga da gravação de scores.")
+    parser.add_argument("--threads", type=int, default=16, help="Clientes concorrentes")
+    parser.add_argument("--requests", type=int, default=200, help="Requisições por cliente")
+    parser.add_argument("--batch", type=int, default=20, help="Scores por requisição no endpoint em lote")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='load_scores_')
+    app = make_app(tmp)
+    seed_users(args.threads)
+    print(f"[load_scores] {args.threads} clientes x {args.requests} requisições")
+    for mode in ('direct', 'group', 'async'):
+        run(app, mode, args.threads, args.requests, 0)
+    run(app, 'direct', args.threads, args.requests, args.batch)
+    shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+'''
+Gera um banco sintético para benchmarks e testes de carga.
+
+O schema vem de db.init_db(); cada tabela é preenchida com um único
+executemany (alimentado por um gerador) dentro de uma transação. Os triggers
+do FTS5 ficam desligados durante a carga e o índice é reconstruído uma vez no
+fim; best_scores, follow_counts e a timeline também são montados em SQL
+depois das inserções.
+
+Todos os usuários se chamam user<N> e usam a senha "senha", para o
+bench/load_routes.py conseguir fazer login.
+
+Uso: python bench/seed_db.py --db /tmp/bench.db --scale large
+     python bench/seed_db.py --db /tmp/bench.db --users 5000 --posts 20000
+'''
+import os
+import sys
+import time
+import random
+import argparse
+import itertools
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import db  # noqa: E402
+import timeline  # noqa: E402
+
+SCALES = {
+    'small': dict(users=1_000, posts=10_000, comments=50_000, scores=100_000, follows=5),
+    'medium': dict(users=10_000, posts=100_000, comments=500_000, scores=1_000_000, follows=5),
+    'large': dict(users=100_000, posts=1_000_000, comments=5_000_000, scores=10_000_000, follows=5),
+}
+PASSWORD = 'senha'
+GAMES = ('tetris', 'pacman')
+CITIES = ('São Paulo', 'Rio de Janeiro', 'Belo Horizonte', 'Recife', 'Porto Alegre', 'Salvador', 'Curitiba')
+WORDS = ('orkut', 'scrap', 'depoimento', 'comunidade', 'fotolog', 'msn', 'winamp', 'tetris', 'pacman', 'recorde',
+         'balada', 'férias', 'praia', 'show', 'banda', 'música', 'filme', 'escola', 'prova', 'trabalho', 'amigos',
+         'saudade', 'festa', 'jogo', 'placar', 'internet', 'discada', 'webcam', 'blog', 'glitter', 'emo', 'rock',
+         'pagode', 'axé', 'futebol', 'chuva', 'sol', 'pizza', 'sorvete', 'cinema', 'shopping', 'novela', 'dvd')
+# Palavras mais comuns no começo da lista (distribuição de Zipf)
+CUM_WEIGHTS = list(itertools.accumulate(1 / (i + 1) for i in range(len(WORDS))))
+DAYS = 365  # período coberto pelas datas geradas
+
+
+def _timestamp(ts):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(ts))
+
+
+def _text(rng, words):
+    return ' '.join(rng.choices(WORDS, cum_weights=CUM_WEIGHTS, k=words))
+
+
+class Seeder:
+    """Preenche um banco já criado por init_db() com dados sintéticos."""
+
+    def __init__(self, conn, seed=42):
+        self.conn = conn
+        self.rng = random.Random(seed)
+        self.end = time.time()
+        self.start = self.end - DAYS * 86400
+
+    def _post_time(self, post_id, posts):
+        # ids crescentes = datas crescentes, como no uso real
+        return self.start + (self.end - self.start) * post_id / (posts + 1)
+
+    def _timed(self, label, count, fn):
+        t0 = time.perf_counter()
+        with self.conn:
+            fn()
+        elapsed = time.perf_counter() - t0
+        rate = f" ({count / elapsed:,.0f}/s)" if count else ""
+        print(f"[seed_db] {label:<28} {elapsed:8.2f}s{rate}")
+
+    def users(self, count):
+        from werkzeug.security import generate_password_hash
+        password_hash = generate_password_hash(PASSWORD)
+        rng = self.rng
+        span = self.end - self.start
+        rows = ((i, f'user{i}', f'user{i}@bench.local', password_hash, f'Usuário {i}', _text(rng, 6),
+                 rng.choice(CITIES), _timestamp(self.start + span * i / (count + 1)))
+                for i in range(1, count + 1))
+        self._timed(f'{count} usuários', count, lambda: self.conn.executemany(
+            'INSERT INTO users (id, username, email, password_hash, display_name, bio, city, created_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows))
+
+    def posts(self, count, users):
+        rng = self.rng
+        rows = ((i, rng.randint(1, users), _text(rng, rng.randint(4, 20)), _timestamp(self._post_time(i, count)))
+                for i in range(1, count + 1))
+        self._timed(f'{count} posts', count, lambda: self.conn.executemany(
+            'INSERT INTO posts (id, user_id, content, created_at) VALUES (?, ?, ?, ?)', rows))
+
+    def comments(self, count, users, posts):
+        rng = self.rng
+
+        def rows():
+            for _ in range(count):
+                post_id = rng.randint(1, posts)
+                posted = self._post_time(post_id, posts)
+                yield (post_id, rng.randint(1, users), _text(rng, rng.randint(2, 12)),
+                       _timestamp(posted + (self.end - posted) * rng.random()))
+        self._timed(f'{count} comentários', count, lambda: self.conn.executemany(
+            'INSERT INTO comments (post_id, user_id, content, created_at) VALUES (?, ?, ?, ?)', rows()))
+
+    def scores(self, count, users):
+        rng = self.rng
+        span = self.end - self.start
+        rows = ((rng.randint(1, users), rng.choice(GAMES), int(rng.expovariate(1 / 50)) * 10,
+                 _timestamp(self.start + span * rng.random()))
+                for _ in range(count))
+        self._timed(f'{count} scores', count, lambda: self.conn.executemany(
+            'INSERT INTO scores (user_id, game, score, created_at) VALUES (?, ?, ?, ?)', rows))
+
+        def best_scores():
+            self.conn.execute('DELETE FROM best_scores')
+            self.conn.execute(db.BEST_SCORES_BACKFILL_SQL)
+        self._timed('best_scores', 0, best_scores)
+
+    def follows(self, per_user, users):
+        rng = self.rng
+
+        def rows():
+            for follower in range(1, users + 1):
+                for _ in range(per_user):
+                    # Poucos usuários concentram muitos seguidores
+                    followee = min(users, int(users ** rng.random()))
+                    if followee != follower:
+                        yield follower, followee
+        self._timed(f'{per_user} seguindo/usuário', users * per_user, lambda: self.conn.executemany(
+            'INSERT OR IGNORE INTO follows (follower_id, followee_id) VALUES (?, ?)', rows()))
+
+    def timelines(self):
+        # Mesmo resultado do fan-out: posts próprios + de quem se segue (abaixo do limite de celebridade)
+        def build():
+            self.conn.execute('DELETE FROM timeline')
+            self.conn.execute('INSERT OR IGNORE INTO timeline (user_id, post_id, created_at) '
+                              'SELECT user_id, id, created_at FROM posts')
+            self.conn.execute(
+                'INSERT OR IGNORE INTO timeline (user_id, post_id, created_at) '
+                'SELECT f.follower_id, p.id, p.created_at FROM follows f '
+                'JOIN follow_counts c ON c.user_id = f.followee_id AND c.followers <= ? '
+                'JOIN posts p ON p.user_id = f.followee_id', (timeline.FANOUT_THRESHOLD,))
+        self._timed('timelines', 0, build)
+
+    def search_index(self):
+        # Recria os triggers desligados em drop_search_triggers() e reconstrói o índice
+        def build():
+            for table, columns in db.FTS_TABLES.items():
+                for stmt in db._fts_statements(table, columns):
+                    self.conn.execute(stmt)
+        self._timed('índice de busca (FTS5)', 0, build)
+
+    def drop_search_triggers(self):
+        with self.conn:
+            for table in db.FTS_TABLES:
+                for suffix in ('ai', 'ad', 'au'):
+                    self.conn.execute(f'DROP TRIGGER IF EXISTS {table}_fts_{suffix}')
+
+
+def seed(path, users, posts, comments, scores, follows, seed=42):
+    """Cria o banco em `path` (que não deve existir) e o preenche. Retorna a duração em segundos."""
+    db.DB_PATH = path
+    db.init_db()
+    conn = db.get_db_connection()
+    conn.execute('PRAGMA synchronous=OFF')
+    t0 = time.perf_counter()
+    seeder = Seeder(conn, seed)
+    seeder.drop_search_triggers()
+    seeder.users(users)
+    seeder.posts(posts, users)
+    seeder.comments(comments, users, posts)
+    seeder.scores(scores, users)
+    if follows:
+        seeder.follows(follows, users)
+    seeder.timelines()
+    seeder.search_index()
+    conn.execute('ANALYZE')
+    conn.close()
+    return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gerar um banco sintético para benchmarks.")
+    parser.add_argument("--db", required=True, help="Caminho do banco a criar")
+    parser.add_argument("--scale", choices=SCALES, default='small', help="Tamanho pré-definido")
+    for name in ('users', 'posts', 'comments', 'scores', 'follows'):
+        parser.add_argument(f"--{name}", type=int, help=f"Sobrescreve a quantidade de {name} da escala")
+    parser.add_argument("--seed", type=int, default=42, help="Semente do gerador aleatório")
+    parser.add_argument("--force", action="store_true", help="Apaga o banco se ele já existir")
+    args = parser.parse_args()
+
+    if os.path.exists(args.db):
+        if not args.force:
+            parser.error(f"{args.db} já existe (use --force para recriar)")
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(args.db + suffix):
+                os.remove(args.db + suffix)
+    sizes = dict(SCALES[args.scale])
+    sizes.update({name: getattr(args, name) for name in sizes if getattr(args, name) is not None})
+    elapsed = seed(os.path.abspath(args.db), seed=args.seed, **sizes)
+    print(f"[seed_db] Banco {args.db} pronto em {elapsed:.1f}s "
+          f"({os.path.getsize(args.db) / 1024 / 1024:.0f} MiB): {sizes}")
+
+
+if __name__ == "__main__":
+    main()
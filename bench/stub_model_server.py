@@ -0,0 +1,84 @@
+'''
+Servidor de modelo falso para desenvolvimento e benchmarks da rota /ia.
+
+Imita o endpoint do LM Studio usado por ia_client: responde {"response": ...}
+ou, com "stream": true, envia a resposta palavra por palavra em SSE. Com
+--status diferente de 200 responde só esse status (ex.: 429 de um modelo
+sobrecarregado). Também é usado pelos testes em tests/.
+
+Uso: python bench/stub_model_server.py --port 1234 --delay 0.05
+'''
+import json
+import time
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY = 'Olá! Eu sou a IA de mentirinha do Portal Mágico, respondendo: {prompt}'
+
+
+class StubModelHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    delay = 0.0
+    status = 200
+    calls = 0  # requisições recebidas (os testes conferem o single-flight)
+
+    def do_POST(self):
+        type(self).calls += 1
+        length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        if self.status != 200:
+            body = json.dumps({'error': 'stub status'}).encode()
+            self.send_response(self.status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        reply = REPLY.format(prompt=payload.get('prompt', ''))
+        if payload.get('stream'):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for word in reply.split(' '):
+                time.sleep(self.delay)
+                self._chunk(f"data: {json.dumps({'choices': [{'delta': {'content': word + ' '}}]})}\n\n")
+            self._chunk('data: [DONE]\n\n')
+            self.wfile.write(b'0\r\n\r\n')
+        else:
+            time.sleep(self.delay * len(reply.split(' ')))
+            body = json.dumps({'response': reply}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    def _chunk(self, text):
+        data = text.encode()
+        self.wfile.write(f'{len(data):X}\r\n'.encode() + data + b'\r\n')
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=1234, delay=0.0, status=200):
+    """Cria o servidor (sem iniciá-lo); use serve_forever() ou uma thread."""
+    handler = type('Handler', (StubModelHandler,), {'delay': delay, 'status': status})
+    return ThreadingHTTPServer(('127.0.0.1', port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor de modelo falso para a rota /ia.")
+    parser.add_argument("--port", type=int, default=1234, help="Porta (padrão 1234, a mesma do LM Studio)")
+    parser.add_argument("--delay", type=float, default=0.02, help="Atraso por palavra, em segundos")
+    parser.add_argument("--status", type=int, default=200, help="Status HTTP de todas as respostas")
+    args = parser.parse_args()
+    server = serve(args.port, args.delay, args.status)
+    print(f"[stub_model_server] Ouvindo em http://127.0.0.1:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
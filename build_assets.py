@@ -0,0 +1,24 @@
+import os
+import json
+import argparse
+
+from assets import build_manifest, precompress, MANIFEST_NAME
+
+STATIC_ROOT = os.path.join(os.path.dirname(__file__), 'static')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gerar manifesto de hashes e arquivos pré-comprimidos de static/.")
+    parser.add_argument("--no-compress", action="store_true", help="Não gera os irmãos .gz/.br")
+    args = parser.parse_args()
+
+    manifest = build_manifest(STATIC_ROOT)
+    with open(os.path.join(STATIC_ROOT, MANIFEST_NAME), 'w', encoding='utf-8') as fh:
+        json.dump(manifest, fh, indent=2, sort_keys=True)
+    print(f"[build_assets] Manifesto com {len(manifest)} arquivos em static/{MANIFEST_NAME}")
+    if not args.no_compress:
+        print(f"[build_assets] {precompress(STATIC_ROOT, manifest)} arquivos pré-comprimidos gerados")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+import argparse
+
+from db import init_db, get_db_connection, compact_ai_chats, DB_PATH
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Arquivar o histórico antigo do chat com a IA.")
+    parser.add_argument("--keep", type=int, default=200, help="Mensagens mantidas por usuário em ai_chats")
+    parser.add_argument("--purge-cache", action="store_true", help="Apaga respostas vencidas de ai_reply_cache")
+    parser.add_argument("--vacuum", action="store_true", help="Roda VACUUM no final para devolver espaço em disco")
+    args = parser.parse_args()
+
+    init_db()
+    conn = get_db_connection()
+    users, archived = compact_ai_chats(conn, args.keep)
+    print(f"[compact_ia_history] {archived} mensagens de {users} usuários arquivadas em {DB_PATH}")
+    if args.purge_cache:
+        import ia_cache
+        print(f"[compact_ia_history] {ia_cache.cache.purge_expired()} respostas vencidas removidas do cache")
+    if args.vacuum:
+        conn.execute("VACUUM")
+        print("[compact_ia_history] VACUUM concluído")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,207 @@
 import os
+import json
+import zlib
 import sqlite3
 import logging
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
-from functools import wraps
-from flask import session, flash, redirect, url_for, current_app
+from functools import wraps, lru_cache
+from flask import session, flash, redirect, url_for, jsonify, current_app, g, has_app_context
 
 # Configuração de Caminhos
 BASE_DIR = os.path.dirname(__file__)
 DB_DIR = os.path.join(BASE_DIR, 'db')
-DB_PATH = os.path.join(DB_DIR, 'database.db')
+DB_PATH = os.environ.get('DATABASE_PATH', os.path.join(DB_DIR, 'database.db'))
 
 # Configuração de Logging
 logger = logging.getLogger(__name__)
 
-def get_db_connection():
-    """Cria e retorna uma conexão com o banco de dados SQLite."""
-    conn = sqlite3.connect(DB_PATH)
+# Pragmas aplicados uma única vez, quando a conexão é aberta
+CONNECTION_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    f"PRAGMA busy_timeout={int(os.environ.get('DB_BUSY_TIMEOUT_MS', 5000))}",
+    f"PRAGMA mmap_size={int(os.environ.get('DB_MMAP_SIZE', 256 * 1024 * 1024))}",
+    f"PRAGMA cache_size={int(os.environ.get('DB_CACHE_SIZE', -16000))}",  # negativo = KiB
+)
+
+# Uma conexão por thread do worker, reaproveitada entre requisições
+_local = threading.local()
+_stats_lock = threading.Lock()
+POOL_STATS = {'opened': 0, 'reused': 0}
+
+
+# Observador das consultas SQL (metrics.py): chamado com (segundos, instruções)
+_sql_observer = None
+_timed_cursor = None
+
+
+def set_sql_observer(observer, fetch=False):
+    """Liga (ou desliga, com None) a medição de tempo das consultas SQL.
+
+    Por padrão só execute* é medido (o primeiro passo da consulta roda ali);
+    fetch=True mede também cada fetch e cada linha iterada, ao custo de uma
+    chamada Python a mais por linha.
+    """
+    global _sql_observer, _timed_cursor
+    _timed_cursor = TimedFetchCursor if fetch else TimedCursor
+    _sql_observer = observer
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor que soma o tempo de execute* no observador de SQL."""
+
+    def _timed(self, method, statements, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            observer = _sql_observer
+            if observer is not None:
+                observer(time.perf_counter() - start, statements)
+
+    def execute(self, *args):
+        return self._timed(super().execute, 1, *args)
+
+    def executemany(self, *args):
+        return self._timed(super().executemany, 1, *args)
+
+    def executescript(self, *args):
+        return self._timed(super().executescript, 1, *args)
+
+
+class TimedFetchCursor(TimedCursor):
+    """TimedCursor que também mede fetch* e a iteração, linha a linha (opt-in)."""
+
+    def fetchone(self):
+        return self._timed(super().fetchone, 0)
+
+    def fetchmany(self, *args):
+        return self._timed(super().fetchmany, 0, *args)
+
+    def fetchall(self):
+        return self._timed(super().fetchall, 0)
+
+    def __next__(self):
+        return self._timed(super().__next__, 0)
+
+
+class PooledConnection(sqlite3.Connection):
+    """Conexão SQLite que pode pertencer ao pool da thread.
+
+    Quando pooled=True, close() apenas mantém a conexão aberta para a próxima
+    chamada; quem a libera de fato é release_db_connection() no teardown.
+    Com um observador de SQL ligado, os cursores passam a ser TimedCursor
+    (ou TimedFetchCursor).
+    """
+    pooled = False
+
+    def cursor(self, factory=None):
+        if factory is None:
+            factory = _timed_cursor if _sql_observer is not None else sqlite3.Cursor
+        return super().cursor(factory)
+
+    # Os atalhos execute* do sqlite3 criam o cursor em C, sem passar por cursor()
+    def execute(self, *args):
+        if _sql_observer is None:
+            return super().execute(*args)
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        if _sql_observer is None:
+            return super().executemany(*args)
+        return self.cursor().executemany(*args)
+
+    def close(self):
+        if not self.pooled:
+            super().close()
+
+    def close_for_real(self):
+        self.pooled = False
+        super().close()
+
+
+def _connect():
+    conn = sqlite3.connect(DB_PATH, factory=PooledConnection)
     conn.row_factory = sqlite3.Row
+    conn.db_path = DB_PATH
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
     return conn
 
+
+def _count(key):
+    with _stats_lock:
+        POOL_STATS[key] += 1
+
+
+def pool_stats():
+    """Retorna os contadores do pool e a taxa de reaproveitamento."""
+    with _stats_lock:
+        stats = dict(POOL_STATS)
+    total = stats['opened'] + stats['reused']
+    stats['hit_rate'] = stats['reused'] / total if total else 0.0
+    return stats
+
+
+def get_db_connection():
+    """Retorna a conexão SQLite da thread atual.
+
+    Dentro de um contexto Flask a conexão vem do pool da thread e vale até o
+    fim da requisição; fora dele (scripts) é aberta uma conexão avulsa.
+    """
+    if not has_app_context():
+        return _connect()
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and conn.db_path == DB_PATH:
+        _count('reused')
+    else:
+        if conn is not None:
+            conn.close_for_real()
+        conn = _connect()
+        conn.pooled = True
+        _local.conn = conn
+        _count('opened')
+    g._db_conn = conn
+    return conn
+
+
+def release_db_connection(exc=None):
+    """Devolve ao pool a conexão usada no contexto atual (teardown_appcontext)."""
+    conn = g.pop('_db_conn', None)
+    if conn is None:
+        return
+    if conn.in_transaction:
+        conn.rollback()
+    if not current_app.config.get('DB_POOL_ENABLED', True):
+        close_pool()
+
+
+def close_pool():
+    """Fecha a conexão guardada para a thread atual."""
+    conn = getattr(_local, 'conn', None)
+    _local.conn = None
+    if conn is not None:
+        conn.close_for_real()
+
+
+def reset_after_fork():
+    """Descarta a conexão e os contadores herdados do processo pai (hook post_fork do gunicorn).
+
+    O worker abre as próprias conexões na primeira requisição.
+    """
+    close_pool()
+    with _stats_lock:
+        POOL_STATS.update(opened=0, reused=0)
+
+
+def init_app(app):
+    """Registra o ciclo de vida das conexões e o filtro data_hora na aplicação."""
+    app.teardown_appcontext(release_db_connection)
+    app.add_template_filter(format_timestamp, 'data_hora')
+
 def _upgrade_user_columns(conn):
     """Garante que novas colunas opcionais existam na tabela users."""
     existing_cols = {row[1] for row in conn.execute('PRAGMA table_info(users)').fetchall()}
@@ -32,9 +215,381 @@ def _upgrade_user_columns(conn):
             conn.execute(f'ALTER TABLE users {stmt}')
         conn.commit()
 
-def init_db():
-    """Inicializa o banco de dados SQLite com as tabelas necessárias."""
-    conn = get_db_connection()
+# Consultas do ranking materializado (best_scores)
+BEST_SCORES_BACKFILL_SQL = (
+    'INSERT INTO best_scores (user_id, game, best_score, last_played) '
+    'SELECT user_id, game, MAX(score), MAX(created_at) FROM scores GROUP BY user_id, game'
+)
+TOP_SCORES_SQL = (
+    'SELECT users.username, users.display_name, best_scores.best_score, best_scores.last_played '
+    'FROM best_scores JOIN users ON best_scores.user_id = users.id '
+    'WHERE best_scores.game = ? ORDER BY best_scores.best_score DESC LIMIT ?'
+)
+USER_BEST_SCORES_SQL = 'SELECT game, best_score, last_played FROM best_scores WHERE user_id = ?'
+
+# Janela do histórico da IA (mais recentes primeiro, paginado por (created_at, id))
+AI_HISTORY_PAGE_SQL = (
+    'SELECT * FROM ai_chats WHERE user_id = ? AND (created_at, id) < (?, ?) '
+    'ORDER BY created_at DESC, id DESC LIMIT ?'
+)
+
+# Prévia de comentários do feed: um LIMIT por post, sempre pelo índice (post_id, created_at)
+COMMENT_PREVIEW_SQL = (
+    'SELECT c.*, u.username, u.display_name, u.avatar_path, u.avatar_thumb_path '
+    'FROM comments c JOIN users u ON c.user_id = u.id '
+    'WHERE c.post_id = ? ORDER BY c.created_at DESC, c.id DESC LIMIT ?'
+)
+
+# Busca textual: tabela de conteúdo -> colunas indexadas em <tabela>_fts
+FTS_TABLES = {
+    'posts': ('content',),
+    'comments': ('content',),
+    'users': ('username', 'display_name', 'bio', 'city'),
+}
+
+
+def _fts_statements(table, columns):
+    """DDL do índice FTS5 de conteúdo externo sobre `table` e dos triggers que o mantêm em sincronia."""
+    fts = f'{table}_fts'
+    cols = ', '.join(columns)
+    new_cols = ', '.join(f'new.{c}' for c in columns)
+    old_cols = ', '.join(f'old.{c}' for c in columns)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, content='{table}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        f'''CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts} (rowid, {cols}) VALUES (new.id, {new_cols});
+        END''',
+        f'''CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts} ({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+        END''',
+        f'''CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN
+            INSERT INTO {fts} ({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+            INSERT INTO {fts} (rowid, {cols}) VALUES (new.id, {new_cols});
+        END''',
+        f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')",
+    ]
+
+
+def rebuild_search_index(conn, optimize=False):
+    """Reconstrói os índices FTS5 a partir das tabelas de conteúdo (e opcionalmente os otimiza)."""
+    with conn:
+        for table in FTS_TABLES:
+            conn.execute(f"INSERT INTO {table}_fts ({table}_fts) VALUES ('rebuild')")
+            if optimize:
+                conn.execute(f"INSERT INTO {table}_fts ({table}_fts) VALUES ('optimize')")
+
+
+# Migrações versionadas do schema, controladas por PRAGMA user_version.
+# Cada migração traz as consultas quentes que devem passar a usar os índices
+# criados; a checagem roda EXPLAIN QUERY PLAN e falha se o plano não usar o
+# índice (ou, quando sorted=True, se ainda precisar de um TEMP B-TREE para o ORDER BY).
+# As consultas de uma migração só podem usar o schema que existe naquela versão.
+MIGRATIONS = [
+    {
+        'version': 1,
+        'description': 'Índices para feed, comentários, ranking de jogos e histórico da IA',
+        'statements': [
+            'CREATE INDEX IF NOT EXISTS idx_posts_created_at ON posts(created_at)',
+            'CREATE INDEX IF NOT EXISTS idx_comments_post_created ON comments(post_id, created_at)',
+            'CREATE INDEX IF NOT EXISTS idx_scores_game_user ON scores(game, user_id, score, created_at)',
+            'CREATE INDEX IF NOT EXISTS idx_scores_user_game ON scores(user_id, game, score, created_at)',
+            'CREATE INDEX IF NOT EXISTS idx_ai_chats_user_created ON ai_chats(user_id, created_at)',
+        ],
+        'checks': [
+            # (consulta, índice esperado, sorted)
+            ('SELECT p.*, u.username, u.display_name, u.avatar_path FROM posts p JOIN users u ON p.user_id = u.id '
+             'WHERE (p.created_at, p.id) < (?, ?) ORDER BY p.created_at DESC, p.id DESC LIMIT ?',
+             'idx_posts_created_at', True),
+            ('SELECT c.*, u.username, u.display_name, u.avatar_path FROM comments c JOIN users u ON c.user_id = u.id '
+             'WHERE c.post_id = ? ORDER BY c.created_at DESC, c.id DESC LIMIT ?',
+             'idx_comments_post_created', True),
+            ('SELECT users.username, users.display_name, MAX(scores.score) AS best_score, MAX(scores.created_at) AS last_played '
+             'FROM scores JOIN users ON scores.user_id = users.id WHERE scores.game = ? '
+             'GROUP BY scores.user_id ORDER BY best_score DESC LIMIT ?',
+             'idx_scores_game_user', False),
+            ('SELECT game, MAX(score) AS best_score, MAX(created_at) AS last_played '
+             'FROM scores WHERE user_id = ? GROUP BY game',
+             'idx_scores_user_game', True),
+            ('SELECT * FROM ai_chats WHERE user_id = ? ORDER BY created_at ASC',
+             'idx_ai_chats_user_created', True),
+        ],
+    },
+    {
+        'version': 2,
+        'description': 'Tabela materializada best_scores para rankings e perfis',
+        'statements': [
+            '''CREATE TABLE IF NOT EXISTS best_scores (
+                user_id INTEGER NOT NULL,
+                game TEXT NOT NULL,
+                best_score INTEGER NOT NULL,
+                last_played TEXT NOT NULL,
+                PRIMARY KEY (user_id, game),
+                FOREIGN KEY(user_id) REFERENCES users(id)
+            ) WITHOUT ROWID''',
+            'CREATE INDEX IF NOT EXISTS idx_best_scores_game_score ON best_scores(game, best_score DESC)',
+            'DELETE FROM best_scores',
+            BEST_SCORES_BACKFILL_SQL,
+        ],
+        'checks': [
+            (TOP_SCORES_SQL, 'idx_best_scores_game_score', True),
+            (USER_BEST_SCORES_SQL, 'PRIMARY KEY', False),
+        ],
+    },
+    {
+        'version': 3,
+        'description': 'Arquivo compactado do histórico antigo da IA (ai_chat_archive)',
+        'statements': [
+            '''CREATE TABLE IF NOT EXISTS ai_chat_archive (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                first_at TEXT NOT NULL,
+                last_at TEXT NOT NULL,
+                messages INTEGER NOT NULL,
+                payload BLOB NOT NULL,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY(user_id) REFERENCES users(id)
+            )''',
+            'CREATE INDEX IF NOT EXISTS idx_ai_chat_archive_user ON ai_chat_archive(user_id, last_at)',
+        ],
+        'checks': [
+            (AI_HISTORY_PAGE_SQL, 'idx_ai_chats_user_created', True),
+        ],
+    },
+    {
+        'version': 4,
+        'description': 'Cache persistente de respostas da IA (ai_reply_cache)',
+        'statements': [
+            '''CREATE TABLE IF NOT EXISTS ai_reply_cache (
+                key TEXT PRIMARY KEY,
+                reply TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            ) WITHOUT ROWID''',
+        ],
+        'checks': [
+            ('SELECT reply, expires_at FROM ai_reply_cache WHERE key = ? AND expires_at > ?', 'PRIMARY KEY', False),
+        ],
+    },
+    {
+        'version': 5,
+        'description': 'Variantes de mídia geradas em segundo plano (preview, capa de vídeo, miniatura do avatar)',
+        'statements': [
+            'ALTER TABLE posts ADD COLUMN media_preview_path TEXT',
+            'ALTER TABLE posts ADD COLUMN media_poster_path TEXT',
+            'ALTER TABLE users ADD COLUMN avatar_thumb_path TEXT',
+        ],
+        'checks': [],
+    },
+    {
+        'version': 6,
+        'description': 'Store de mídia endereçado por conteúdo (media_blobs com contagem de referências)',
+        'statements': [
+            '''CREATE TABLE IF NOT EXISTS media_blobs (
+                name TEXT PRIMARY KEY,
+                path TEXT NOT NULL,
+                refcount INTEGER NOT NULL DEFAULT 0,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            ) WITHOUT ROWID''',
+            'CREATE INDEX IF NOT EXISTS idx_media_blobs_refcount ON media_blobs(refcount)',
+        ],
+        'checks': [
+            ('SELECT name, path FROM media_blobs WHERE refcount <= 0', 'idx_media_blobs_refcount', False),
+        ],
+    },
+    {
+        'version': 7,
+        'description': 'Contadores de versão do cache de fragmentos HTML (fragment_versions)',
+        'statements': [
+            '''CREATE TABLE IF NOT EXISTS fragment_versions (
+                name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID''',
+        ],
+        'checks': [],
+    },
+    {
+        'version': 8,
+        'description': 'Tipo da mídia do post gravado no upload (posts.media_type)',
+        'statements': [
+            'ALTER TABLE posts ADD COLUMN media_type TEXT',
+            '''UPDATE posts SET media_type = CASE
+                WHEN lower(media_path) LIKE '%.png' OR lower(media_path) LIKE '%.jpg'
+                  OR lower(media_path) LIKE '%.jpeg' OR lower(media_path) LIKE '%.gif' THEN 'image'
+                WHEN lower(media_path) LIKE '%.mp4' OR lower(media_path) LIKE '%.mov'
+                  OR lower(media_path) LIKE '%.webm' THEN 'video'
+            END
+            WHERE media_path IS NOT NULL''',
+        ],
+        'checks': [],
+    },
+    {
+        'version': 9,
+        'description': 'Busca textual FTS5 sobre posts, comentários e usuários (com triggers de sincronia)',
+        'statements': [stmt for table, columns in FTS_TABLES.items() for stmt in _fts_statements(table, columns)],
+        'checks': [],
+    },
+    {
+        'version': 10,
+        'description': 'Seguidores (follows, follow_counts) e timeline pessoal materializada',
+        'statements': [
+            '''CREATE TABLE IF NOT EXISTS follows (
+                follower_id INTEGER NOT NULL,
+                followee_id INTEGER NOT NULL,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (follower_id, followee_id)
+            ) WITHOUT ROWID''',
+            'CREATE INDEX IF NOT EXISTS idx_follows_followee ON follows(followee_id, follower_id)',
+            '''CREATE TABLE IF NOT EXISTS follow_counts (
+                user_id INTEGER PRIMARY KEY,
+                followers INTEGER NOT NULL DEFAULT 0
+            )''',
+            '''CREATE TRIGGER IF NOT EXISTS follows_ai AFTER INSERT ON follows BEGIN
+                INSERT INTO follow_counts (user_id, followers) VALUES (new.followee_id, 1)
+                ON CONFLICT(user_id) DO UPDATE SET followers = followers + 1;
+            END''',
+            '''CREATE TRIGGER IF NOT EXISTS follows_ad AFTER DELETE ON follows BEGIN
+                UPDATE follow_counts SET followers = followers - 1 WHERE user_id = old.followee_id;
+            END''',
+            '''CREATE TABLE IF NOT EXISTS timeline (
+                user_id INTEGER NOT NULL,
+                post_id INTEGER NOT NULL,
+                created_at TEXT NOT NULL,
+                PRIMARY KEY (user_id, created_at, post_id)
+            ) WITHOUT ROWID''',
+            'CREATE INDEX IF NOT EXISTS idx_posts_user_created ON posts(user_id, created_at)',
+            # Cada autor vê os próprios posts na sua timeline
+            'INSERT OR IGNORE INTO timeline (user_id, post_id, created_at) SELECT user_id, id, created_at FROM posts',
+        ],
+        'checks': [
+            ('SELECT post_id, created_at FROM timeline WHERE user_id = ? AND (created_at, post_id) < (?, ?) '
+             'ORDER BY created_at DESC, post_id DESC LIMIT ?',
+             'PRIMARY KEY', True),
+            ('SELECT id, created_at FROM posts WHERE user_id = ? AND (created_at, id) < (?, ?) '
+             'ORDER BY created_at DESC, id DESC LIMIT ?',
+             'idx_posts_user_created', True),
+            ('SELECT f.follower_id FROM follows f WHERE f.followee_id = ?', 'idx_follows_followee', False),
+        ],
+    },
+    {
+        'version': 11,
+        'description': 'Fila de eventos para as atualizações ao vivo entre workers (EVENT_BUS=sqlite)',
+        'statements': [
+            '''CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                type TEXT NOT NULL,
+                data TEXT NOT NULL,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )''',
+        ],
+        'checks': [],
+    },
+    {
+        'version': 12,
+        'description': 'Sessões de jogo (token, estado da validação do log e score enviado)',
+        'statements': [
+            '''CREATE TABLE IF NOT EXISTS game_sessions (
+                token TEXT PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                game TEXT NOT NULL,
+                started_at REAL NOT NULL,
+                status TEXT NOT NULL,
+                score INTEGER,
+                reason TEXT,
+                finished_at REAL
+            ) WITHOUT ROWID''',
+            'CREATE INDEX IF NOT EXISTS idx_game_sessions_user ON game_sessions(user_id, game, status)',
+        ],
+        'checks': [
+            ("DELETE FROM game_sessions WHERE user_id = ? AND game = ? AND status = 'open'",
+             'idx_game_sessions_user', False),
+            ('DELETE FROM game_sessions WHERE user_id = ? AND started_at < ?', 'idx_game_sessions_user', False),
+        ],
+    },
+    {
+        'version': 13,
+        'description': 'Contador de comentários por post (comment_counts) mantido por triggers',
+        'statements': [
+            '''CREATE TABLE IF NOT EXISTS comment_counts (
+                post_id INTEGER PRIMARY KEY,
+                comments INTEGER NOT NULL DEFAULT 0
+            )''',
+            '''CREATE TRIGGER IF NOT EXISTS comments_count_ai AFTER INSERT ON comments BEGIN
+                INSERT INTO comment_counts (post_id, comments) VALUES (new.post_id, 1)
+                ON CONFLICT(post_id) DO UPDATE SET comments = comments + 1;
+            END''',
+            '''CREATE TRIGGER IF NOT EXISTS comments_count_ad AFTER DELETE ON comments BEGIN
+                UPDATE comment_counts SET comments = comments - 1 WHERE post_id = old.post_id;
+            END''',
+            'INSERT OR REPLACE INTO comment_counts (post_id, comments) SELECT post_id, COUNT(*) FROM comments GROUP BY post_id',
+        ],
+        'checks': [
+            (COMMENT_PREVIEW_SQL, 'idx_comments_post_created', True),
+        ],
+    },
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1]['version']
+
+
+def get_schema_version(conn):
+    """Retorna a versão do schema gravada em PRAGMA user_version."""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def run_migrations(conn, target=None):
+    """Aplica, em ordem, as migrações pendentes até a versão alvo.
+
+    Cada migração roda em uma transação própria (BEGIN/COMMIT explícitos, com
+    a conexão em autocommit) junto com a atualização do user_version: no modo
+    padrão do sqlite3 um ALTER TABLE faz commit sozinho, e uma falha no meio
+    deixaria a migração aplicada pela metade. Retorna a lista de versões aplicadas.
+    """
+    target = SCHEMA_VERSION if target is None else target
+    current = get_schema_version(conn)
+    applied = []
+    if conn.in_transaction:
+        conn.commit()
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None
+    try:
+        for migration in MIGRATIONS:
+            version = migration['version']
+            if version <= current or version > target:
+                continue
+            conn.execute('BEGIN')
+            try:
+                for stmt in migration['statements']:
+                    conn.execute(stmt)
+                conn.execute(f'PRAGMA user_version = {int(version)}')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+            logger.info("Migration %s applied: %s", version, migration['description'])
+            applied.append(version)
+    finally:
+        conn.isolation_level = isolation_level
+    return applied
+
+
+def check_query_plans(conn, migration):
+    """Roda EXPLAIN QUERY PLAN nas consultas da migração.
+
+    Retorna uma lista de (sql, ok, plano) onde plano é o texto das linhas do EXPLAIN.
+    """
+    results = []
+    for sql, index_name, is_sorted in migration['checks']:
+        rows = conn.execute('EXPLAIN QUERY PLAN ' + sql, [None] * sql.count('?')).fetchall()
+        details = [row[3] for row in rows]
+        ok = any(index_name in d for d in details)
+        if is_sorted and any('TEMP B-TREE FOR ORDER BY' in d for d in details):
+            ok = False
+        results.append((sql, ok, '\n'.join(details)))
+    return results
+
+
+def create_base_schema(conn):
+    """Cria as tabelas de antes das migrações versionadas (v0), se não existirem."""
     c = conn.cursor()
     # Users table
     c.execute(
@@ -100,38 +655,228 @@ def init_db():
     )
     conn.commit()
     _upgrade_user_columns(conn)
+
+
+def init_db():
+    """Inicializa o banco de dados SQLite com as tabelas necessárias.
+
+    Se PRAGMA user_version já está na última migração, não roda DDL nenhum.
+    """
+    conn = get_db_connection()
+    if get_schema_version(conn) == SCHEMA_VERSION:
+        conn.close()
+        logger.info("Database schema current (v%s) at %s", SCHEMA_VERSION, DB_PATH)
+        return
+    create_base_schema(conn)
+    run_migrations(conn)
     conn.close()
     logger.info("Database initialized/checked at %s", DB_PATH)
 
+def record_scores(conn, rows):
+    """Grava vários scores [(user_id, game, score)] e atualiza best_scores (sem commit)."""
+    conn.executemany('INSERT INTO scores (user_id, game, score) VALUES (?, ?, ?)', rows)
+    conn.executemany(
+        'INSERT INTO best_scores (user_id, game, best_score, last_played) '
+        'VALUES (?, ?, ?, CURRENT_TIMESTAMP) '
+        'ON CONFLICT(user_id, game) DO UPDATE SET '
+        'best_score = MAX(best_score, excluded.best_score), last_played = excluded.last_played',
+        rows
+    )
+    bump_fragment_versions(conn, {f'ranking:{game}' for _, game, _ in rows})
+
+
+def bump_fragment_versions(conn, names):
+    """Incrementa os contadores de versão dos fragmentos em cache (sem commit)."""
+    conn.executemany(
+        'INSERT INTO fragment_versions (name, version) VALUES (?, 1) '
+        'ON CONFLICT(name) DO UPDATE SET version = version + 1',
+        [(name,) for name in names]
+    )
+
+
+def fragment_versions(conn, names):
+    """Retorna {nome: versão} para os contadores pedidos (ausentes valem 0)."""
+    names = list(names)
+    versions = dict.fromkeys(names, 0)
+    if names:
+        placeholders = ','.join('?' * len(names))
+        for row in conn.execute(f'SELECT name, version FROM fragment_versions WHERE name IN ({placeholders})', names):
+            versions[row['name']] = row['version']
+    return versions
+
+
+def record_score(conn, user_id, game, score):
+    """Grava um score e atualiza best_scores na mesma transação (sem commit)."""
+    record_scores(conn, [(user_id, game, score)])
+
+
+def rebuild_best_scores(conn):
+    """Recalcula best_scores a partir de scores. Retorna o número de linhas geradas."""
+    with conn:
+        conn.execute('DELETE FROM best_scores')
+        conn.execute(BEST_SCORES_BACKFILL_SQL)
+    return conn.execute('SELECT COUNT(*) FROM best_scores').fetchone()[0]
+
+
+def top_scores(game, limit=10):
+    """Retorna as linhas do ranking de um jogo (melhor score por usuário)."""
+    conn = get_db_connection()
+    rows = conn.execute(TOP_SCORES_SQL, (game, limit)).fetchall()
+    conn.close()
+    return rows
+
+
 def user_best_scores(user_id):
     """Retorna a melhor pontuação por jogo para um usuário."""
     conn = get_db_connection()
-    rows = conn.execute(
-        'SELECT game, MAX(score) AS best_score, MAX(created_at) AS last_played '
-        'FROM scores WHERE user_id = ? GROUP BY game',
-        (user_id,)
-    ).fetchall()
+    rows = conn.execute(USER_BEST_SCORES_SQL, (user_id,)).fetchall()
     conn.close()
     scores = []
     for row in rows:
         scores.append({
             'game': row['game'],
             'score': row['best_score'],
-            'last_played_human': datetime.fromisoformat(row['last_played']).strftime('%d/%m/%Y %H:%M')
+            'last_played_human': format_timestamp(row['last_played'])
         })
     return scores
 
+def compact_ai_chats(conn, keep=200):
+    """Move para ai_chat_archive as mensagens da IA além das `keep` mais recentes de cada usuário.
+
+    As mensagens antigas viram um único registro por usuário e execução, com
+    [role, content, created_at] em JSON comprimido com zlib. Retorna
+    (usuários compactados, mensagens arquivadas).
+    """
+    users = conn.execute(
+        'SELECT user_id, COUNT(*) AS total FROM ai_chats GROUP BY user_id HAVING COUNT(*) > ?',
+        (keep,)
+    ).fetchall()
+    archived = 0
+    for row in users:
+        old = conn.execute(
+            'SELECT id, role, content, created_at FROM ai_chats WHERE user_id = ? '
+            'ORDER BY created_at ASC, id ASC LIMIT ?',
+            (row['user_id'], row['total'] - keep)
+        ).fetchall()
+        payload = zlib.compress(json.dumps(
+            [[m['role'], m['content'], m['created_at']] for m in old], ensure_ascii=False
+        ).encode('utf-8'))
+        last = old[-1]
+        with conn:
+            conn.execute(
+                'INSERT INTO ai_chat_archive (user_id, first_at, last_at, messages, payload) VALUES (?, ?, ?, ?, ?)',
+                (row['user_id'], old[0]['created_at'], last['created_at'], len(old), payload)
+            )
+            conn.execute('DELETE FROM ai_chats WHERE user_id = ? AND (created_at, id) <= (?, ?)',
+                         (row['user_id'], last['created_at'], last['id']))
+        archived += len(old)
+    return len(users), archived
+
+
+def previous_ai_chat_archive(conn, user_id, before=None):
+    """Id do bloco arquivado mais recente do usuário (ou do anterior ao bloco `before`); None se não houver."""
+    sql = 'SELECT MAX(id) FROM ai_chat_archive WHERE user_id = ?'
+    params = [user_id]
+    if before is not None:
+        sql += ' AND id < ?'
+        params.append(before)
+    return conn.execute(sql, params).fetchone()[0]
+
+
+def read_ai_chat_archive(conn, user_id, archive_id):
+    """Retorna as mensagens de um bloco arquivado do usuário, da mais antiga para a mais recente."""
+    row = conn.execute('SELECT payload FROM ai_chat_archive WHERE id = ? AND user_id = ?',
+                       (archive_id, user_id)).fetchone()
+    if row is None:
+        return []
+    return [{'role': role, 'content': content, 'created_at': created_at}
+            for role, content, created_at in json.loads(zlib.decompress(row['payload']))]
+
+
+class UserCache:
+    """Cache LRU com TTL das linhas de users, local ao processo.
+
+    Cada entrada guarda a versão do usuário no momento da leitura; bump()
+    incrementa essa versão e invalida a entrada após uma escrita no perfil.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            row, version, expires_at = entry
+            if expires_at < time.monotonic() or version != self._versions.get(user_id, 0):
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return row
+
+    def set(self, user_id, row, ttl):
+        with self._lock:
+            self._entries[user_id] = (row, self._versions.get(user_id, 0), time.monotonic() + ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def bump(self, user_id):
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Habilitado com USER_CACHE_TTL > 0 (segundos) em app.config. O bump só vale
+# para o processo atual; nos demais workers o TTL limita o tempo de defasagem.
+user_cache = UserCache()
+
+
+def load_user(user_id):
+    """Carrega a linha de users, passando pelo cache do processo se estiver ativo."""
+    ttl = current_app.config.get('USER_CACHE_TTL', 0) if has_app_context() else 0
+    use_cache = ttl > 0
+    if use_cache:
+        user = user_cache.get(user_id)
+        if user is not None:
+            return user
+    conn = get_db_connection()
+    user = conn.execute('SELECT * FROM users WHERE id = ?', (user_id,)).fetchone()
+    conn.close()
+    if use_cache and user is not None:
+        user_cache.set(user_id, user, ttl)
+    return user
+
+
 # Funções auxiliares que serão usadas pelas rotas
 def current_user():
-    """Retorna o objeto do usuário logado ou None."""
+    """Retorna o objeto do usuário logado ou None (memoizado em flask.g na requisição)."""
     user_id = session.get('user_id')
     if not user_id:
         return None
-    conn = get_db_connection()
-    user = conn.execute('SELECT * FROM users WHERE id = ?', (user_id,)).fetchone()
-    conn.close()
+    cached = g.get('_current_user')
+    if cached is not None and cached['id'] == user_id:
+        return cached
+    user = load_user(user_id)
+    g._current_user = user
     return user
 
+
+def invalidate_user(user_id):
+    """Descarta o usuário memoizado na requisição e no cache do processo após uma escrita."""
+    cached = g.get('_current_user')
+    if cached is not None and cached['id'] == user_id:
+        g.pop('_current_user')
+    user_cache.bump(user_id)
+
 def login_required(view_func):
     """Decorator para proteger rotas que exigem login."""
     @wraps(view_func)
@@ -142,6 +887,43 @@ def login_required(view_func):
         return view_func(*args, **kwargs)
     return wrapper
 
+def api_login_required(view_func):
+    """Como login_required, mas para a API JSON: responde 401 em vez de redirecionar."""
+    @wraps(view_func)
+    def wrapper(*args, **kwargs):
+        if not current_user():
+            return jsonify({'error': 'authentication required'}), 401
+        return view_func(*args, **kwargs)
+    return wrapper
+
+@lru_cache(maxsize=4096)
+def format_timestamp(value):
+    """Formata um timestamp do SQLite como 'DD/MM/AAAA HH:MM' (memoizado).
+
+    O formato de CURRENT_TIMESTAMP ('AAAA-MM-DD HH:MM:SS') é só fatiado; outros
+    formatos ISO passam por datetime.fromisoformat. Também é o filtro Jinja data_hora.
+    """
+    if not value:
+        return ''
+    if len(value) >= 16 and value[4] == '-' and value[7] == '-' and value[10] in ' T' and value[13] == ':':
+        return f'{value[8:10]}/{value[5:7]}/{value[:4]} {value[11:16]}'
+    return datetime.fromisoformat(value).strftime('%d/%m/%Y %H:%M')
+
+
+def encode_cursor(created_at, row_id):
+    """Monta o cursor (created_at, id) usado no parâmetro ?before=."""
+    return f"{created_at}_{row_id}"
+
+def decode_cursor(raw):
+    """Converte o cursor ?before= em (created_at, id) ou None se inválido."""
+    if not raw or "_" not in raw:
+        return None
+    created_at, _, row_id = raw.rpartition("_")
+    try:
+        return created_at, int(row_id)
+    except ValueError:
+        return None
+
 def allowed_file(filename):
     """Verifica se a extensão do arquivo é permitida."""
     allowed_extensions = {'png', 'jpg', 'jpeg', 'gif', 'mp4', 'mov', 'webm'}
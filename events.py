@@ -0,0 +1,224 @@
+'''
+Barramento de eventos para atualizações ao vivo (SSE).
+
+As rotas que gravam (novo post, comentário, recorde nos jogos) chamam
+publish(); cada conexão de /api/eventos é uma Subscription com buffer
+limitado. O backend padrão (EVENT_BUS=memory) entrega só no próprio
+processo; com EVENT_BUS=sqlite os eventos vão para a tabela events e uma
+thread por processo lê as novidades a cada EVENT_POLL_INTERVAL, o que faz os
+eventos chegarem a todos os workers. Outro backend compartilhado (Redis
+pub/sub, por exemplo) só precisa implementar publish() e chamar _dispatch().
+
+Quem não tem conexão SSE (limite de conexões do processo, ver routes/live.py)
+faz polling com since(), que lê o mesmo buffer de replay. Com vários workers
+o polling cai em processos diferentes, então ele precisa de EVENT_BUS=sqlite
+(ids comuns a todos); no memory cada processo tem a sua numeração.
+
+Backpressure: quem não consome rápido o bastante estoura o buffer, perde os
+eventos pendentes e recebe um aviso de resync (o navegador recarrega o que
+precisa), em vez de acumular memória sem limite.
+'''
+import os
+import json
+import time
+import logging
+import threading
+from collections import deque
+
+import db
+
+logger = logging.getLogger(__name__)
+
+BACKEND = os.environ.get('EVENT_BUS', 'memory')  # memory | sqlite
+BUFFER_SIZE = int(os.environ.get('EVENT_BUFFER_SIZE', 100))
+MAX_SUBSCRIBERS = int(os.environ.get('EVENT_MAX_SUBSCRIBERS', 5000))
+POLL_INTERVAL = float(os.environ.get('EVENT_POLL_INTERVAL', 0.5))
+REPLAY_SIZE = 256  # eventos recentes reenviados a quem reconecta com Last-Event-ID
+KEEP_ROWS = 10000  # linhas mantidas em events (backend sqlite)
+
+
+class Subscription:
+    """Fila limitada de eventos de uma conexão, filtrada por tipo."""
+
+    def __init__(self, types=None, maxsize=BUFFER_SIZE):
+        self.types = set(types) if types else None
+        self.maxsize = maxsize
+        self.overflowed = False
+        self._events = deque()
+        self._cond = threading.Condition()
+
+    def wants(self, event):
+        return self.types is None or event['type'] in self.types
+
+    def push(self, event):
+        with self._cond:
+            if self.overflowed:
+                return
+            if len(self._events) >= self.maxsize:
+                self._events.clear()
+                self.overflowed = True
+            else:
+                self._events.append(event)
+            self._cond.notify()
+
+    def get(self, timeout):
+        """Espera até `timeout` segundos; retorna (eventos, estourou)."""
+        with self._cond:
+            if not self._events and not self.overflowed:
+                self._cond.wait(timeout)
+            events = list(self._events)
+            self._events.clear()
+            overflowed, self.overflowed = self.overflowed, False
+        return events, overflowed
+
+
+class EventBus:
+    """Entrega em memória para as Subscriptions do processo."""
+
+    def __init__(self):
+        self._subscribers = set()
+        self._recent = deque(maxlen=REPLAY_SIZE)
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._last_id = 0  # último evento entregue por _dispatch
+        self.stats = {'published': 0, 'delivered': 0, 'overflows': 0, 'rejected': 0}
+
+    def publish(self, event_type, data):
+        with self._lock:
+            self._next_id += 1
+            event_id = self._next_id
+        self._dispatch({'id': event_id, 'type': event_type, 'data': data})
+        self.stats['published'] += 1
+
+    def _dispatch(self, event):
+        with self._lock:
+            self._recent.append(event)
+            self._last_id = max(self._last_id, event['id'])
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            if sub.wants(event):
+                if sub.overflowed:
+                    continue
+                sub.push(event)
+                if sub.overflowed:
+                    self.stats['overflows'] += 1
+                else:
+                    self.stats['delivered'] += 1
+
+    def subscribe(self, types=None, last_id=None):
+        """Registra uma conexão; retorna None se o limite de conexões foi atingido."""
+        sub = Subscription(types)
+        with self._lock:
+            if len(self._subscribers) >= MAX_SUBSCRIBERS:
+                self.stats['rejected'] += 1
+                return None
+            self._subscribers.add(sub)
+            if last_id is not None:
+                missed, overflowed = self._replay(last_id, sub.types)
+                if overflowed:
+                    sub.overflowed = True  # perdeu mais do que o buffer de replay guarda
+                for event in missed:
+                    sub.push(event)
+        return sub
+
+    def since(self, last_id, types=None):
+        """Polling: (eventos depois de last_id, último id, perdeu_eventos).
+
+        Sem last_id não devolve eventos, só o id de onde a próxima chamada parte.
+        """
+        with self._lock:
+            if last_id is None:
+                return [], self._last_id, False
+            missed, overflowed = self._replay(last_id, set(types) if types else None)
+            return missed, self._last_id, overflowed
+
+    def _replay(self, last_id, types):
+        oldest = self._recent[0]['id'] if self._recent else self._last_id + 1
+        if oldest > last_id + 1:
+            return [], True
+        return [event for event in self._recent
+                if event['id'] > last_id and (types is None or event['type'] in types)], False
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['subscribers'] = len(self._subscribers)
+        stats['backend'] = type(self).__name__
+        return stats
+
+
+class SQLiteEventBus(EventBus):
+    """Grava os eventos na tabela events e os lê de volta por polling (vale entre workers)."""
+
+    def __init__(self, poll_interval=POLL_INTERVAL):
+        super().__init__()
+        self.poll_interval = poll_interval
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def publish(self, event_type, data):
+        conn = db.get_db_connection()
+        with conn:
+            conn.execute('INSERT INTO events (type, data) VALUES (?, ?)', (event_type, json.dumps(data)))
+        conn.close()
+        self.stats['published'] += 1
+
+    def subscribe(self, types=None, last_id=None):
+        self._ensure_polling()
+        return super().subscribe(types, last_id)
+
+    def since(self, last_id, types=None):
+        self._ensure_polling()
+        return super().since(last_id, types)
+
+    def _ensure_polling(self):
+        # Uma thread por processo, iniciada na primeira conexão e recriada após fork
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            # O ponto de partida é lido antes de a thread subir: quem chamou since()
+            # já recebe o último id que o poller vai usar
+            conn = db.get_db_connection()
+            last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM events').fetchone()[0]
+            conn.close()
+            with self._lock:
+                self._last_id = max(self._last_id, last_id)
+            self._thread = threading.Thread(target=self._poll, args=(last_id,), name='event-poller', daemon=True)
+            self._thread.start()
+
+    def _poll(self, last_id):
+        conn = db.get_db_connection()
+        polls = 0
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                rows = conn.execute('SELECT id, type, data FROM events WHERE id > ? ORDER BY id LIMIT 500',
+                                    (last_id,)).fetchall()
+                for row in rows:
+                    last_id = row['id']
+                    self._dispatch({'id': row['id'], 'type': row['type'], 'data': json.loads(row['data'])})
+                polls += 1
+                if polls % 1000 == 0:
+                    with conn:
+                        conn.execute('DELETE FROM events WHERE id <= ?', (last_id - KEEP_ROWS,))
+            except Exception:
+                logger.exception("Event poller failed")
+
+
+bus = SQLiteEventBus() if BACKEND == 'sqlite' else EventBus()
+
+
+def publish(event_type, data):
+    """Publica um evento sem derrubar a requisição se o barramento falhar."""
+    try:
+        bus.publish(event_type, data)
+    except Exception:
+        logger.exception("Event publish failed type=%s", event_type)
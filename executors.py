@@ -0,0 +1,49 @@
+'''
+Pools de execução por processo para o trabalho fora da requisição.
+
+media, timeline, game_sessions e passwords criam o pool na primeira chamada,
+e de novo no processo filho depois de um fork (com preload_app o gunicorn
+cria os workers por fork, e as threads e processos do pai não vão junto).
+Cada pool é encerrado no atexit do processo que o criou.
+'''
+import os
+import atexit
+import threading
+
+
+class LazyExecutor:
+    """Executor criado sob demanda por factory(), um por processo (pid)."""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        atexit.register(self.shutdown)
+
+    def get(self):
+        executor = self._executor
+        if executor is not None and self._pid == os.getpid():
+            return executor
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = self._factory()
+                self._pid = os.getpid()
+            return self._executor
+
+    def submit(self, fn, *args, **kwargs):
+        return self.get().submit(fn, *args, **kwargs)
+
+    def discard(self):
+        """Abandona o pool atual sem esperar (ex.: pool quebrado); o próximo get() cria outro."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None and self._pid == os.getpid():
+            executor.shutdown(wait=False)
+
+    def shutdown(self, wait=True):
+        """Espera os jobs pendentes e encerra o pool deste processo."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None and self._pid == os.getpid():
+            executor.shutdown(wait=wait)
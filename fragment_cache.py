@@ -0,0 +1,123 @@
+'''
+Cache de fragmentos HTML já renderizados (cards de post e blocos do ranking).
+
+A chave de cada fragmento inclui os contadores de versão das entidades de que
+ele depende (post:<id>, user:<id>, ranking:<jogo>), guardados na tabela
+fragment_versions. Quem grava (novo comentário, score, edição de perfil,
+variantes de mídia) incrementa o contador na mesma transação, então a chave
+antiga simplesmente deixa de ser pedida: não há invalidação explícita e todos
+os workers enxergam a versão nova pelo banco.
+
+O backend padrão é um LRU em memória por processo (FRAGMENT_CACHE_MAX_ENTRIES,
+com TTL de FRAGMENT_CACHE_TTL segundos como limite para dependências indiretas,
+como o nome de quem comentou). Um backend compartilhado (memcached, Redis...)
+só precisa implementar get_many/set e ser instalado com set_backend().
+'''
+import os
+import time
+import threading
+from collections import OrderedDict
+
+from markupsafe import Markup
+
+import db
+
+ENABLED = os.environ.get('FRAGMENT_CACHE_ENABLED', '1') == '1'
+MAX_ENTRIES = int(os.environ.get('FRAGMENT_CACHE_MAX_ENTRIES', 5000))
+TTL = float(os.environ.get('FRAGMENT_CACHE_TTL', 300))
+
+
+class FragmentBackend:
+    """Interface dos backends: get_many(chaves) -> {chave: html} e set(chave, html)."""
+
+    def get_many(self, keys):
+        raise NotImplementedError
+
+    def set(self, key, html):
+        raise NotImplementedError
+
+    def clear(self):
+        pass
+
+
+class NullBackend(FragmentBackend):
+    """Backend que nunca guarda nada (cache desligado)."""
+
+    def get_many(self, keys):
+        return {}
+
+    def set(self, key, html):
+        pass
+
+
+class LRUBackend(FragmentBackend):
+    """LRU em memória, limitado em número de entradas, com TTL."""
+
+    def __init__(self, max_entries=MAX_ENTRIES, ttl=TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (html, expires_at)
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get_many(self, keys):
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and entry[1] > now:
+                    self._entries.move_to_end(key)
+                    found[key] = entry[0]
+                elif entry is not None:
+                    del self._entries[key]
+            self.stats['hits'] += len(found)
+            self.stats['misses'] += len(keys) - len(found)
+        return found
+
+    def set(self, key, html):
+        with self._lock:
+            self._entries[key] = (html, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+backend = LRUBackend() if ENABLED else NullBackend()
+
+
+def set_backend(new_backend):
+    """Troca o backend do processo (ex.: por um compartilhado entre workers)."""
+    global backend
+    backend = new_backend
+
+
+def bump(conn, *names):
+    """Invalida os fragmentos que dependem das entidades dadas (sem commit)."""
+    db.bump_fragment_versions(conn, names)
+
+
+def render_many(conn, items, deps, render):
+    """Retorna o HTML de cada item, reaproveitando os fragmentos em cache.
+
+    deps(item) devolve (prefixo da chave, [nomes de versão]); render(faltando)
+    recebe só os itens que não estavam em cache e devolve seus HTMLs na mesma
+    ordem. Uma única consulta lê todas as versões e uma única chamada ao
+    backend busca todos os fragmentos.
+    """
+    item_deps = [deps(item) for item in items]
+    versions = db.fragment_versions(conn, {name for _, names in item_deps for name in names})
+    keys = [prefix + ':' + ':'.join(f'{name}@{versions[name]}' for name in names)
+            for prefix, names in item_deps]
+    cached = backend.get_many(keys)
+    missing = [i for i, key in enumerate(keys) if key not in cached]
+    if missing:
+        for i, html in zip(missing, render([items[i] for i in missing])):
+            cached[keys[i]] = html
+            backend.set(keys[i], html)
+    return [Markup(cached[key]) for key in keys]
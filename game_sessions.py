@@ -0,0 +1,308 @@
+'''
+Sessões de jogo com log de eventos e validação do score fora da requisição.
+
+O jogo abre uma sessão (POST /api/jogos/sessoes) e recebe um token; no fim
+envia o score junto com o log binário da partida. A rota só marca a sessão
+como "validating" e agenda a conferência num pool de threads; o score só
+entra em scores/best_scores/leaderboard se o log fechar com ele.
+
+Formato do log (versão 1, little-endian, empacotado no navegador com
+Uint16Array/Uint8Array e aqui lido com struct/array):
+
+    cabeçalho  struct '<BBH'  versão, jogo (GAME_CODES), n eventos
+    n x uint16  ms desde o evento anterior (saturado em 65535)
+    n x uint8   tipo do evento (END, PIECE, LINES, PELLET, DEATH)
+    n x uint16  valor do evento
+
+São 5 bytes por evento e a checagem é uma passada linear com limites fixos
+(GAME_LOG_MAX_EVENTS), então o custo de validar é limitado. Não é uma
+repetição fiel da partida (as peças do Tetris e o fantasma do Pac-Man saem de
+Math.random no cliente); o validador confere o que a física dos jogos não
+deixa fraudar barato:
+
+- Tetris: cada LINES (1 a 4 linhas, logo após um PIECE) vale linhas * 10; o
+  total de linhas nunca passa do que as peças encaixadas preenchem (4
+  células por peça, GAME_TETRIS_COLS células por linha) e peças não caem
+  mais rápido que GAME_TETRIS_MIN_PIECE_MS;
+- Pac-Man: cada PELLET traz a célula comida, que precisa ter pastilha no mapa
+  e não ter sido comida antes; o Pac-Man anda uma célula por tick
+  (PACMAN_TICK_MS), então a distância entre pastilhas seguidas é limitada pelo
+  tempo; no máximo 3 DEATH e vitória só com o mapa limpo. Cada pastilha vale 10.
+
+Em ambos a soma dos intervalos não pode passar do tempo de parede da sessão no
+servidor (mais GAME_CLOCK_SLACK_MS) e o log termina com um único END.
+'''
+import os
+import sys
+import time
+import array
+import base64
+import binascii
+import logging
+import secrets
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+import db
+import score_writer
+from executors import LazyExecutor
+
+logger = logging.getLogger(__name__)
+
+WORKERS = int(os.environ.get('GAME_VALIDATE_WORKERS', 2))
+SESSION_TTL = float(os.environ.get('GAME_SESSION_TTL', 6 * 3600))  # segundos para enviar o score
+SESSION_KEEP = float(os.environ.get('GAME_SESSION_KEEP', 24 * 3600))  # histórico de sessões fechadas
+MAX_EVENTS = min(int(os.environ.get('GAME_LOG_MAX_EVENTS', 50000)), 0xFFFF)
+CLOCK_SLACK_MS = int(os.environ.get('GAME_CLOCK_SLACK_MS', 5000))
+TETRIS_MIN_PIECE_MS = int(os.environ.get('GAME_TETRIS_MIN_PIECE_MS', 16))
+
+LOG_VERSION = 1
+_HEADER = struct.Struct('<BBH')
+MAX_LOG_BYTES = _HEADER.size + 5 * MAX_EVENTS
+
+GAMES = {'tetris': 1, 'pacman': 2}
+GAME_CODES = {code: game for game, code in GAMES.items()}
+
+END, PIECE, LINES, PELLET, DEATH = range(5)
+
+TETRIS_COLS = 12
+TETRIS_PIECES = 7  # 'ILJOTSZ'
+TETRIS_POINTS_PER_LINE = 10
+
+PACMAN_COLS = PACMAN_ROWS = 20  # canvas 300x300 com TILE 15
+PACMAN_START = 1 * PACMAN_COLS + 1
+PACMAN_TICK_MS = 200
+PACMAN_LIVES = 3
+PACMAN_POINTS_PER_PELLET = 10
+
+stats = {'started': 0, 'submitted': 0, 'accepted': 0, 'rejected': 0}
+
+_pool = LazyExecutor(lambda: ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='game-validate'))
+
+
+class SessionError(Exception):
+    """Sessão inexistente, de outro usuário, expirada ou já enviada; status é o código HTTP."""
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+def _pacman_pellets():
+    # Mesmo mapa do static/games/pacman/index.html: borda e grades de parede, o resto tem pastilha
+    cells = set()
+    for y in range(PACMAN_ROWS):
+        for x in range(PACMAN_COLS):
+            if x in (0, PACMAN_COLS - 1) or y in (0, PACMAN_ROWS - 1):
+                continue
+            if x % 4 == 0 and y % 4 != 0 and 2 < y < PACMAN_ROWS - 3:
+                continue
+            if y % 4 == 0 and x % 4 != 0 and 2 < x < PACMAN_COLS - 3:
+                continue
+            cells.add(y * PACMAN_COLS + x)
+    return frozenset(cells)
+
+
+PACMAN_PELLETS = _pacman_pellets()
+
+
+def encode_log(game, entries):
+    """Empacota [(ms, tipo, valor)] no formato do log (o mesmo que os jogos montam em JS)."""
+    deltas = array.array('H', (min(dt, 0xFFFF) for dt, _, _ in entries))
+    kinds = array.array('B', (kind for _, kind, _ in entries))
+    values = array.array('H', (value for _, _, value in entries))
+    if sys.byteorder == 'big':
+        deltas.byteswap()
+        values.byteswap()
+    return _HEADER.pack(LOG_VERSION, GAMES[game], len(entries)) + deltas.tobytes() + kinds.tobytes() + values.tobytes()
+
+
+def decode_log(raw):
+    """Desempacota o log em (jogo, deltas, tipos, valores). Levanta ValueError se malformado."""
+    if len(raw) < _HEADER.size or len(raw) > MAX_LOG_BYTES:
+        raise ValueError('log size out of bounds')
+    version, code, count = _HEADER.unpack_from(raw)
+    if version != LOG_VERSION:
+        raise ValueError(f'unsupported log version {version}')
+    if code not in GAME_CODES:
+        raise ValueError('unknown game code')
+    if len(raw) != _HEADER.size + 5 * count:
+        raise ValueError('log length does not match event count')
+    offset = _HEADER.size
+    deltas = array.array('H', raw[offset:offset + 2 * count])
+    kinds = array.array('B', raw[offset + 2 * count:offset + 3 * count])
+    values = array.array('H', raw[offset + 3 * count:])
+    if sys.byteorder == 'big':
+        deltas.byteswap()
+        values.byteswap()
+    return GAME_CODES[code], deltas, kinds, values
+
+
+def _check_tetris(deltas, kinds, values):
+    pieces = lines = score = 0
+    since_piece = TETRIS_MIN_PIECE_MS
+    previous = None
+    for dt, kind, value in zip(deltas, kinds, values):
+        since_piece += dt
+        if kind == PIECE:
+            if value >= TETRIS_PIECES:
+                return None, 'unknown piece'
+            if since_piece < TETRIS_MIN_PIECE_MS:
+                return None, 'pieces locked too fast'
+            pieces += 1
+            since_piece = 0
+        elif kind == LINES:
+            if previous != PIECE or not 1 <= value <= 4:
+                return None, 'invalid line clear'
+            lines += value
+            if lines * TETRIS_COLS > pieces * 4:
+                return None, 'more lines than placed cells'
+            score += value * TETRIS_POINTS_PER_LINE
+        elif kind != END:
+            return None, 'unexpected event'
+        previous = kind
+    return score, None
+
+
+def _check_pacman(deltas, kinds, values):
+    eaten = set()
+    position = PACMAN_START
+    since_move = 0
+    deaths = 0
+    for dt, kind, value in zip(deltas, kinds, values):
+        since_move += dt
+        if kind == PELLET:
+            if value not in PACMAN_PELLETS or value in eaten:
+                return None, 'invalid pellet'
+            steps = abs(value % PACMAN_COLS - position % PACMAN_COLS) + abs(value // PACMAN_COLS - position // PACMAN_COLS)
+            # Uma célula por tick, com meio tick de folga para o setInterval atrasado/adiantado
+            if steps * PACMAN_TICK_MS > since_move + PACMAN_TICK_MS // 2:
+                return None, 'pac-man moved too fast'
+            eaten.add(value)
+            position = value
+            since_move = 0
+        elif kind == DEATH:
+            deaths += 1
+            if deaths > PACMAN_LIVES:
+                return None, 'too many deaths'
+            position = PACMAN_START
+            since_move = 0
+        elif kind == END:
+            if value and len(eaten) != len(PACMAN_PELLETS):
+                return None, 'won with pellets left'
+            if not value and deaths != PACMAN_LIVES:
+                return None, 'game over with lives left'
+        else:
+            return None, 'unexpected event'
+    return len(eaten) * PACMAN_POINTS_PER_PELLET, None
+
+
+_CHECKERS = {'tetris': _check_tetris, 'pacman': _check_pacman}
+
+
+def validate(game, raw, claimed_score, elapsed_ms):
+    """Confere o log de uma partida. Retorna (True, None) ou (False, motivo).
+
+    elapsed_ms é o tempo de parede da sessão medido no servidor.
+    """
+    try:
+        log_game, deltas, kinds, values = decode_log(raw)
+    except (ValueError, struct.error) as exc:
+        return False, str(exc)
+    if log_game != game:
+        return False, 'log is for another game'
+    if not kinds or kinds[-1] != END or kinds.count(END) != 1:
+        return False, 'log must end with a single END'
+    if sum(deltas) > elapsed_ms + CLOCK_SLACK_MS:
+        return False, 'log is longer than the session'
+    score, reason = _CHECKERS[game](deltas, kinds, values)
+    if reason:
+        return False, reason
+    if score != claimed_score:
+        return False, f'score {claimed_score} does not match log ({score})'
+    return True, None
+
+
+def start_session(conn, user_id, game):
+    """Abre uma sessão e retorna o token (com commit).
+
+    Uma sessão aberta por usuário e jogo: abrir outra abandona a anterior. Sessões
+    fechadas há mais de GAME_SESSION_KEEP segundos são apagadas aqui mesmo.
+    """
+    if game not in GAMES:
+        raise SessionError('unknown game', 400)
+    token = secrets.token_urlsafe(16)
+    now = time.time()
+    with conn:
+        conn.execute("DELETE FROM game_sessions WHERE user_id = ? AND game = ? AND status = 'open'", (user_id, game))
+        conn.execute('DELETE FROM game_sessions WHERE user_id = ? AND started_at < ?', (user_id, now - SESSION_KEEP))
+        conn.execute("INSERT INTO game_sessions (token, user_id, game, started_at, status) VALUES (?, ?, ?, ?, 'open')",
+                     (token, user_id, game, now))
+    stats['started'] += 1
+    return token
+
+
+def get_session(conn, token, user_id):
+    """Retorna a linha da sessão do usuário ou None."""
+    return conn.execute('SELECT * FROM game_sessions WHERE token = ? AND user_id = ?', (token, user_id)).fetchone()
+
+
+def submit(conn, token, user_id, score, log_b64, write_mode='direct', write_timeout=5.0):
+    """Fecha a sessão com o score e o log (base64) e agenda a validação.
+
+    Levanta SessionError (404 inexistente, 409 já enviada, 410 expirada, 413 log
+    grande demais, 400 log ilegível). A sessão fica em "validating" até o worker
+    gravar "accepted" ou "rejected"; o score aceito é gravado por
+    score_writer.save com write_mode/write_timeout (o SCORE_WRITE_MODE da app).
+    """
+    if not isinstance(log_b64, str) or len(log_b64) > (MAX_LOG_BYTES + 2) // 3 * 4:
+        raise SessionError('log too large', 413)
+    try:
+        raw = base64.b64decode(log_b64, validate=True)
+    except (binascii.Error, ValueError):
+        raise SessionError('log must be base64', 400)
+    row = get_session(conn, token, user_id)
+    if row is None:
+        raise SessionError('session not found', 404)
+    now = time.time()
+    if row['status'] != 'open':
+        raise SessionError(f"session already {row['status']}", 409)
+    if now - row['started_at'] > SESSION_TTL:
+        with conn:
+            conn.execute("UPDATE game_sessions SET status = 'expired', finished_at = ? WHERE token = ?", (now, token))
+        raise SessionError('session expired', 410)
+    with conn:
+        cur = conn.execute("UPDATE game_sessions SET status = 'validating', score = ?, finished_at = ? "
+                           "WHERE token = ? AND status = 'open'", (score, now, token))
+    if cur.rowcount == 0:
+        raise SessionError('session already submitted', 409)
+    stats['submitted'] += 1
+    elapsed_ms = (now - row['started_at']) * 1000
+    return _pool.submit(_run, token, user_id, row['game'], score, raw, elapsed_ms, write_mode, write_timeout)
+
+
+def _run(token, user_id, game, score, raw, elapsed_ms, write_mode='direct', write_timeout=5.0):
+    try:
+        ok, reason = validate(game, raw, score, elapsed_ms)
+        if ok:
+            # Mesmo caminho das rotas de score (fila write-behind, ranking, evento);
+            # a sessão só vira "accepted" depois que o score foi gravado ou enfileirado
+            score_writer.save([(user_id, game, score)], write_mode, write_timeout)
+        conn = db.get_db_connection()
+        try:
+            with conn:
+                conn.execute('UPDATE game_sessions SET status = ?, reason = ? WHERE token = ?',
+                             ('accepted' if ok else 'rejected', reason, token))
+        finally:
+            conn.close()
+    except Exception:
+        logger.exception("Game session %s validation failed", token)
+        return
+    if ok:
+        stats['accepted'] += 1
+    else:
+        stats['rejected'] += 1
+        logger.warning("Game session rejected user_id=%s game=%s score=%s: %s", user_id, game, score, reason)
+
+
+shutdown = _pool.shutdown
@@ -0,0 +1,26 @@
+import os
+import argparse
+
+from db import init_db, get_db_connection
+from media import collect_garbage
+
+STATIC_ROOT = os.path.join(os.path.dirname(__file__), 'static')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apagar arquivos de mídia sem referências.")
+    parser.add_argument("--grace", type=int, default=3600,
+                        help="Ignora arquivos modificados há menos de N segundos (padrão 3600)")
+    parser.add_argument("--dry-run", action="store_true", help="Só mostra o que seria apagado")
+    args = parser.parse_args()
+
+    init_db()
+    conn = get_db_connection()
+    unreferenced, orphans, deleted = collect_garbage(conn, STATIC_ROOT, args.grace, args.dry_run)
+    conn.close()
+    action = "seriam apagados" if args.dry_run else f"apagados ({deleted} arquivos com variantes)"
+    print(f"[gc_media] {unreferenced} blobs sem referência e {orphans} órfãos {action}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+'''
+Configuração do gunicorn (o gunicorn lê ./gunicorn.conf.py automaticamente).
+
+GUNICORN_PROFILE escolhe o tipo de worker:
+  sync     um processo por requisição em andamento: 2 * núcleos + 1 workers.
+           Uma chamada lenta à IA, um upload grande ou uma conexão SSE
+           (/api/eventos) prende o worker inteiro.
+  gthread  (padrão) núcleos + 1 processos com GUNICORN_THREADS threads cada:
+           requisições lentas esperam numa thread e o processo continua
+           atendendo; o pool de conexões do db.py já é por thread.
+  gevent   loop de eventos (pacote gevent, fora do requirements.txt): núcleos
+           processos com até GUNICORN_WORKER_CONNECTIONS conexões cada, bom
+           para muitas conexões SSE e esperas de rede.
+  live     gevent dedicado às atualizações ao vivo: um processo à parte, com
+           GUNICORN_WORKER_CONNECTIONS (padrão 10000) conexões por worker, que
+           recebe só /api/eventos. Uma conexão ociosa é um greenlet e um
+           buffer, não uma thread. Exige EVENT_BUS=sqlite aqui e no processo
+           web, para os eventos publicados lá chegarem a este processo.
+           O proxy da frente manda o caminho para cá, por exemplo no nginx:
+               location /api/eventos { proxy_pass http://127.0.0.1:8001;
+                                       proxy_buffering off; }
+           e o resto continua no perfil gthread.
+
+Conexões SSE (/api/eventos) por processo: ilimitadas no gevent e no live (limite do
+barramento, EVENT_MAX_SUBSCRIBERS); no gthread, EVENT_SSE_THREAD_SHARE (padrão
+1/4) das threads, para que abas abertas não ocupem o worker todo; no sync,
+nenhuma. Quem passa do limite faz polling. EVENT_SSE_MAX_CONNECTIONS fixa o
+número direto.
+
+GUNICORN_WORKERS e GUNICORN_THREADS sobrescrevem as contas. Nos perfis sync e
+gthread a aplicação é carregada uma vez no master (preload_app) e os workers
+nascem por fork; as conexões SQLite nunca atravessam o fork (o master fecha a
+sua antes e cada worker abre as próprias). No gevent o preload fica desligado:
+o monkey patch precisa acontecer antes de importar a aplicação, senão o
+threading.local do pool de conexões não vira local por greenlet.
+'''
+import os
+import sys
+import multiprocessing
+
+PROFILE = os.environ.get('GUNICORN_PROFILE', 'gthread')
+CORES = multiprocessing.cpu_count()
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))  # 0 = nunca recicla
+max_requests_jitter = max_requests // 10
+
+if PROFILE == 'sync':
+    worker_class = 'sync'
+    workers = 2 * CORES + 1
+    threads = 1
+    preload_app = True
+elif PROFILE == 'gthread':
+    worker_class = 'gthread'
+    workers = CORES + 1
+    threads = int(os.environ.get('GUNICORN_THREADS', 4))
+    preload_app = True
+elif PROFILE in ('gevent', 'live'):
+    try:
+        import gevent  # noqa: F401
+    except ImportError:
+        raise RuntimeError(f"GUNICORN_PROFILE={PROFILE} precisa do pacote gevent (pip install gevent)")
+    if PROFILE == 'live' and os.environ.get('EVENT_BUS') != 'sqlite':
+        raise RuntimeError("GUNICORN_PROFILE=live precisa de EVENT_BUS=sqlite (também no processo web)")
+    worker_class = 'gevent'
+    workers = CORES
+    worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000 if PROFILE == 'gevent' else 10000))
+    preload_app = False
+else:
+    raise RuntimeError(f"GUNICORN_PROFILE desconhecido: {PROFILE} (use sync, gthread, gevent ou live)")
+
+workers = int(os.environ.get('GUNICORN_WORKERS', workers))
+
+if worker_class != 'gevent':
+    # Lido por routes/live.py nos workers (herdam o ambiente do master)
+    sse_share = float(os.environ.get('EVENT_SSE_THREAD_SHARE', 0.25))
+    sse_connections = int(threads * sse_share) if worker_class == 'gthread' else 0
+    os.environ.setdefault('EVENT_SSE_MAX_CONNECTIONS', str(sse_connections))
+
+
+def when_ready(server):
+    server.log.info("Profile %s: %s workers=%s threads=%s preload=%s sse=%s", PROFILE, worker_class,
+                    server.cfg.workers, server.cfg.threads, server.cfg.preload_app,
+                    os.environ.get('EVENT_SSE_MAX_CONNECTIONS', 'unlimited'))
+
+
+# Os hooks só mexem no db.py se a aplicação já foi carregada (preload): importá-lo
+# aqui no master anteciparia o import que o perfil gevent precisa fazer depois do patch
+
+def pre_fork(server, worker):
+    db = sys.modules.get('db')
+    if db is not None:
+        db.close_pool()  # conexão aberta no master durante o preload não vai para o worker
+
+
+def post_fork(server, worker):
+    db = sys.modules.get('db')
+    if db is not None:
+        db.reset_after_fork()
+
+
+def post_worker_init(worker):
+    # Com a aplicação já carregada (em todos os perfis): o ranking em memória é
+    # aquecido antes da primeira requisição, e não no primeiro acesso ao ranking
+    leaderboard = sys.modules.get('leaderboard')
+    if leaderboard is not None:
+        try:
+            worker.log.info("Leaderboard warmed: %s entries", leaderboard.board.warm())
+        except Exception:
+            worker.log.exception("Leaderboard warm-up failed; it will load on first use")
@@ -0,0 +1,231 @@
+'''
+Cache de respostas da IA (prompt normalizado + parâmetros do modelo -> resposta).
+
+Opcional (IA_CACHE_ENABLED=1). Mantém um LRU em memória com TTL e limite de
+tamanho em bytes, pode persistir as respostas na tabela ai_reply_cache para
+sobreviver a reinícios (IA_CACHE_PERSIST=1) e deduplica chamadas simultâneas
+com o mesmo prompt (single-flight): só a primeira vai ao modelo, as demais
+esperam pelo mesmo resultado. No streaming (stream_or_compute) quem chega
+depois recebe os pedaços já gerados e acompanha o resto conforme chega.
+'''
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+import db
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get('IA_CACHE_ENABLED', '0') == '1'
+TTL = float(os.environ.get('IA_CACHE_TTL', 3600))
+MAX_BYTES = int(os.environ.get('IA_CACHE_MAX_BYTES', 4 * 1024 * 1024))
+PERSIST = os.environ.get('IA_CACHE_PERSIST', '0') == '1'
+
+
+def normalize_prompt(prompt):
+    """Normaliza o prompt: minúsculas e espaços colapsados."""
+    return ' '.join(prompt.lower().split())
+
+
+def make_key(prompt, **params):
+    """Chave do cache a partir do prompt normalizado e dos parâmetros do modelo."""
+    raw = json.dumps([normalize_prompt(prompt), params], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class _Flight:
+    __slots__ = ('event', 'cond', 'chunks', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.cond = threading.Condition()
+        self.chunks = []  # pedaços já recebidos quando o líder está em streaming
+        self.result = None
+        self.error = None
+
+
+class LeaderGone(Exception):
+    """O stream líder foi fechado (cliente desconectou) antes de terminar a resposta."""
+
+
+class ResponseCache:
+    """LRU com TTL e limite em bytes, com persistência opcional em SQLite."""
+
+    def __init__(self, ttl=TTL, max_bytes=MAX_BYTES, persist=PERSIST):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.persist = persist
+        self._entries = OrderedDict()  # key -> (reply, expires_at, size)
+        self._bytes = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'evictions': 0, 'persisted_hits': 0}
+
+    def _store(self, key, reply, expires_at):
+        size = len(reply.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[2]
+        self._entries[key] = (reply, expires_at, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.stats['evictions'] += 1
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    self.stats['hits'] += 1
+                    return entry[0]
+                del self._entries[key]
+                self._bytes -= entry[2]
+        if self.persist:
+            conn = db.get_db_connection()
+            row = conn.execute('SELECT reply, expires_at FROM ai_reply_cache WHERE key = ? AND expires_at > ?',
+                               (key, now)).fetchone()
+            conn.close()
+            if row is not None:
+                with self._lock:
+                    self._store(key, row['reply'], row['expires_at'])
+                    self.stats['hits'] += 1
+                    self.stats['persisted_hits'] += 1
+                return row['reply']
+        with self._lock:
+            self.stats['misses'] += 1
+        return None
+
+    def set(self, key, reply):
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._store(key, reply, expires_at)
+        if self.persist:
+            conn = db.get_db_connection()
+            with conn:
+                conn.execute(
+                    'INSERT INTO ai_reply_cache (key, reply, expires_at) VALUES (?, ?, ?) '
+                    'ON CONFLICT(key) DO UPDATE SET reply = excluded.reply, expires_at = excluded.expires_at',
+                    (key, reply, expires_at)
+                )
+            conn.close()
+
+    def _join(self, key):
+        """Entra no voo da chave. Retorna (voo, True se esta chamada é a líder)."""
+        with self._lock:
+            flight = self._inflight.get(key)
+            if flight is None:
+                flight = self._inflight[key] = _Flight()
+                return flight, True
+            self.stats['coalesced'] += 1
+            return flight, False
+
+    def _land(self, key, flight):
+        with self._lock:
+            self._inflight.pop(key, None)
+        with flight.cond:
+            flight.event.set()
+            flight.cond.notify_all()
+
+    def get_or_compute(self, key, compute):
+        """Retorna a resposta em cache ou chama compute() uma única vez por chave em voo."""
+        reply = self.get(key)
+        if reply is not None:
+            return reply
+        flight, leader = self._join(key)
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = compute()
+            if flight.result:
+                self.set(key, flight.result)
+            return flight.result
+        except Exception as exc:
+            flight.error = exc
+            raise
+        finally:
+            self._land(key, flight)
+
+    def stream_or_compute(self, key, stream):
+        """Gera a resposta em pedaços: do cache, de stream() (líder) ou do voo em andamento.
+
+        Chamadas simultâneas com a mesma chave não vão ao modelo: recebem os
+        pedaços que o líder já repassou e os seguintes conforme chegam. Se o
+        líder for um get_or_compute, recebem a resposta inteira ao final.
+        """
+        reply = self.get(key)
+        if reply is not None:
+            yield reply
+            return
+        flight, leader = self._join(key)
+        if not leader:
+            yield from self._follow(flight)
+            return
+        try:
+            for text in stream():
+                with flight.cond:
+                    flight.chunks.append(text)
+                    flight.cond.notify_all()
+                yield text
+            flight.result = ''.join(flight.chunks)
+            if flight.result:
+                self.set(key, flight.result)
+        except GeneratorExit:
+            flight.error = LeaderGone()
+            raise
+        except Exception as exc:
+            flight.error = exc
+            raise
+        finally:
+            self._land(key, flight)
+
+    def _follow(self, flight):
+        sent = 0
+        while True:
+            with flight.cond:
+                while sent == len(flight.chunks) and not flight.event.is_set():
+                    flight.cond.wait()
+                chunks = flight.chunks[sent:]
+                finished = flight.event.is_set()
+            sent += len(chunks)
+            yield from chunks
+            if finished:
+                break
+        if flight.error is not None:
+            raise flight.error
+        if not flight.chunks and flight.result:
+            yield flight.result
+
+    def purge_expired(self):
+        """Remove entradas vencidas da tabela persistente. Retorna quantas foram apagadas."""
+        conn = db.get_db_connection()
+        with conn:
+            deleted = conn.execute('DELETE FROM ai_reply_cache WHERE expires_at <= ?', (time.time(),)).rowcount
+        conn.close()
+        return deleted
+
+    def snapshot(self):
+        """Contadores e ocupação atuais, para monitoramento."""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        stats['enabled'] = ENABLED
+        return stats
+
+
+cache = ResponseCache()
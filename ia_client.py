@@ -0,0 +1,127 @@
+'''
+Cliente HTTP do servidor de modelo local (LM Studio).
+
+Usa uma requests.Session com pool de conexões keep-alive, timeouts de conexão
+e leitura e um semáforo que limita quantas chamadas simultâneas chegam ao
+modelo: se todas as vagas estiverem ocupadas por mais de IA_QUEUE_TIMEOUT,
+a chamada falha rápido com ModelBusy em vez de prender o worker.
+'''
+import os
+import json
+import logging
+import threading
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+IA_URL = os.environ.get('IA_URL', 'http://127.0.0.1:1234')
+CONNECT_TIMEOUT = float(os.environ.get('IA_CONNECT_TIMEOUT', 3))
+READ_TIMEOUT = float(os.environ.get('IA_READ_TIMEOUT', 60))
+MAX_CONCURRENCY = int(os.environ.get('IA_MAX_CONCURRENCY', 4))
+QUEUE_TIMEOUT = float(os.environ.get('IA_QUEUE_TIMEOUT', 2))
+DEFAULT_MAX_TOKENS = 100
+
+
+class ModelBusy(Exception):
+    """Todas as vagas para o servidor de modelo estão ocupadas."""
+
+
+class ModelError(Exception):
+    """O servidor de modelo respondeu com erro (status HTTP em status_code)."""
+
+    def __init__(self, status_code):
+        super().__init__(f'status {status_code}')
+        self.status_code = status_code
+
+
+_limiter = threading.BoundedSemaphore(MAX_CONCURRENCY)
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Retorna a Session compartilhada do processo (recriada após fork)."""
+    global _session, _session_pid
+    if _session is not None and _session_pid == os.getpid():
+        return _session
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MAX_CONCURRENCY, max_retries=0)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session = session
+            _session_pid = os.getpid()
+    return _session
+
+
+@contextmanager
+def _slot():
+    if not _limiter.acquire(timeout=QUEUE_TIMEOUT):
+        raise ModelBusy()
+    try:
+        yield
+    finally:
+        _limiter.release()
+
+
+def _extract_text(payload):
+    """Extrai o texto de uma resposta ou de um chunk de streaming."""
+    if 'response' in payload:
+        return payload['response'] or ''
+    choices = payload.get('choices') or []
+    if choices:
+        choice = choices[0]
+        if 'delta' in choice:
+            return choice['delta'].get('content') or ''
+        if 'text' in choice:
+            return choice['text'] or ''
+        if 'message' in choice:
+            return choice['message'].get('content') or ''
+    return ''
+
+
+def complete(prompt, max_tokens=DEFAULT_MAX_TOKENS):
+    """Envia o prompt e retorna a resposta completa do modelo."""
+    with _slot():
+        response = get_session().post(IA_URL, json={'prompt': prompt, 'max_tokens': max_tokens},
+                                      timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+        if not response.ok:
+            raise ModelError(response.status_code)
+        return _extract_text(response.json())
+
+
+def stream(prompt, max_tokens=DEFAULT_MAX_TOKENS):
+    """Gera os pedaços de texto da resposta conforme chegam do modelo.
+
+    Aceita respostas em SSE (linhas "data: {...}", terminando em [DONE]) ou
+    em JSON por linha. A vaga do limitador fica presa até o gerador terminar
+    ou ser fechado.
+    """
+    with _slot():
+        response = get_session().post(IA_URL, json={'prompt': prompt, 'max_tokens': max_tokens, 'stream': True},
+                                      timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), stream=True)
+        try:
+            if not response.ok:
+                raise ModelError(response.status_code)
+            for line in response.iter_lines(decode_unicode=True):
+                if not line:
+                    continue
+                if line.startswith('data:'):
+                    line = line[5:].strip()
+                if line == '[DONE]':
+                    break
+                try:
+                    payload = json.loads(line)
+                except ValueError:
+                    logger.warning("Ignoring malformed chunk from model server: %r", line[:200])
+                    continue
+                text = _extract_text(payload)
+                if text:
+                    yield text
+        finally:
+            response.close()
@@ -0,0 +1,254 @@
+'''
+Ranking em memória dos jogos.
+
+Mantém, por jogo, uma skip list indexável com o melhor score de cada usuário,
+o que permite responder "qual a minha posição?", "quem está perto de mim?" e
+"posições 500 a 520" em O(log n), sem o GROUP BY sobre a tabela scores.
+
+O estado é local a cada processo: é aquecido a partir de best_scores quando
+o worker do gunicorn sobe (post_worker_init no gunicorn.conf.py; fora do
+gunicorn, no primeiro uso) e sincronizado periodicamente com os scores gravados por outros
+workers (scores.id maior que o último id visto).
+'''
+import random
+import threading
+import time
+import logging
+
+import db
+
+logger = logging.getLogger(__name__)
+
+MAX_LEVEL = 24  # suficiente para ~16M usuários por jogo
+SYNC_INTERVAL = 2.0  # segundos entre sincronizações com o banco
+
+
+class _Node:
+    __slots__ = ('key', 'next', 'width')
+
+    def __init__(self, key, level):
+        self.key = key
+        self.next = [None] * level
+        self.width = [1] * level
+
+
+class IndexableSkipList:
+    """Skip list ordenada com larguras por nível (rank/select em O(log n)).
+
+    width[lvl] é o número de posições do nível 0 entre o nó e o próximo nó no
+    nível lvl; o fim da lista conta como uma posição virtual após o último item.
+    """
+
+    def __init__(self):
+        self.head = _Node(None, MAX_LEVEL)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def _random_level(self):
+        level = 1
+        while level < MAX_LEVEL and random.random() < 0.5:
+            level += 1
+        return level
+
+    def insert(self, key):
+        chain = [None] * MAX_LEVEL
+        steps_at_level = [0] * MAX_LEVEL
+        node = self.head
+        for lvl in range(MAX_LEVEL - 1, -1, -1):
+            while node.next[lvl] is not None and node.next[lvl].key < key:
+                steps_at_level[lvl] += node.width[lvl]
+                node = node.next[lvl]
+            chain[lvl] = node
+        level = self._random_level()
+        new = _Node(key, level)
+        steps = 0
+        for lvl in range(level):
+            prev = chain[lvl]
+            new.next[lvl] = prev.next[lvl]
+            prev.next[lvl] = new
+            new.width[lvl] = prev.width[lvl] - steps
+            prev.width[lvl] = steps + 1
+            steps += steps_at_level[lvl]
+        for lvl in range(level, MAX_LEVEL):
+            chain[lvl].width[lvl] += 1
+        self.size += 1
+
+    def remove(self, key):
+        chain = [None] * MAX_LEVEL
+        node = self.head
+        for lvl in range(MAX_LEVEL - 1, -1, -1):
+            while node.next[lvl] is not None and node.next[lvl].key < key:
+                node = node.next[lvl]
+            chain[lvl] = node
+        target = chain[0].next[0]
+        if target is None or target.key != key:
+            raise KeyError(key)
+        level = len(target.next)
+        for lvl in range(level):
+            prev = chain[lvl]
+            prev.width[lvl] += target.width[lvl] - 1
+            prev.next[lvl] = target.next[lvl]
+        for lvl in range(level, MAX_LEVEL):
+            chain[lvl].width[lvl] -= 1
+        self.size -= 1
+
+    def index(self, key):
+        """Posição (base 0) da chave; KeyError se não existir."""
+        node = self.head
+        pos = 0
+        for lvl in range(MAX_LEVEL - 1, -1, -1):
+            while node.next[lvl] is not None and node.next[lvl].key < key:
+                pos += node.width[lvl]
+                node = node.next[lvl]
+        target = node.next[0]
+        if target is None or target.key != key:
+            raise KeyError(key)
+        return pos
+
+    def _node_at(self, index):
+        node = self.head
+        remaining = index + 1
+        for lvl in range(MAX_LEVEL - 1, -1, -1):
+            while node.next[lvl] is not None and node.width[lvl] <= remaining:
+                remaining -= node.width[lvl]
+                node = node.next[lvl]
+        return node
+
+    def slice(self, start, stop):
+        """Chaves nas posições [start, stop) (base 0)."""
+        start = max(start, 0)
+        stop = min(stop, self.size)
+        if start >= stop:
+            return []
+        node = self._node_at(start)
+        keys = []
+        for _ in range(stop - start):
+            keys.append(node.key)
+            node = node.next[0]
+        return keys
+
+
+class _GameBoard:
+    __slots__ = ('entries', 'best')
+
+    def __init__(self):
+        self.entries = IndexableSkipList()  # chaves (-score, user_id)
+        self.best = {}
+
+    def update(self, user_id, score):
+        old = self.best.get(user_id)
+        if old is not None:
+            if score <= old:
+                return False
+            self.entries.remove((-old, user_id))
+        self.entries.insert((-score, user_id))
+        self.best[user_id] = score
+        return True
+
+
+class Leaderboard:
+    """Conjunto de rankings por jogo, protegido por lock e sincronizado com best_scores."""
+
+    def __init__(self, sync_interval=SYNC_INTERVAL):
+        self.sync_interval = sync_interval
+        self._boards = {}
+        self._lock = threading.RLock()
+        self._warm = False
+        self._last_score_id = 0
+        self._synced_at = 0.0
+
+    def _board(self, game):
+        board = self._boards.get(game)
+        if board is None:
+            board = self._boards[game] = _GameBoard()
+        return board
+
+    def _apply(self, rows):
+        for row in rows:
+            self._board(row['game']).update(row['user_id'], row['best_score'])
+
+    def warm(self):
+        """Carrega todo o best_scores (na subida do worker ou no primeiro uso do processo).
+
+        Retorna o número de entradas carregadas.
+        """
+        with self._lock:
+            self._boards = {}
+            conn = db.get_db_connection()
+            # Lê o último id antes: scores posteriores serão reaplicados no sync
+            self._last_score_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM scores').fetchone()[0]
+            rows = conn.execute('SELECT user_id, game, best_score FROM best_scores').fetchall()
+            conn.close()
+            self._apply(rows)
+            self._warm = True
+            self._synced_at = time.monotonic()
+            logger.info("Leaderboard warmed with %s entries", len(rows))
+            return len(rows)
+
+    def sync(self, force=False):
+        """Aplica os scores gravados (por qualquer worker) desde a última leitura."""
+        with self._lock:
+            if not self._warm:
+                self.warm()
+                return
+            if not force and time.monotonic() - self._synced_at < self.sync_interval:
+                return
+            conn = db.get_db_connection()
+            rows = conn.execute(
+                # NOT INDEXED força a busca por faixa de rowid em vez de varrer idx_scores_user_game
+                'SELECT user_id, game, MAX(score) AS best_score, MAX(id) AS last_id '
+                'FROM scores NOT INDEXED WHERE id > ? GROUP BY user_id, game',
+                (self._last_score_id,)
+            ).fetchall()
+            conn.close()
+            self._apply(rows)
+            for row in rows:
+                self._last_score_id = max(self._last_score_id, row['last_id'])
+            self._synced_at = time.monotonic()
+
+    def record(self, game, user_id, score):
+        """Atualiza o ranking após um score gravado. Retorna True se foi recorde pessoal."""
+        with self._lock:
+            if not self._warm:
+                self.warm()
+                return True
+            return self._board(game).update(user_id, score)
+
+    def total(self, game):
+        self.sync()
+        with self._lock:
+            board = self._boards.get(game)
+            return len(board.entries) if board else 0
+
+    def rank(self, game, user_id):
+        """Retorna (posição base 1, melhor score) do usuário, ou None se nunca jogou."""
+        self.sync()
+        with self._lock:
+            board = self._boards.get(game)
+            if board is None or user_id not in board.best:
+                return None
+            score = board.best[user_id]
+            return board.entries.index((-score, user_id)) + 1, score
+
+    def range(self, game, start, stop):
+        """Retorna [(posição, user_id, score)] para as posições start..stop (base 1, inclusivo)."""
+        self.sync()
+        with self._lock:
+            board = self._boards.get(game)
+            if board is None:
+                return []
+            keys = board.entries.slice(start - 1, stop)
+        return [(start + i, user_id, -neg_score) for i, (neg_score, user_id) in enumerate(keys)]
+
+    def around(self, game, user_id, radius=5):
+        """Retorna a vizinhança de radius posições acima e abaixo do usuário."""
+        found = self.rank(game, user_id)
+        if found is None:
+            return []
+        position = found[0]
+        return self.range(game, max(1, position - radius), position + radius)
+
+
+board = Leaderboard()
@@ -0,0 +1,355 @@
+'''
+Pipeline de mídia dos uploads (posts e avatares).
+
+O upload é gravado em disco em blocos, num store endereçado por conteúdo
+(SHA-256, com contagem de referências em media_blobs), e entregue a um pool
+de threads, que gera as variantes leves servidas pelas páginas: imagem
+reduzida para o feed, miniatura do avatar e quadro de capa dos vídeos. Os caminhos das variantes são gravados em colunas próprias; até
+o processamento terminar (ou se Pillow/ffmpeg não estiverem instalados) as
+páginas continuam usando o arquivo original.
+'''
+import os
+import re
+import glob
+import time
+import shutil
+import hashlib
+import logging
+import tempfile
+import subprocess
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import request
+
+import db
+from executors import LazyExecutor
+
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+CAS_DIR = 'cas'
+WORKERS = int(os.environ.get('MEDIA_WORKERS', 2))
+PREVIEW_WIDTH = 640
+AVATAR_SIZE = 160  # maior avatar exibido é 80px; 2x para telas de alta densidade
+
+IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+VIDEO_EXTENSIONS = {'mp4', 'mov', 'webm'}
+
+_VARIANT_RE = re.compile(r'^([0-9a-f]{64})_[a-z0-9]+\.[a-z0-9]+$')
+
+_pool = LazyExecutor(lambda: ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='media'))
+
+
+def media_kind(path):
+    """Retorna 'image', 'video' ou None a partir da extensão do arquivo."""
+    if not path or '.' not in path:
+        return None
+    ext = path.rsplit('.', 1)[1].lower()
+    if ext in IMAGE_EXTENSIONS:
+        return 'image'
+    if ext in VIDEO_EXTENSIONS:
+        return 'video'
+    return None
+
+
+def store_upload(file_storage, upload_root):
+    """Grava o upload no store endereçado por conteúdo e retorna o caminho relativo a static.
+
+    O arquivo é lido em blocos de CHUNK_SIZE, que vão ao mesmo tempo para um
+    arquivo .part e para o SHA-256. O nome final é <sha256>.<ext>, em
+    uploads/cas/<2>/<2>/. Se o mesmo conteúdo já existe, o .part é descartado.
+    A referência só conta depois de acquire() na transação que grava a linha.
+    """
+    ext = file_storage.filename.rsplit('.', 1)[1].lower()
+    tmp_dir = os.path.join(upload_root, CAS_DIR, 'tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(dir=tmp_dir, suffix='.part', delete=False) as out:
+        for chunk in iter(lambda: file_storage.stream.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+            out.write(chunk)
+    sha = digest.hexdigest()
+    rel_path = '/'.join(('uploads', CAS_DIR, sha[:2], sha[2:4], f'{sha}.{ext}'))
+    full_path = os.path.join(os.path.dirname(upload_root), rel_path)
+    try:
+        os.utime(full_path)  # renova o mtime para o período de carência do GC
+        os.unlink(out.name)
+    except FileNotFoundError:  # conteúdo novo, ou blob recolhido pelo GC agora há pouco
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        os.replace(out.name, full_path)
+    return rel_path
+
+
+def _blob_name(rel_path):
+    return rel_path.rsplit('/', 1)[-1]
+
+
+def acquire(conn, rel_path):
+    """Soma uma referência ao blob (sem commit; use na transação do INSERT/UPDATE)."""
+    if not rel_path or f'/{CAS_DIR}/' not in rel_path:
+        return
+    conn.execute(
+        'INSERT INTO media_blobs (name, path, refcount) VALUES (?, ?, 1) '
+        'ON CONFLICT(name) DO UPDATE SET refcount = refcount + 1',
+        (_blob_name(rel_path), rel_path)
+    )
+
+
+def release(conn, rel_path):
+    """Remove uma referência ao blob (sem commit). Arquivos legados são ignorados."""
+    if not rel_path or f'/{CAS_DIR}/' not in rel_path:
+        return
+    conn.execute('UPDATE media_blobs SET refcount = refcount - 1 WHERE name = ?', (_blob_name(rel_path),))
+
+
+TOMBSTONE_SUFFIX = '.gc'
+
+
+def _bury(full_path):
+    """Renomeia o blob e as variantes para lápides; retorna [(caminho, lápide)].
+
+    Depois da renomeação um upload do mesmo conteúdo não acha mais o arquivo
+    (store_upload grava um novo) e as variantes são geradas de novo.
+    """
+    stem = full_path.rsplit('.', 1)[0]
+    buried = []
+    for path in [full_path] + glob.glob(glob.escape(stem) + '_*'):
+        if path.endswith(TOMBSTONE_SUFFIX):
+            continue
+        try:
+            os.rename(path, path + TOMBSTONE_SUFFIX)
+        except FileNotFoundError:
+            continue
+        buried.append((path, path + TOMBSTONE_SUFFIX))
+    return buried
+
+
+def _restore(buried):
+    for path, tombstone in buried:
+        os.replace(tombstone, path)  # se já houver um arquivo novo, o conteúdo é o mesmo
+
+
+def _purge(buried):
+    for _, tombstone in buried:
+        try:
+            os.unlink(tombstone)
+        except FileNotFoundError:
+            pass
+    return len(buried)
+
+
+def _touched_since(buried, cutoff):
+    """True se um upload renovou o mtime do blob antes da renomeação."""
+    return any(os.path.getmtime(tombstone) > cutoff for _, tombstone in buried)
+
+
+def collect_garbage(conn, static_root, grace=3600, dry_run=False):
+    """Apaga blobs sem referências e arquivos órfãos do store.
+
+    Só considera arquivos com mtime mais antigo que `grace` segundos, para não
+    apagar um upload recém-gravado cuja referência ainda não foi commitada.
+    O arquivo é renomeado para uma lápide antes de a linha ser apagada: se
+    nesse meio tempo um upload renovou o mtime ou somou uma referência, a
+    lápide volta ao nome original; senão é apagada.
+    Retorna (blobs sem referência, órfãos, arquivos apagados).
+    """
+    cutoff = time.time() - grace
+    deleted_files = unreferenced = orphans = 0
+    for row in conn.execute('SELECT name, path FROM media_blobs WHERE refcount <= 0').fetchall():
+        full_path = os.path.join(static_root, row['path'])
+        if os.path.exists(full_path) and os.path.getmtime(full_path) > cutoff:
+            continue
+        unreferenced += 1
+        if dry_run:
+            continue
+        buried = _bury(full_path)
+        if _touched_since(buried, cutoff):
+            _restore(buried)
+            continue
+        with conn:
+            gone = conn.execute('DELETE FROM media_blobs WHERE name = ? AND refcount <= 0', (row['name'],)).rowcount
+        if gone:
+            deleted_files += _purge(buried)
+        else:
+            _restore(buried)
+    known = {row['name'] for row in conn.execute('SELECT name FROM media_blobs')}
+    known_stems = {name.rsplit('.', 1)[0] for name in known}
+    cas_root = os.path.join(static_root, 'uploads', CAS_DIR)
+    for dirpath, _, filenames in os.walk(cas_root):
+        for filename in filenames:
+            full_path = os.path.join(dirpath, filename)
+            if filename in known:
+                continue
+            # Variante (<sha256>_<sufixo>.<ext>) só fica se o blob original ainda é conhecido
+            variant = _VARIANT_RE.match(filename)
+            if variant and variant.group(1) in known_stems:
+                continue
+            try:
+                if os.path.getmtime(full_path) > cutoff:
+                    continue
+            except FileNotFoundError:  # variante já apagada junto com o blob órfão
+                continue
+            orphans += 1
+            if dry_run:
+                continue
+            if filename.endswith(TOMBSTONE_SUFFIX):  # lápide de uma coleta interrompida
+                deleted_files += _purge([(None, full_path)])
+                continue
+            buried = _bury(full_path)
+            if _touched_since(buried, cutoff) or conn.execute(
+                    'SELECT 1 FROM media_blobs WHERE name = ?', (filename,)).fetchone():
+                _restore(buried)
+            else:
+                deleted_files += _purge(buried)
+    return unreferenced, orphans, deleted_files
+
+
+def init_app(app):
+    """Marca os arquivos do store (nome = hash do conteúdo) como cacheáveis para sempre."""
+    @app.after_request
+    def immutable_cas_files(response):
+        if request.endpoint == 'static' and f'/{CAS_DIR}/' in request.path and response.status_code == 200:
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = 31536000
+            response.cache_control.immutable = True
+        return response
+
+
+def _variant_path(rel_path, suffix, ext=None):
+    stem, _, original_ext = rel_path.rpartition('.')
+    return f'{stem}_{suffix}.{ext or original_ext}'
+
+
+@lru_cache(maxsize=1)
+def _pillow():
+    """(Image, ImageOps) do Pillow, importados no primeiro upload; None sem Pillow."""
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:  # Pillow é opcional: sem ele não há variantes de imagem
+        return None
+    return Image, ImageOps
+
+
+def _resize(root, rel_path, suffix, size, crop=False):
+    """Gera uma variante reduzida; retorna o caminho relativo ou None."""
+    pillow = _pillow()
+    if pillow is None:
+        return None
+    Image, ImageOps = pillow
+    src = os.path.join(root, rel_path)
+    dst_rel = _variant_path(rel_path, suffix)
+    if os.path.exists(os.path.join(root, dst_rel)):
+        return dst_rel  # mesmo conteúdo já processado para outro post/usuário
+    with Image.open(src) as img:
+        if getattr(img, 'is_animated', False):
+            return None  # GIF animado: mantém o original
+        img = ImageOps.exif_transpose(img)
+        if crop:
+            img = ImageOps.fit(img, (size, size))
+        elif img.width > size:
+            img.thumbnail((size, size * 10))
+        else:
+            return None
+        if img.mode not in ('RGB', 'L') and dst_rel.lower().endswith(('.jpg', '.jpeg')):
+            img = img.convert('RGB')
+        _save_atomically(img, os.path.join(root, dst_rel))
+    return dst_rel
+
+
+def _temp_sibling(full_path):
+    """Caminho temporário na mesma pasta de full_path, com a mesma extensão."""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(full_path), prefix='.', suffix='.' + full_path.rsplit('.', 1)[1])
+    os.close(fd)
+    return tmp
+
+
+def _save_atomically(img, full_path):
+    """Grava a variante num temporário e troca com os.replace, como store_upload.
+
+    Quem ler a variante (o static ou outro job com o mesmo conteúdo) nunca vê
+    um arquivo pela metade.
+    """
+    tmp = _temp_sibling(full_path)
+    try:
+        img.save(tmp, optimize=True)
+        os.replace(tmp, full_path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _poster_frame(root, rel_path):
+    """Extrai o quadro de capa de um vídeo com ffmpeg, se disponível."""
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None:
+        return None
+    dst_rel = _variant_path(rel_path, 'poster', 'jpg')
+    if os.path.exists(os.path.join(root, dst_rel)):
+        return dst_rel
+    tmp = _temp_sibling(os.path.join(root, dst_rel))
+    try:
+        result = subprocess.run(
+            [ffmpeg, '-y', '-loglevel', 'error', '-ss', '1', '-i', os.path.join(root, rel_path),
+             '-frames:v', '1', '-vf', f'scale={PREVIEW_WIDTH}:-2', tmp],
+            timeout=60, capture_output=True
+        )
+        if result.returncode != 0:
+            logger.warning("ffmpeg failed for %s: %s", rel_path, result.stderr.decode(errors='replace')[:200])
+            return None
+        os.replace(tmp, os.path.join(root, dst_rel))
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+    return dst_rel
+
+
+def _process_post_media(root, post_id, rel_path):
+    kind = media_kind(rel_path)
+    preview = poster = None
+    if kind == 'image':
+        preview = _resize(root, rel_path, f'w{PREVIEW_WIDTH}', PREVIEW_WIDTH)
+    elif kind == 'video':
+        poster = _poster_frame(root, rel_path)
+    if preview or poster:
+        conn = db.get_db_connection()
+        with conn:
+            conn.execute('UPDATE posts SET media_preview_path = ?, media_poster_path = ? WHERE id = ?',
+                         (preview, poster, post_id))
+            db.bump_fragment_versions(conn, [f'post:{post_id}'])
+        conn.close()
+
+
+def _process_avatar(root, user_id, rel_path):
+    thumb = _resize(root, rel_path, 'thumb', AVATAR_SIZE, crop=True) if media_kind(rel_path) == 'image' else None
+    if thumb:
+        conn = db.get_db_connection()
+        with conn:
+            # Só grava se o avatar não tiver sido trocado de novo nesse meio tempo
+            conn.execute('UPDATE users SET avatar_thumb_path = ? WHERE id = ? AND avatar_path = ?',
+                         (thumb, user_id, rel_path))
+            db.bump_fragment_versions(conn, [f'user:{user_id}'])
+        conn.close()
+        db.user_cache.bump(user_id)
+
+
+def _run(job, *args):
+    try:
+        job(*args)
+    except Exception:
+        logger.exception("Media job %s failed for %s", job.__name__, args)
+
+
+def submit_post_media(root, post_id, rel_path):
+    """Agenda a geração das variantes da mídia de um post (rel_path relativo a root, a pasta static)."""
+    return _pool.submit(_run, _process_post_media, root, post_id, rel_path)
+
+
+def submit_avatar(root, user_id, rel_path):
+    """Agenda a geração da miniatura do avatar (rel_path relativo a root, a pasta static)."""
+    return _pool.submit(_run, _process_avatar, root, user_id, rel_path)
+
+
+shutdown = _pool.shutdown
@@ -0,0 +1,340 @@
+'''
+Métricas por requisição e profiler opcional, expostos em /metrics.
+
+Para cada endpoint são medidos: latência (histograma), número de instruções
+SQL e tempo total gasto no SQLite (via db.set_sql_observer, que troca os
+cursores das conexões por db.TimedCursor) e tempo de renderização de
+templates (sinais before_render_template/template_rendered do Flask). O tempo
+de SQL é o dos execute*; METRICS_SQL_FETCH=1 soma também fetch e iteração,
+linha a linha, o que pesa nas consultas com muitas linhas.
+
+/metrics responde no formato texto do Prometheus. As rotas expõem SQL e
+tempos internos: com METRICS_TOKEN definido exigem "Authorization: Bearer
+<token>"; sem ele só respondem a requisições locais (127.0.0.1/::1) que não
+vieram por um proxy (sem X-Forwarded-For/Forwarded), e dão 404 ao resto.
+
+Os números são por processo: com vários workers do gunicorn cada scrape cai
+em um deles (use um rótulo de instância por worker ou um scrape por porta).
+
+Profiler: com METRICS_PROFILE_RATE > 0 (ex.: 0.05 = 5% das requisições) as
+requisições sorteadas rodam sob cProfile; as METRICS_PROFILE_KEEP mais lentas
+ficam gravadas em METRICS_PROFILE_DIR (.prof, abra com pstats ou snakeviz) e
+listadas em /metrics/slow com as funções de maior tempo acumulado.
+'''
+import os
+import io
+import time
+import heapq
+import random
+import pstats
+import cProfile
+import itertools
+import threading
+
+from flask import request, jsonify, abort, Response, before_render_template, template_rendered
+
+import db
+import events
+import fragment_cache
+import game_sessions
+import passwords
+
+ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+TOKEN = os.environ.get('METRICS_TOKEN')
+SQL_FETCH = os.environ.get('METRICS_SQL_FETCH', '0') == '1'
+LOCAL_ADDRS = ('127.0.0.1', '::1')
+PROFILE_RATE = float(os.environ.get('METRICS_PROFILE_RATE', 0))
+PROFILE_KEEP = int(os.environ.get('METRICS_PROFILE_KEEP', 20))
+PROFILE_DIR = os.environ.get('METRICS_PROFILE_DIR', os.path.join(os.path.dirname(__file__), 'db', 'profiles'))
+PREFIX = 'flavinho'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250)
+SQL_TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+# Estado da requisição em andamento na thread (o observador de SQL roda fora
+# do contexto do Flask e também é chamado pelas threads de segundo plano)
+_local = threading.local()
+
+
+class Histogram:
+    """Histograma cumulativo no formato do Prometheus, com uma série por rótulos."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * len(self.buckets), 0.0, 0]
+        counts = series[0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        series[1] += value
+        series[2] += 1
+
+    def lines(self, name, label_names):
+        for labels, (counts, total, count) in sorted(self.series.items()):
+            base = _labels(label_names, labels)
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                yield f'{name}_bucket{{{base},le="{bound}"}} {cumulative}'
+            yield f'{name}_bucket{{{base},le="+Inf"}} {count}'
+            yield f'{name}_sum{{{base}}} {total:.6f}'
+            yield f'{name}_count{{{base}}} {count}'
+
+
+class Registry:
+    """Todas as séries do processo, protegidas por um único lock."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.sql_statements = Histogram(SQL_COUNT_BUCKETS)
+        self.sql_seconds = Histogram(SQL_TIME_BUCKETS)
+        self.template_seconds = Histogram(LATENCY_BUCKETS)
+        self.responses = {}
+        self.background_sql = [0, 0.0]  # instruções e segundos fora de requisições
+        self.started = time.time()
+
+    def record_request(self, endpoint, method, status, elapsed, statements, sql_time):
+        labels = (endpoint, method)
+        with self.lock:
+            self.latency.observe(labels, elapsed)
+            self.sql_statements.observe(labels, statements)
+            self.sql_seconds.observe(labels, sql_time)
+            key = (endpoint, method, str(status))
+            self.responses[key] = self.responses.get(key, 0) + 1
+
+    def record_template(self, template, elapsed):
+        with self.lock:
+            self.template_seconds.observe((template,), elapsed)
+
+    def record_background_sql(self, seconds, statements):
+        with self.lock:
+            self.background_sql[0] += statements
+            self.background_sql[1] += seconds
+
+
+registry = Registry()
+
+
+class SlowRequests:
+    """Guarda os perfis das PROFILE_KEEP requisições mais lentas (min-heap pela duração)."""
+
+    def __init__(self, keep=PROFILE_KEEP, directory=PROFILE_DIR):
+        self.keep = keep
+        self.directory = directory
+        self._heap = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def offer(self, profiler, elapsed, info):
+        with self._lock:
+            if len(self._heap) >= self.keep and elapsed <= self._heap[0][0]:
+                return False
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(self._seq)}-{info['endpoint']}.prof"
+        path = os.path.join(self.directory, name)
+        profiler.dump_stats(path)
+        stats = pstats.Stats(path, stream=io.StringIO())
+        info = dict(info, elapsed_ms=round(elapsed * 1000, 1), file=name, top=_top_functions(stats))
+        with self._lock:
+            entry = (elapsed, next(self._seq), info)
+            if len(self._heap) < self.keep:
+                heapq.heappush(self._heap, entry)
+                evicted = None
+            else:
+                evicted = heapq.heappushpop(self._heap, entry)
+        if evicted is not None:
+            try:
+                os.remove(os.path.join(self.directory, evicted[2]['file']))
+            except OSError:
+                pass
+        return True
+
+    def listing(self):
+        with self._lock:
+            return [info for _, _, info in sorted(self._heap, reverse=True)]
+
+
+slow_requests = SlowRequests()
+
+
+def _top_functions(stats, limit=10):
+    rows = []
+    for (filename, line, func), (_, calls, _, cumulative, _) in stats.stats.items():
+        rows.append((cumulative, calls, f'{os.path.basename(filename)}:{line}({func})'))
+    rows.sort(reverse=True)
+    return [{'function': where, 'calls': calls, 'cumulative_ms': round(cumulative * 1000, 2)}
+            for cumulative, calls, where in rows[:limit]]
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+def _observe_sql(seconds, statements):
+    state = getattr(_local, 'request', None)
+    if state is None:
+        registry.record_background_sql(seconds, statements)
+        return
+    state['sql_statements'] += statements
+    state['sql_seconds'] += seconds
+
+
+def _before_request():
+    state = {'start': time.perf_counter(), 'sql_statements': 0, 'sql_seconds': 0.0,
+             'templates': [], 'profiler': None}
+    _local.request = state
+    if PROFILE_RATE > 0 and random.random() < PROFILE_RATE:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            state['profiler'] = profiler
+        except ValueError:
+            pass  # outro profiler já ativo nesta thread
+
+
+def _after_request(response):
+    state = getattr(_local, 'request', None)
+    if state is not None:
+        _finish(state, response.status_code)
+    return response
+
+
+def _teardown_request(exc=None):
+    # Requisições que terminaram em exceção não passam por after_request
+    state = getattr(_local, 'request', None)
+    if state is not None:
+        _finish(state, 500)
+
+
+def _finish(state, status):
+    _local.request = None
+    elapsed = time.perf_counter() - state['start']
+    profiler = state['profiler']
+    if profiler is not None:
+        profiler.disable()
+    endpoint = request.endpoint or 'not_found'
+    registry.record_request(endpoint, request.method, status, elapsed,
+                            state['sql_statements'], state['sql_seconds'])
+    if profiler is not None:
+        slow_requests.offer(profiler, elapsed, {
+            'endpoint': endpoint,
+            'method': request.method,
+            'path': request.path,
+            'status': status,
+            'sql_statements': state['sql_statements'],
+            'sql_ms': round(state['sql_seconds'] * 1000, 2),
+            'at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        })
+
+
+def _template_started(sender, template, context, **extra):
+    state = getattr(_local, 'request', None)
+    if state is not None:
+        state['templates'].append(time.perf_counter())
+
+
+def _template_finished(sender, template, context, **extra):
+    state = getattr(_local, 'request', None)
+    if state is not None and state['templates']:
+        registry.record_template(template.name or 'string', time.perf_counter() - state['templates'].pop())
+
+
+def _check_access():
+    if TOKEN:
+        if request.headers.get('Authorization') != f'Bearer {TOKEN}':
+            abort(401)
+        return
+    proxied = 'X-Forwarded-For' in request.headers or 'Forwarded' in request.headers
+    if request.remote_addr not in LOCAL_ADDRS or proxied:
+        abort(404)
+
+
+def _gauge(name, help_text, value, kind='gauge'):
+    return [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}', f'{name} {value}']
+
+
+def render_metrics():
+    """Texto no formato de exposição do Prometheus (version 0.0.4)."""
+    lines = []
+    with registry.lock:
+        for name, help_text, histogram, label_names in (
+            ('request_duration_seconds', 'Latência das requisições por endpoint.',
+             registry.latency, ('endpoint', 'method')),
+            ('request_sql_statements', 'Instruções SQL executadas por requisição.',
+             registry.sql_statements, ('endpoint', 'method')),
+            ('request_sql_seconds', 'Tempo gasto no SQLite por requisição.',
+             registry.sql_seconds, ('endpoint', 'method')),
+            ('template_render_seconds', 'Tempo de renderização por template.',
+             registry.template_seconds, ('template',)),
+        ):
+            metric = f'{PREFIX}_{name}'
+            lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} histogram']
+            lines += histogram.lines(metric, label_names)
+        metric = f'{PREFIX}_responses_total'
+        lines += [f'# HELP {metric} Respostas por endpoint e status.', f'# TYPE {metric} counter']
+        for key, count in sorted(registry.responses.items()):
+            lines.append(f'{metric}{{{_labels(("endpoint", "method", "status"), key)}}} {count}')
+        background_statements, background_seconds = registry.background_sql
+    lines += _gauge(f'{PREFIX}_background_sql_statements_total',
+                    'Instruções SQL fora de requisições (workers de segundo plano).',
+                    background_statements, 'counter')
+    lines += _gauge(f'{PREFIX}_background_sql_seconds_total', 'Tempo de SQL fora de requisições.',
+                    f'{background_seconds:.6f}', 'counter')
+
+    pool = db.pool_stats()
+    lines += _gauge(f'{PREFIX}_db_connections_opened_total', 'Conexões SQLite abertas pelo pool.',
+                    pool['opened'], 'counter')
+    lines += _gauge(f'{PREFIX}_db_connections_reused_total', 'Conexões SQLite reaproveitadas.',
+                    pool['reused'], 'counter')
+    cache_stats = getattr(fragment_cache.backend, 'stats', None)
+    if cache_stats:
+        for key, value in sorted(cache_stats.items()):
+            lines += _gauge(f'{PREFIX}_fragment_cache_{key}_total', f'Cache de fragmentos: {key}.', value, 'counter')
+    for key, value in sorted(passwords.stats.items()):
+        lines += _gauge(f'{PREFIX}_password_{key}_total', f'Hash de senhas: {key}.', value, 'counter')
+    for key, value in sorted(game_sessions.stats.items()):
+        lines += _gauge(f'{PREFIX}_game_sessions_{key}_total', f'Sessões de jogo: {key}.', value, 'counter')
+    bus = events.bus.snapshot()
+    lines += _gauge(f'{PREFIX}_event_subscribers', 'Conexões SSE abertas neste processo.', bus['subscribers'])
+    lines += _gauge(f'{PREFIX}_process_start_time_seconds', 'Início das medições neste processo.',
+                    f'{registry.started:.0f}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_endpoint():
+    '''Métricas do processo no formato texto do Prometheus.'''
+    _check_access()
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+def slow_endpoint():
+    '''Requisições mais lentas capturadas pelo profiler, da mais lenta para a mais rápida.'''
+    _check_access()
+    return jsonify({'profile_rate': PROFILE_RATE, 'directory': slow_requests.directory,
+                    'requests': slow_requests.listing()})
+
+
+def init_app(app):
+    """Liga a medição de requisições, SQL e templates e registra /metrics."""
+    if not ENABLED:
+        return
+    db.set_sql_observer(_observe_sql, fetch=SQL_FETCH)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_finished, app)
+    app.add_url_rule('/metrics', 'metrics', metrics_endpoint)
+    app.add_url_rule('/metrics/slow', 'metrics_slow', slow_endpoint)
@@ -0,0 +1,65 @@
+import argparse
+import sys
+
+from db import (get_db_connection, get_schema_version, create_base_schema, run_migrations,
+                check_query_plans, rebuild_best_scores, MIGRATIONS, SCHEMA_VERSION, DB_PATH)
+
+
+def show_status(conn):
+    current = get_schema_version(conn)
+    print(f"[migrate_db] Banco: {DB_PATH}")
+    print(f"[migrate_db] Versão atual: {current} (última disponível: {SCHEMA_VERSION})")
+    for migration in MIGRATIONS:
+        mark = "x" if migration['version'] <= current else " "
+        print(f"  [{mark}] {migration['version']}: {migration['description']}")
+
+
+def check_plans(conn):
+    """Valida com EXPLAIN QUERY PLAN as consultas das migrações já aplicadas."""
+    current = get_schema_version(conn)
+    failures = 0
+    for migration in MIGRATIONS:
+        if migration['version'] > current:
+            continue
+        for sql, ok, plan in check_query_plans(conn, migration):
+            status = "OK  " if ok else "FALHOU"
+            print(f"[migrate_db] {status} v{migration['version']}: {sql}")
+            for line in plan.splitlines():
+                print(f"      {line}")
+            if not ok:
+                failures += 1
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aplicar migrações versionadas do banco SQLite.")
+    parser.add_argument("--status", action="store_true", help="Apenas mostra a versão atual e as migrações")
+    parser.add_argument("--target", type=int, help="Versão alvo (padrão: a mais recente)")
+    parser.add_argument("--rebuild-best-scores", action="store_true",
+                        help="Recalcula a tabela best_scores a partir de scores")
+    parser.add_argument("--check", action="store_true", help="Verifica com EXPLAIN QUERY PLAN se as consultas usam os índices")
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    try:
+        if args.status:
+            show_status(conn)
+            return
+        create_base_schema(conn)  # banco novo: as migrações partem das tabelas da v0
+        applied = run_migrations(conn, args.target)
+        if applied:
+            print(f"[migrate_db] Migrações aplicadas: {', '.join(map(str, applied))}")
+        else:
+            print("[migrate_db] Nenhuma migração pendente.")
+        show_status(conn)
+        if args.rebuild_best_scores:
+            total = rebuild_best_scores(conn)
+            print(f"[migrate_db] best_scores reconstruída: {total} linhas")
+        if args.check and check_plans(conn):
+            sys.exit(1)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+'''
+Hash de senhas fora do worker da requisição.
+
+generate_password_hash/check_password_hash (scrypt por padrão no werkzeug)
+custam dezenas de milissegundos de CPU; feitos na própria requisição, uma
+rajada de logins ocupa todos os workers do gunicorn. Aqui o trabalho vai para
+um ProcessPoolExecutor com PASSWORD_HASH_WORKERS processos e no máximo
+PASSWORD_HASH_MAX_PENDING hashes em andamento ou na fila por worker web;
+acima disso a chamada falha na hora com HashingBusy e a rota responde 429.
+
+Com PASSWORD_HASH_WORKERS=0 o hash roda na própria thread (scripts, testes),
+ainda limitado por PASSWORD_HASH_MAX_PENDING.
+
+Também ficam aqui:
+- needs_rehash(): o hash gravado usa parâmetros diferentes de
+  PASSWORD_HASH_METHOD e deve ser refeito no próximo login bem-sucedido;
+- o cache negativo de identificadores: depois de PASSWORD_NEGATIVE_THRESHOLD
+  tentativas com um usuário/email que não existe, novas tentativas falham
+  sem ir ao banco por PASSWORD_NEGATIVE_TTL segundos. O cadastro limpa a
+  entrada no próprio processo; nos outros workers ela expira pelo TTL.
+'''
+import os
+import time
+import logging
+import threading
+import multiprocessing
+from collections import OrderedDict
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from executors import LazyExecutor
+
+logger = logging.getLogger(__name__)
+
+METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 8))
+TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))
+NEGATIVE_THRESHOLD = int(os.environ.get('PASSWORD_NEGATIVE_THRESHOLD', 3))
+NEGATIVE_TTL = float(os.environ.get('PASSWORD_NEGATIVE_TTL', 30))
+NEGATIVE_MAX_ENTRIES = 10000
+
+stats = {'hashed': 0, 'verified': 0, 'rejected': 0, 'rehashed': 0, 'negative_hits': 0}
+
+_slots = threading.BoundedSemaphore(MAX_PENDING)
+# spawn: os workers web podem ter threads, e fork com threads vivas não é seguro
+_pool = LazyExecutor(lambda: ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context('spawn')))
+
+_missing = OrderedDict()  # identificador -> [falhas, expira_em]
+_missing_lock = threading.Lock()
+
+
+class HashingBusy(Exception):
+    """Fila de hash cheia (ou lenta demais): a requisição deve ser recusada com 429."""
+
+
+def _run(fn, *args):
+    if not _slots.acquire(blocking=False):
+        stats['rejected'] += 1
+        raise HashingBusy()
+    if WORKERS <= 0:
+        try:
+            return fn(*args)
+        finally:
+            _slots.release()
+    try:
+        future = _pool.submit(fn, *args)
+    except Exception:
+        _slots.release()
+        raise
+    # A vaga só volta quando o processo termina o hash, mesmo se a espera abaixo desistir
+    future.add_done_callback(lambda _: _slots.release())
+    try:
+        return future.result(timeout=TIMEOUT)
+    except FutureTimeout:
+        stats['rejected'] += 1
+        raise HashingBusy()
+    except BrokenProcessPool:
+        # Processo morto (OOM, kill) ou __main__ que não pode ser reimportado pelo spawn:
+        # responde desta vez na thread e recria o pool na próxima chamada
+        logger.exception("Password hashing pool broken; hashing inline")
+        _pool.discard()
+        return fn(*args)
+
+
+def _hash(password, method):
+    return generate_password_hash(password, method)
+
+
+def hash_password(password):
+    """Gera o hash com PASSWORD_HASH_METHOD no pool. Pode levantar HashingBusy."""
+    stats['hashed'] += 1
+    return _run(_hash, password, METHOD)
+
+
+def verify_password(password_hash, password):
+    """Confere a senha no pool. Pode levantar HashingBusy."""
+    stats['verified'] += 1
+    return _run(check_password_hash, password_hash, password)
+
+
+@lru_cache(maxsize=1)
+def _current_prefix():
+    # Normaliza METHOD como o werkzeug grava (ex.: "scrypt" vira "scrypt:32768:8:1")
+    return generate_password_hash('', METHOD).split('$', 1)[0]
+
+
+def needs_rehash(password_hash):
+    """True se o hash gravado foi gerado com outro método ou outros parâmetros."""
+    return password_hash.split('$', 1)[0] != _current_prefix()
+
+
+def known_missing(identifier):
+    """True se o identificador falhou vezes suficientes por não existir (e ainda não expirou)."""
+    with _missing_lock:
+        entry = _missing.get(identifier)
+        if entry is None:
+            return False
+        if entry[1] < time.monotonic():
+            del _missing[identifier]
+            return False
+        if entry[0] >= NEGATIVE_THRESHOLD:
+            stats['negative_hits'] += 1
+            return True
+    return False
+
+
+def remember_missing(identifier):
+    """Conta uma tentativa de login com um identificador que não existe."""
+    if NEGATIVE_THRESHOLD <= 0:
+        return
+    with _missing_lock:
+        entry = _missing.pop(identifier, None)
+        if entry is None or entry[1] < time.monotonic():
+            entry = [0, time.monotonic() + NEGATIVE_TTL]
+        entry[0] += 1
+        _missing[identifier] = entry
+        while len(_missing) > NEGATIVE_MAX_ENTRIES:
+            _missing.popitem(last=False)
+
+
+def forget_missing(*identifiers):
+    """Remove identificadores do cache negativo (ex.: depois de um cadastro)."""
+    with _missing_lock:
+        for identifier in identifiers:
+            _missing.pop(identifier, None)
+
+
+shutdown = _pool.shutdown
@@ -0,0 +1,22 @@
+import argparse
+
+from db import init_db, get_db_connection, rebuild_search_index, FTS_TABLES, DB_PATH
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconstruir os índices da busca textual (FTS5).")
+    parser.add_argument("--optimize", action="store_true", help="Funde os segmentos do índice depois da reconstrução")
+    args = parser.parse_args()
+
+    init_db()
+    conn = get_db_connection()
+    rebuild_search_index(conn, optimize=args.optimize)
+    for table in FTS_TABLES:
+        total = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        print(f"[reindex_search] {table}_fts: {total} linhas indexadas")
+    print(f"[reindex_search] Índices reconstruídos em {DB_PATH}")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,11 @@ def reset_db():
         print(f"[reset_db] Removido arquivo {db_path}")
     else:
         print(f"[reset_db] Arquivo {db_path} não existia.")
+    # Arquivos auxiliares do modo WAL
+    for suffix in ("-wal", "-shm"):
+        sidecar = Path(f"{db_path}{suffix}")
+        if sidecar.exists():
+            sidecar.unlink()
     init_db()
     print(f"[reset_db] Banco recriado em {db_path}")
 
@@ -0,0 +1,187 @@
+'''
+Blueprint da API JSON de posts, comentários e perfis.
+
+As respostas de leitura levam ETag (hash do corpo) e respondem 304 a um
+If-None-Match igual; ?fields=id,content,author devolve só os campos pedidos
+de cada item. Sem sessão as rotas respondem 401 em JSON, não o redirect
+para o login das páginas.
+'''
+from flask import Blueprint, request, jsonify, current_app
+
+import db
+import timeline
+from db import get_db_connection, current_user, api_login_required, decode_cursor, user_best_scores, format_timestamp
+from routes.common import (DEFAULT_PAGE_SIZE, DEFAULT_COMMENTS_PREVIEW, page_size, avatar_url, format_post,
+                           follow_stats)
+from routes.feed import (create_post, create_comment, fetch_posts_page, fetch_posts_by_ids,
+                         fetch_comments_page, fetch_comment_previews)
+
+api_bp = Blueprint("api", __name__, url_prefix="/api")
+
+MAX_CONTENT_LENGTH = 5000
+
+
+def _selected_fields():
+    raw = request.args.get("fields")
+    return {f.strip() for f in raw.split(",") if f.strip()} if raw else None
+
+
+def _select(item, fields):
+    return {k: v for k, v in item.items() if k in fields} if fields else item
+
+
+def _conditional_json(payload, status=200):
+    '''jsonify com ETag; devolve 304 se o cliente já tem esta versão.'''
+    response = jsonify(payload)
+    response.status_code = status
+    if request.method == "GET" and status == 200:
+        response.add_etag()
+        response.cache_control.private = True
+        response.cache_control.no_cache = True  # o cliente sempre revalida com If-None-Match
+        response.make_conditional(request)
+    return response
+
+
+def _post_json(row, comments, total):
+    post = format_post(row, comments, total)
+    post['created_at'] = row['created_at']
+    post['media_type'] = row['media_type']
+    return post
+
+
+def _posts_json(conn, rows):
+    preview = current_app.config.get("FEED_COMMENTS_PREVIEW", DEFAULT_COMMENTS_PREVIEW)
+    comments_by_post, totals = fetch_comment_previews(conn, [r['id'] for r in rows], preview)
+    return [_post_json(r, comments_by_post.get(r['id'], []), totals.get(r['id'], 0)) for r in rows]
+
+
+def _read_content(field):
+    '''Lê o texto do corpo (JSON ou formulário); retorna (texto, resposta de erro ou None).'''
+    data = request.get_json(silent=True) if request.is_json else request.form
+    if data is None:
+        data = {}
+    if not hasattr(data, 'get'):
+        return None, (jsonify({'error': 'expected a JSON object'}), 400)
+    content = data.get(field)
+    if content is None:
+        content = ""
+    if not isinstance(content, str):
+        return None, (jsonify({'error': f'{field} must be a string'}), 400)
+    content = content.strip()
+    if len(content) > MAX_CONTENT_LENGTH:
+        return None, (jsonify({'error': f'{field} too long (max {MAX_CONTENT_LENGTH})'}), 400)
+    return content, None
+
+
+@api_bp.route("/posts", methods=["GET"])
+@api_login_required
+def list_posts():
+    '''Posts do mais novo para o mais antigo (?aba=seguindo para a timeline), paginados por cursor.'''
+    user = current_user()
+    limit = page_size("FEED_PAGE_SIZE", DEFAULT_PAGE_SIZE)
+    before = decode_cursor(request.args.get("before"))
+    conn = get_db_connection()
+    if request.args.get("aba") == "seguindo":
+        entries, next_cursor = timeline.read_timeline(conn, user["id"], before, limit)
+        rows = fetch_posts_by_ids(conn, [post_id for post_id, _ in entries])
+    else:
+        rows, next_cursor = fetch_posts_page(conn, before, limit)
+    posts = _posts_json(conn, rows)
+    conn.close()
+    fields = _selected_fields()
+    return _conditional_json({'posts': [_select(p, fields) for p in posts], 'next_cursor': next_cursor})
+
+
+@api_bp.route("/posts", methods=["POST"])
+@api_login_required
+def create_post_api():
+    '''Cria um post: JSON {"content": ...} ou multipart com content e media.'''
+    content, error = _read_content("content")
+    if error:
+        return error
+    conn = get_db_connection()
+    post_id = create_post(conn, current_user(), content, request.files.get("media"))
+    if post_id is None:
+        conn.close()
+        return jsonify({'error': 'post must have content or media'}), 400
+    rows = fetch_posts_by_ids(conn, [post_id])
+    post = _posts_json(conn, rows)[0]
+    conn.close()
+    return jsonify(post), 201
+
+
+@api_bp.route("/posts/<int:post_id>", methods=["GET"])
+@api_login_required
+def get_post(post_id):
+    conn = get_db_connection()
+    rows = fetch_posts_by_ids(conn, [post_id])
+    if not rows:
+        conn.close()
+        return jsonify({'error': 'post not found'}), 404
+    post = _posts_json(conn, rows)[0]
+    conn.close()
+    return _conditional_json(_select(post, _selected_fields()))
+
+
+@api_bp.route("/posts/<int:post_id>/comments", methods=["GET"])
+@api_login_required
+def list_comments(post_id):
+    '''Comentários do post, do mais recente para o mais antigo, paginados por cursor.'''
+    limit = page_size("FEED_COMMENTS_PAGE_SIZE", DEFAULT_PAGE_SIZE)
+    conn = get_db_connection()
+    comments, next_cursor = fetch_comments_page(conn, post_id, decode_cursor(request.args.get("before")), limit)
+    conn.close()
+    fields = _selected_fields()
+    return _conditional_json({'post_id': post_id,
+                              'comments': [_select(c, fields) for c in comments],
+                              'next_cursor': next_cursor})
+
+
+@api_bp.route("/posts/<int:post_id>/comments", methods=["POST"])
+@api_login_required
+def create_comment_api(post_id):
+    '''Cria um comentário: JSON {"content": ...}. Retorna o comentário formatado (201).'''
+    content, error = _read_content("content")
+    if error:
+        return error
+    if not content:
+        return jsonify({'error': 'content required'}), 400
+    conn = get_db_connection()
+    comment = create_comment(conn, current_user(), post_id, content)
+    conn.close()
+    if comment is None:
+        return jsonify({'error': 'post not found'}), 404
+    return jsonify(comment), 201
+
+
+def _profile_json(user, viewer_id):
+    return {
+        'id': user['id'],
+        'username': user['username'],
+        'display_name': user['display_name'],
+        'bio': user['bio'],
+        'city': user['city'],
+        'status_msg': user['status_msg'],
+        'avatar_url': avatar_url(user['avatar_path'], user['avatar_thumb_path']),
+        'created_at': user['created_at'],
+        'created_at_human': format_timestamp(user['created_at']),
+        'best_scores': user_best_scores(user['id']),
+        'follow': follow_stats(user['id'], viewer_id if viewer_id != user['id'] else None),
+    }
+
+
+@api_bp.route("/users/<int:user_id>", methods=["GET"])
+@api_login_required
+def get_user(user_id):
+    '''Perfil público, com melhores scores por jogo e contagem de seguidores.'''
+    user = db.load_user(user_id)
+    if not user:
+        return jsonify({'error': 'user not found'}), 404
+    return _conditional_json(_select(_profile_json(user, current_user()['id']), _selected_fields()))
+
+
+@api_bp.route("/me", methods=["GET"])
+@api_login_required
+def get_me():
+    user = current_user()
+    return _conditional_json(_select(_profile_json(user, user['id']), _selected_fields()))
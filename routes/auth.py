@@ -2,13 +2,15 @@
 Blueprint para rotas de autenticação e perfil de usuário.
 '''
 import os
-from datetime import datetime
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash, abort, current_app
-from werkzeug.security import generate_password_hash, check_password_hash
-from werkzeug.utils import secure_filename
 
 import db
+import media
+import passwords
+import timeline
+import fragment_cache
 from db import get_db_connection, current_user, login_required, user_best_scores, allowed_file
+from routes.common import follow_stats
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -18,6 +20,12 @@ def login_user(user):
 def logout_user():
     session.pop('user_id', None)
 
+def _hashing_busy(template):
+    # Fila de hash cheia: recusa rápido em vez de segurar o worker
+    current_app.logger.warning("Password hashing saturated path=%s", request.path)
+    flash('Muita gente entrando ao mesmo tempo. Tente de novo em alguns segundos.', 'error')
+    return render_template(template, user=current_user()), 429, {'Retry-After': '5'}
+
 @auth_bp.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
@@ -33,10 +41,15 @@ def register():
             if existing:
                 flash('Usuário ou email já cadastrados', 'error')
             else:
-                password_hash = generate_password_hash(password)
+                try:
+                    password_hash = passwords.hash_password(password)
+                except passwords.HashingBusy:
+                    conn.close()
+                    return _hashing_busy('register.html')
                 conn.execute('INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)',
                              (username, email, password_hash))
                 conn.commit()
+                passwords.forget_missing(username, email)
                 current_app.logger.info("New user registered: username=%s email=%s", username, email)
                 flash('Conta criada com sucesso! Faça login.', 'success')
                 conn.close()
@@ -50,10 +63,20 @@ def login():
     if request.method == 'POST':
         identifier = request.form['identifier'].strip()
         password = request.form['password']
-        conn = get_db_connection()
-        user = conn.execute('SELECT * FROM users WHERE username = ? OR email = ?', (identifier, identifier)).fetchone()
-        conn.close()
-        if user and check_password_hash(user['password_hash'], password):
+        user = None
+        if not passwords.known_missing(identifier):
+            conn = get_db_connection()
+            user = conn.execute('SELECT * FROM users WHERE username = ? OR email = ?', (identifier, identifier)).fetchone()
+            conn.close()
+            if user is None:
+                passwords.remember_missing(identifier)
+        try:
+            valid = user is not None and passwords.verify_password(user['password_hash'], password)
+        except passwords.HashingBusy:
+            return _hashing_busy('login.html')
+        if valid:
+            if passwords.needs_rehash(user['password_hash']):
+                _rehash(user, password)
             login_user(user)
             current_app.logger.info("Login success user_id=%s", user['id'])
             flash('Bem-vindo de volta!', 'success')
@@ -64,6 +87,22 @@ def login():
     return render_template('login.html', user=current_user())
 
 
+def _rehash(user, password):
+    '''Regrava o hash com os parâmetros atuais; se a fila estiver cheia, fica para o próximo login.'''
+    try:
+        new_hash = passwords.hash_password(password)
+    except passwords.HashingBusy:
+        return
+    conn = get_db_connection()
+    conn.execute('UPDATE users SET password_hash = ? WHERE id = ? AND password_hash = ?',
+                 (new_hash, user['id'], user['password_hash']))
+    conn.commit()
+    conn.close()
+    db.invalidate_user(user['id'])
+    passwords.stats['rehashed'] += 1
+    current_app.logger.info("Password rehashed user_id=%s", user['id'])
+
+
 @auth_bp.route('/logout')
 def logout():
     current_app.logger.info("Logout user_id=%s", session.get('user_id'))
@@ -77,20 +116,46 @@ def logout():
 def profile():
     user = current_user()
     best_scores = user_best_scores(user['id'])
-    return render_template('profile.html', user=user, is_self=True, best_scores=best_scores)
+    return render_template('profile.html', user=user, is_self=True, best_scores=best_scores,
+                           follow=follow_stats(user['id']))
 
 
 @auth_bp.route('/user/<int:user_id>')
 @login_required
 def user_profile(user_id):
     viewer = current_user()
-    conn = get_db_connection()
-    target = conn.execute('SELECT * FROM users WHERE id = ?', (user_id,)).fetchone()
-    conn.close()
+    target = db.load_user(user_id)
     if not target:
         abort(404)
     best_scores = user_best_scores(target['id'])
-    return render_template('profile.html', user=target, is_self=(viewer and viewer['id'] == target['id']), best_scores=best_scores)
+    return render_template('profile.html', user=target, is_self=(viewer and viewer['id'] == target['id']), best_scores=best_scores,
+                           follow=follow_stats(target['id'], viewer['id']))
+
+
+@auth_bp.route('/user/<int:user_id>/seguir', methods=['POST'])
+@login_required
+def follow_user(user_id):
+    viewer = current_user()
+    if not db.load_user(user_id):
+        abort(404)
+    conn = get_db_connection()
+    if timeline.follow(conn, viewer['id'], user_id):
+        current_app.logger.info("Follow follower_id=%s followee_id=%s", viewer['id'], user_id)
+    conn.commit()
+    conn.close()
+    return redirect(url_for('auth.user_profile', user_id=user_id))
+
+
+@auth_bp.route('/user/<int:user_id>/deixar-de-seguir', methods=['POST'])
+@login_required
+def unfollow_user(user_id):
+    viewer = current_user()
+    conn = get_db_connection()
+    if timeline.unfollow(conn, viewer['id'], user_id):
+        current_app.logger.info("Unfollow follower_id=%s followee_id=%s", viewer['id'], user_id)
+    conn.commit()
+    conn.close()
+    return redirect(url_for('auth.user_profile', user_id=user_id))
 
 
 @auth_bp.route('/profile/edit', methods=['GET', 'POST'])
@@ -105,20 +170,35 @@ def edit_profile():
         age = request.form.get('age', '')
         gender = request.form.get('gender', '').strip()
         avatar_file = request.files.get('avatar')
-        avatar_path = user['avatar_path']
+        uploaded_path = None
         if avatar_file and allowed_file(avatar_file.filename):
-            filename = secure_filename(f"avatar_{user['id']}_{int(datetime.now().timestamp())}_{avatar_file.filename}")
-            save_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'avatars')
-            os.makedirs(save_path, exist_ok=True)
-            full_path = os.path.join(save_path, filename)
-            avatar_file.save(full_path)
-            avatar_path = os.path.join('uploads', 'avatars', filename)
-        # Update DB
+            uploaded_path = media.store_upload(avatar_file, current_app.config['UPLOAD_FOLDER'])
+        # Update DB. The current avatar is read inside the write transaction: the row from
+        # current_user() may be a stale UserCache entry, and releasing that path would drop
+        # a reference twice (or revert an avatar changed by another worker).
         conn = get_db_connection()
-        conn.execute('UPDATE users SET display_name=?, bio=?, city=?, status_msg=?, age=?, gender=?, avatar_path=? WHERE id=?',
-                     (display_name or None, bio or None, city or None, status_msg or None, age or None, gender or None, avatar_path, user['id']))
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute('BEGIN IMMEDIATE')
+        stored = conn.execute('SELECT avatar_path, avatar_thumb_path FROM users WHERE id = ?', (user['id'],)).fetchone()
+        avatar_path, avatar_thumb_path = stored['avatar_path'], stored['avatar_thumb_path']
+        new_avatar = uploaded_path is not None and uploaded_path != avatar_path
+        if new_avatar:
+            old_avatar_path = avatar_path
+            avatar_path, avatar_thumb_path = uploaded_path, None
+        conn.execute('UPDATE users SET display_name=?, bio=?, city=?, status_msg=?, age=?, gender=?, avatar_path=?, avatar_thumb_path=? WHERE id=?',
+                     (display_name or None, bio or None, city or None, status_msg or None, age or None, gender or None, avatar_path, avatar_thumb_path, user['id']))
+        if new_avatar:
+            media.acquire(conn, avatar_path)
+            media.release(conn, old_avatar_path)
+        # Post cards and the rankings this user appears in show name and avatar
+        games = [row['game'] for row in conn.execute('SELECT game FROM best_scores WHERE user_id = ?', (user['id'],))]
+        fragment_cache.bump(conn, f"user:{user['id']}", *(f'ranking:{game}' for game in games))
         conn.commit()
         conn.close()
+        db.invalidate_user(user['id'])
+        if new_avatar:
+            media.submit_avatar(os.path.dirname(current_app.config['UPLOAD_FOLDER']), user['id'], avatar_path)
         flash('Perfil atualizado com sucesso!', 'success')
         return redirect(url_for('auth.profile'))
     return render_template('edit_profile.html', user=user)
@@ -0,0 +1,74 @@
+'''
+Formatação e leitura de parâmetros usadas pelas páginas e pela API JSON.
+'''
+from flask import request, url_for, current_app, g
+
+import timeline
+from db import get_db_connection, format_timestamp
+
+# Valores padrão da paginação (podem ser sobrescritos em app.config)
+DEFAULT_PAGE_SIZE = 20
+DEFAULT_COMMENTS_PREVIEW = 3
+MAX_PAGE_SIZE = 100
+
+
+def page_size(config_key, default):
+    '''Lê o tamanho de página do querystring ou da configuração, com limite máximo.'''
+    configured = current_app.config.get(config_key, default)
+    try:
+        size = int(request.args.get("limit", configured))
+    except ValueError:
+        size = configured
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def avatar_url(avatar_path, thumb_path=None):
+    '''Resolve a URL do avatar uma vez por requisição para cada usuário distinto.'''
+    urls = g.setdefault("_avatar_urls", {})
+    key = (avatar_path, thumb_path)
+    url = urls.get(key)
+    if url is None:
+        if thumb_path:
+            url = url_for("static", filename=thumb_path)
+        elif avatar_path:
+            url = url_for("static", filename=avatar_path)
+        else:
+            url = url_for('static', filename='img/default-avatar.png')
+        urls[key] = url
+    return url
+
+
+def format_post(p, comments, total):
+    media_url = url_for("static", filename=p['media_path']) if p['media_path'] else None
+    preview_path = p['media_preview_path']
+    return {
+        'id': p['id'],
+        'content': p['content'],
+        'media_url': media_url,
+        'media_preview_url': url_for("static", filename=preview_path) if preview_path else media_url,
+        'media_poster_url': url_for("static", filename=p['media_poster_path']) if p['media_poster_path'] else None,
+        'is_image': p['media_type'] == 'image',
+        'is_video': p['media_type'] == 'video',
+        'author': {
+            'id': p['user_id'],
+            'username': p['username'],
+            'display_name': p['display_name'],
+            'avatar_url': avatar_url(p['avatar_path'], p['avatar_thumb_path'])
+        },
+        'created_at_human': format_timestamp(p['created_at']),
+        'comments': comments,
+        'comments_total': total,
+        'comments_hidden': total - len(comments)
+    }
+
+
+def follow_stats(user_id, viewer_id=None):
+    '''Seguidores e seguidos de user_id; is_following diz se viewer_id o segue.'''
+    conn = get_db_connection()
+    stats = {
+        'followers': timeline.follower_count(conn, user_id),
+        'following': timeline.following_count(conn, user_id),
+        'is_following': viewer_id is not None and timeline.is_following(conn, viewer_id, user_id),
+    }
+    conn.close()
+    return stats
@@ -2,15 +2,151 @@
 Blueprint para o feed de posts e comentários.
 '''
 import os
-from datetime import datetime
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash, current_app
-from werkzeug.utils import secure_filename
 
 import db
-from db import get_db_connection, current_user, login_required, allowed_file
+import media
+import events
+import timeline
+import fragment_cache
+from db import get_db_connection, current_user, login_required, allowed_file, encode_cursor, decode_cursor, format_timestamp
+from routes.common import DEFAULT_PAGE_SIZE, DEFAULT_COMMENTS_PREVIEW, page_size, avatar_url, format_post
 
 feed_bp = Blueprint("feed", __name__)
 
+COMMENT_SELECT = '''SELECT c.*, u.username, u.display_name, u.avatar_path, u.avatar_thumb_path
+                    FROM comments c JOIN users u ON c.user_id = u.id'''
+
+
+def _format_comment(c):
+    return {
+        'id': c['id'],
+        'content': c['content'],
+        'cursor': encode_cursor(c['created_at'], c['id']),
+        'created_at_human': format_timestamp(c['created_at']),
+        'author': {
+            'id': c['user_id'],
+            'username': c['username'],
+            'display_name': c['display_name'],
+            'avatar_url': avatar_url(c['avatar_path'], c['avatar_thumb_path'])
+        }
+    }
+
+
+def create_post(conn, user, content, media_file=None):
+    '''Grava um post (texto e/ou mídia), agenda timeline e variantes e publica o evento.
+
+    Retorna o id do post, ou None se ele estiver vazio.
+    '''
+    media_path = None
+    if media_file and allowed_file(media_file.filename):
+        media_path = media.store_upload(media_file, current_app.config["UPLOAD_FOLDER"])
+    if not content and not media_path:
+        return None
+    cur = conn.execute("INSERT INTO posts (user_id, content, media_path, media_type) VALUES (?, ?, ?, ?)",
+                       (user["id"], content, media_path, media.media_kind(media_path)))
+    media.acquire(conn, media_path)
+    timeline.add_own_post(conn, cur.lastrowid)
+    conn.commit()
+    timeline.submit_fan_out(cur.lastrowid)
+    events.publish("post", {'id': cur.lastrowid, 'author': user["display_name"] or user["username"]})
+    if media_path:
+        media.submit_post_media(os.path.dirname(current_app.config["UPLOAD_FOLDER"]), cur.lastrowid, media_path)
+    current_app.logger.info("Post created by user_id=%s media=%s", user["id"], bool(media_path))
+    return cur.lastrowid
+
+
+def create_comment(conn, user, post_id, content):
+    '''Grava um comentário, invalida o card do post e publica o evento.
+
+    Retorna o comentário formatado, ou None se o post não existir.
+    '''
+    if conn.execute("SELECT 1 FROM posts WHERE id = ?", (post_id,)).fetchone() is None:
+        return None
+    cur = conn.execute("INSERT INTO comments (post_id, user_id, content) VALUES (?, ?, ?)",
+                       (post_id, user["id"], content))
+    fragment_cache.bump(conn, f"post:{post_id}")
+    conn.commit()
+    comment = _format_comment(conn.execute(COMMENT_SELECT + " WHERE c.id = ?", (cur.lastrowid,)).fetchone())
+    events.publish("comment", {'post_id': post_id, 'comment': comment})
+    current_app.logger.info("Comment added user_id=%s post_id=%s", user["id"], post_id)
+    return comment
+
+
+def fetch_posts_page(conn, before=None, limit=DEFAULT_PAGE_SIZE):
+    '''Busca uma página de posts ordenada por (created_at, id) decrescente.
+
+    Retorna (rows, next_cursor); next_cursor é None na última página.
+    '''
+    sql = '''SELECT p.*, u.username, u.display_name, u.avatar_path, u.avatar_thumb_path
+             FROM posts p JOIN users u ON p.user_id = u.id'''
+    params = []
+    if before:
+        sql += ' WHERE (p.created_at, p.id) < (?, ?)'
+        params.extend(before)
+    sql += ' ORDER BY p.created_at DESC, p.id DESC LIMIT ?'
+    params.append(limit + 1)
+    rows = conn.execute(sql, params).fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['created_at'], rows[-1]['id'])
+    return rows, next_cursor
+
+
+def fetch_posts_by_ids(conn, post_ids):
+    '''Busca os posts (com o autor) na ordem dos ids recebidos.'''
+    if not post_ids:
+        return []
+    placeholders = ",".join("?" * len(post_ids))
+    rows = conn.execute(f'''SELECT p.*, u.username, u.display_name, u.avatar_path, u.avatar_thumb_path
+                            FROM posts p JOIN users u ON p.user_id = u.id
+                            WHERE p.id IN ({placeholders})''', post_ids).fetchall()
+    by_id = {row['id']: row for row in rows}
+    return [by_id[post_id] for post_id in post_ids if post_id in by_id]
+
+
+def fetch_comments_page(conn, post_id, before=None, limit=DEFAULT_PAGE_SIZE):
+    '''Comentários de um post, do mais recente para o mais antigo, já formatados.
+
+    Retorna (comments, next_cursor).
+    '''
+    sql = COMMENT_SELECT + ' WHERE c.post_id = ?'
+    params = [post_id]
+    if before:
+        sql += ' AND (c.created_at, c.id) < (?, ?)'
+        params.extend(before)
+    sql += ' ORDER BY c.created_at DESC, c.id DESC LIMIT ?'
+    params.append(limit + 1)
+    rows = conn.execute(sql, params).fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['created_at'], rows[-1]['id'])
+    return [_format_comment(c) for c in rows], next_cursor
+
+
+def fetch_comment_previews(conn, post_ids, per_post=DEFAULT_COMMENTS_PREVIEW):
+    '''Carrega os N comentários mais recentes de cada post da página.
+
+    Um LIMIT por post no índice comments(post_id, created_at) e o total de
+    comment_counts: o custo não cresce com o número de comentários do post.
+    Retorna (comments_by_post, totals_by_post), com os comentários em ordem cronológica.
+    '''
+    if not post_ids:
+        return {}, {}
+    comments_by_post = {}
+    for post_id in post_ids:
+        rows = conn.execute(db.COMMENT_PREVIEW_SQL, (post_id, per_post)).fetchall()
+        if rows:
+            comments_by_post[post_id] = [_format_comment(c) for c in reversed(rows)]
+    placeholders = ','.join('?' * len(post_ids))
+    totals_by_post = dict(conn.execute(
+        f'SELECT post_id, comments FROM comment_counts WHERE post_id IN ({placeholders})', post_ids
+    ).fetchall())
+    return comments_by_post, totals_by_post
+
+
 @feed_bp.route("/feed", methods=["GET", "POST"])
 @login_required
 def feed():
@@ -20,87 +156,47 @@ def feed():
         form_type = request.form.get("form_type")
         if form_type == "new_post":
             content = request.form.get("content", "").strip()
-            media_file = request.files.get("media")
-            media_path = None
-            if media_file and allowed_file(media_file.filename):
-                filename = secure_filename(f'{user["id"]}_{int(datetime.now().timestamp())}_{media_file.filename}')
-                save_dir = os.path.join(current_app.config["UPLOAD_FOLDER"], "posts")
-                os.makedirs(save_dir, exist_ok=True)
-                full_path = os.path.join(save_dir, filename)
-                media_file.save(full_path)
-                media_path = os.path.join("uploads", "posts", filename)
-            if content or media_path:
-                conn.execute("INSERT INTO posts (user_id, content, media_path) VALUES (?, ?, ?)",
-                             (user["id"], content, media_path))
-                conn.commit()
-                current_app.logger.info("Post created by user_id=%s media=%s", user["id"], bool(media_path))
+            if create_post(conn, user, content, request.files.get("media")):
                 flash("Post publicado!", "success")
             else:
                 flash("O post não pode estar vazio.", "error")
+            conn.close()
             return redirect(url_for('feed.feed'))
 
         elif form_type == "new_comment":
             comment_content = request.form.get("comment_content", "").strip()
-            post_id = request.form.get("post_id")
-            if comment_content and post_id:
-                conn.execute("INSERT INTO comments (post_id, user_id, content) VALUES (?, ?, ?)",
-                             (post_id, user["id"], comment_content))
-                conn.commit()
-                current_app.logger.info("Comment added user_id=%s post_id=%s", user["id"], post_id)
+            post_id = request.form.get("post_id", type=int)
+            if comment_content and post_id and create_comment(conn, user, post_id, comment_content):
                 flash("Comentário adicionado!", "success")
             else:
                 flash("Comentário inválido.", "error")
+            conn.close()
             return redirect(url_for('feed.feed'))
 
-    # Fetch posts and their authors
-    posts_rows = conn.execute(
-        '''SELECT p.*, u.username, u.display_name, u.avatar_path 
-           FROM posts p JOIN users u ON p.user_id = u.id
-           ORDER BY p.created_at DESC'''
-    ).fetchall()
-
-    # Fetch all comments and their authors
-    comments_rows = conn.execute(
-        '''SELECT c.*, u.username, u.display_name, u.avatar_path
-           FROM comments c JOIN users u ON c.user_id = u.id
-           ORDER BY c.created_at ASC'''
-    ).fetchall()
-    conn.close()
+    # Fetch one page of posts (keyset pagination on created_at, id): everyone's
+    # posts, or the user's home timeline ("Seguindo")
+    limit = page_size("FEED_PAGE_SIZE", DEFAULT_PAGE_SIZE)
+    before = decode_cursor(request.args.get("before"))
+    tab = "seguindo" if request.args.get("aba") == "seguindo" else "todos"
+    if tab == "seguindo":
+        entries, next_cursor = timeline.read_timeline(conn, user["id"], before, limit)
+        posts_rows = fetch_posts_by_ids(conn, [post_id for post_id, _ in entries])
+    else:
+        posts_rows, next_cursor = fetch_posts_page(conn, before, limit)
 
-    # Group comments by post_id for efficient lookup
-    comments_by_post = {}
-    for c in comments_rows:
-        if c['post_id'] not in comments_by_post:
-            comments_by_post[c['post_id']] = []
-        comments_by_post[c['post_id']].append({
-            'id': c['id'],
-            'content': c['content'],
-            'created_at_human': datetime.fromisoformat(c['created_at']).strftime('%d/%m/%Y %H:%M'),
-            'author': {
-                'id': c['user_id'],
-                'username': c['username'],
-                'display_name': c['display_name'],
-                'avatar_url': url_for("static", filename=c['avatar_path']) if c['avatar_path'] else url_for('static', filename='img/default-avatar.png')
-            }
-        })
-
-    # Format posts for rendering
-    formatted_posts = []
-    for p in posts_rows:
-        formatted_posts.append({
-            'id': p['id'],
-            'content': p['content'],
-            'media_url': url_for("static", filename=p['media_path']) if p['media_path'] else None,
-            'is_image': p['media_path'] and p['media_path'].split(".")[-1].lower() in {'png', 'jpg', 'jpeg', 'gif'},
-            'is_video': p['media_path'] and p['media_path'].split(".")[-1].lower() in {'mp4', 'mov', 'webm'},
-            'author': {
-                'id': p['user_id'],
-                'username': p['username'],
-                'display_name': p['display_name'],
-                'avatar_url': url_for("static", filename=p['avatar_path']) if p['avatar_path'] else url_for('static', filename='img/default-avatar.png')
-            },
-            'created_at_human': datetime.fromisoformat(p['created_at']).strftime('%d/%m/%Y %H:%M'),
-            'comments': comments_by_post.get(p['id'], [])
-        })
-
-    return render_template("feed.html", user=user, posts=formatted_posts)
+    # Stitch cached post cards; only the misses fetch comments and get formatted
+    preview_size = current_app.config.get("FEED_COMMENTS_PREVIEW", DEFAULT_COMMENTS_PREVIEW)
+
+    def render_cards(missing):
+        comments_by_post, totals_by_post = fetch_comment_previews(conn, [p['id'] for p in missing], preview_size)
+        return [render_template("_post_card.html",
+                                post=format_post(p, comments_by_post.get(p['id'], []), totals_by_post.get(p['id'], 0)))
+                for p in missing]
+
+    cards = fragment_cache.render_many(
+        conn, posts_rows,
+        lambda p: (f"post:{p['id']}", (f"post:{p['id']}", f"user:{p['user_id']}")),
+        render_cards
+    )
+    conn.close()
+    return render_template("feed.html", user=user, cards=cards, next_cursor=next_cursor, tab=tab)
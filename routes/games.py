@@ -1,14 +1,19 @@
 '''
 Blueprint para rotas de jogos e ranking.
 '''
-from datetime import datetime
 from flask import Blueprint, render_template, request, jsonify, current_app
 
 import db
+import leaderboard
+import fragment_cache
+import game_sessions
+import score_writer
 from db import get_db_connection, current_user, login_required
 
 games_bp = Blueprint('games', __name__)
 
+RANKING_GAMES = (('tetris', 'Tetris'), ('pacman', 'Pac-Man'))
+
 @games_bp.route('/jogos')
 @login_required
 def games():
@@ -34,90 +39,263 @@ def game_pacman():
 @login_required
 def games_ranking():
     user = current_user()
+
+    # Ranking blocks are cached until a new score bumps ranking:<game>
+    def render_blocks(missing):
+        return [render_template('_ranking_block.html', game=game, title=title, ranking=db.top_scores(game))
+                for game, title in missing]
+
     conn = get_db_connection()
-    
-    # ranking for tetris
-    ranking_tetris = conn.execute(
-        'SELECT users.username, users.display_name, MAX(scores.score) AS best_score, MAX(scores.created_at) AS last_played\n'
-        'FROM scores JOIN users ON scores.user_id = users.id\n'
-        'WHERE scores.game = "tetris"\n'
-        'GROUP BY scores.user_id\n'
-        'ORDER BY best_score DESC LIMIT 10'
-    ).fetchall()
-    
-    # ranking for pacman
-    ranking_pacman = conn.execute(
-        'SELECT users.username, users.display_name, MAX(scores.score) AS best_score, MAX(scores.created_at) AS last_played\n'
-        'FROM scores JOIN users ON scores.user_id = users.id\n'
-        'WHERE scores.game = "pacman"\n'
-        'GROUP BY scores.user_id\n'
-        'ORDER BY best_score DESC LIMIT 10'
-    ).fetchall()
+    blocks = fragment_cache.render_many(conn, RANKING_GAMES,
+                                        lambda item: (f'ranking:{item[0]}', (f'ranking:{item[0]}',)),
+                                        render_blocks)
     conn.close()
-    
-    # format results
-    def format_ranking(rows):
-        formatted = []
-        for row in rows:
-            formatted.append({
-                'username': row['username'],
-                'display_name': row['display_name'],
-                'score': row['best_score'],
-                'date_human': datetime.fromisoformat(row['last_played']).strftime('%d/%m/%Y %H:%M')
-            })
-        return formatted
-        
-    return render_template('games_ranking.html', user=user,
-                           ranking_tetris=format_ranking(ranking_tetris),
-                           ranking_pacman=format_ranking(ranking_pacman))
+    return render_template('games_ranking.html', user=user, blocks=blocks)
+
+
+MAX_SCORE_BATCH = 100
+MAX_RANK_WINDOW = 100
+
+
+def _save_scores(rows):
+    """Grava [(user_id, game, score)] com o SCORE_WRITE_MODE da aplicação (ver score_writer.save)."""
+    return score_writer.save(rows, *_write_mode())
+
+
+def _write_mode():
+    return (current_app.config.get('SCORE_WRITE_MODE', 'direct'),
+            current_app.config.get('SCORE_WRITE_TIMEOUT', 5.0))
+
+
+def _score_response(status):
+    return jsonify({'status': status}), (202 if status == 'queued' else 200)
+
+
+def _direct_score_error(games):
+    """Resposta de erro para envio de score sem sessão, ou None se permitido."""
+    if any(game not in game_sessions.GAMES for game in games):
+        return jsonify({'error': 'unknown game'}), 400
+    if current_app.config.get('GAME_REQUIRE_SESSION', True):
+        return jsonify({'error': 'scores must be sent through a game session'}), 403
+    return None
 
 
 @games_bp.route('/api/jogos/score', methods=['POST'])
 @login_required
 def api_game_score():
     user = current_user()
-    data = request.get_json(force=True)
+    data = request.get_json(force=True, silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'invalid payload'}), 400
     game = data.get('game')
     score = data.get('score')
     if not game or score is None:
         return jsonify({'error': 'invalid payload'}), 400
-    conn = get_db_connection()
     try:
-        conn.execute('INSERT INTO scores (user_id, game, score) VALUES (?, ?, ?)',
-                     (user['id'], game, int(score)))
-        conn.commit()
-        current_app.logger.info("Score saved user_id=%s game=%s score=%s", user['id'], game, score)
-        return jsonify({'status': 'ok'})
-    except ValueError:
+        score = int(score)
+    except (TypeError, ValueError):
         return jsonify({'error': 'score must be an integer'}), 400
+    error = _direct_score_error([game])
+    if error:
+        return error
+    status = _save_scores([(user['id'], game, score)])
+    current_app.logger.info("Score saved user_id=%s game=%s score=%s", user['id'], game, score)
+    return _score_response(status)
+
+
+@games_bp.route('/api/jogos/scores', methods=['POST'])
+@login_required
+def api_game_scores_batch():
+    """Versão em lote: {"scores": [...]}.
+
+    Itens {"token": ..., "score": ..., "log": ...} fecham várias sessões de jogo
+    de uma vez (partidas guardadas offline, por exemplo) e respondem 202 com o
+    resultado de cada uma; a validação e a gravação seguem o caminho de
+    /api/jogos/sessoes/<token>. Itens {"game": ..., "score": ...} sem sessão só
+    valem com GAME_REQUIRE_SESSION=0 e são gravados numa transação.
+    """
+    user = current_user()
+    data = request.get_json(force=True, silent=True)
+    items = data.get('scores') if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'invalid payload'}), 400
+    if len(items) > MAX_SCORE_BATCH:
+        return jsonify({'error': f'at most {MAX_SCORE_BATCH} scores per batch'}), 400
+    if all(isinstance(item, dict) and item.get('token') for item in items):
+        conn = get_db_connection()
+        try:
+            results = [_submit_session(conn, user['id'], item['token'], item) for item in items]
+        finally:
+            conn.close()
+        accepted = sum(1 for payload, status in results if status == 202)
+        current_app.logger.info("Game session batch submitted user_id=%s count=%s validating=%s",
+                                user['id'], len(items), accepted)
+        return jsonify({'sessions': [dict(payload, http_status=status) for payload, status in results]}), 202
+    rows = []
+    for item in items:
+        if not isinstance(item, dict) or not item.get('game') or item.get('score') is None:
+            return jsonify({'error': 'invalid payload'}), 400
+        try:
+            rows.append((user['id'], item['game'], int(item['score'])))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'score must be an integer'}), 400
+    error = _direct_score_error({game for _, game, _ in rows})
+    if error:
+        return error
+    status = _save_scores(rows)
+    current_app.logger.info("Score batch saved user_id=%s count=%s", user['id'], len(rows))
+    return _score_response(status)
+
+
+def _session_payload(row):
+    return {'token': row['token'], 'game': row['game'], 'status': row['status'],
+            'score': row['score'], 'reason': row['reason']}
+
+
+@games_bp.route('/api/jogos/sessoes', methods=['POST'])
+@login_required
+def api_game_session_start():
+    """Abre uma sessão de jogo: {"game": ...} -> {"token": ...}."""
+    user = current_user()
+    data = request.get_json(force=True, silent=True) or {}
+    conn = get_db_connection()
+    try:
+        token = game_sessions.start_session(conn, user['id'], data.get('game'))
+    except game_sessions.SessionError as exc:
+        return jsonify({'error': str(exc)}), exc.status
     finally:
         conn.close()
+    return jsonify({'token': token, 'game': data['game'], 'status': 'open'}), 201
+
+
+def _submit_session(conn, user_id, token, data):
+    """Fecha uma sessão com {"score": ..., "log": base64}; retorna (payload, status HTTP)."""
+    if not isinstance(data, dict) or data.get('score') is None or not data.get('log'):
+        return {'token': token, 'error': 'invalid payload'}, 400
+    try:
+        score = int(data['score'])
+    except (TypeError, ValueError):
+        return {'token': token, 'error': 'score must be an integer'}, 400
+    try:
+        game_sessions.submit(conn, token, user_id, score, data['log'], *_write_mode())
+    except game_sessions.SessionError as exc:
+        return {'token': token, 'error': str(exc)}, exc.status
+    return {'token': token, 'status': 'validating'}, 202
+
+
+@games_bp.route('/api/jogos/sessoes/<token>', methods=['POST'])
+@login_required
+def api_game_session_submit(token):
+    """Fecha a sessão com {"score": ..., "log": base64}; a validação roda depois (202)."""
+    user = current_user()
+    conn = get_db_connection()
+    try:
+        payload, status = _submit_session(conn, user['id'], token, request.get_json(force=True, silent=True))
+    finally:
+        conn.close()
+    if status == 202:
+        current_app.logger.info("Game session submitted user_id=%s token=%s", user['id'], token)
+        return jsonify(payload), status
+    return jsonify({'error': payload['error']}), status
+
+
+@games_bp.route('/api/jogos/sessoes/<token>', methods=['GET'])
+@login_required
+def api_game_session_status(token):
+    """Estado da sessão: open, validating, accepted, rejected ou expired."""
+    conn = get_db_connection()
+    row = game_sessions.get_session(conn, token, current_user()['id'])
+    conn.close()
+    if row is None:
+        return jsonify({'error': 'session not found'}), 404
+    return jsonify(_session_payload(row))
 
 
 @games_bp.route('/api/jogos/score', methods=['GET'])
 @login_required
 def api_game_ranking():
     game = request.args.get('game')
-    limit = int(request.args.get('limit', 10))
+    limit = max(1, min(request.args.get('limit', 10, type=int), MAX_RANK_WINDOW))
     if not game:
         return jsonify({'error': 'game required'}), 400
-    conn = get_db_connection()
-    rows = conn.execute(
-        'SELECT users.username, users.display_name, MAX(scores.score) AS best_score, MAX(scores.created_at) AS last_played '
-        'FROM scores JOIN users ON scores.user_id = users.id '
-        'WHERE scores.game = ? '
-        'GROUP BY scores.user_id '
-        'ORDER BY best_score DESC '
-        'LIMIT ?',
-        (game, limit)
-    ).fetchall()
-    conn.close()
+    rows = db.top_scores(game, limit)
     items = []
     for r in rows:
         items.append({
             'username': r['username'],
             'display_name': r['display_name'],
             'score': r['best_score'],
-            'last_played': r['last_played']
+            'last_played': r['last_played'],
+            'last_played_human': db.format_timestamp(r['last_played'])
         })
     return jsonify({'game': game, 'ranking': items})
+
+
+def _rank_items(entries):
+    """Anexa username/display_name às entradas (posição, user_id, score) do ranking."""
+    if not entries:
+        return []
+    user_ids = [user_id for _, user_id, _ in entries]
+    conn = get_db_connection()
+    rows = conn.execute(
+        f'SELECT id, username, display_name FROM users WHERE id IN ({",".join("?" * len(user_ids))})',
+        user_ids
+    ).fetchall()
+    conn.close()
+    users = {r['id']: r for r in rows}
+    items = []
+    for position, user_id, score in entries:
+        u = users.get(user_id)
+        items.append({
+            'rank': position,
+            'user_id': user_id,
+            'username': u['username'] if u else None,
+            'display_name': u['display_name'] if u else None,
+            'score': score
+        })
+    return items
+
+
+@games_bp.route('/api/jogos/rank', methods=['GET'])
+@login_required
+def api_game_rank():
+    """Posição de um usuário (padrão: o logado) no ranking de um jogo."""
+    game = request.args.get('game')
+    if not game:
+        return jsonify({'error': 'game required'}), 400
+    user_id = request.args.get('user_id', type=int) or current_user()['id']
+    found = leaderboard.board.rank(game, user_id)
+    total = leaderboard.board.total(game)
+    if found is None:
+        return jsonify({'game': game, 'user_id': user_id, 'rank': None, 'score': None, 'total': total})
+    position, score = found
+    return jsonify({'game': game, 'user_id': user_id, 'rank': position, 'score': score, 'total': total})
+
+
+@games_bp.route('/api/jogos/rank/around', methods=['GET'])
+@login_required
+def api_game_rank_around():
+    """Vizinhança de um usuário no ranking (radius posições acima e abaixo)."""
+    game = request.args.get('game')
+    if not game:
+        return jsonify({'error': 'game required'}), 400
+    user_id = request.args.get('user_id', type=int) or current_user()['id']
+    radius = max(0, min(request.args.get('radius', 5, type=int), MAX_RANK_WINDOW // 2))
+    entries = leaderboard.board.around(game, user_id, radius)
+    return jsonify({'game': game, 'user_id': user_id, 'ranking': _rank_items(entries)})
+
+
+@games_bp.route('/api/jogos/rank/range', methods=['GET'])
+@login_required
+def api_game_rank_range():
+    """Posições start..end (base 1, inclusivo) do ranking de um jogo."""
+    game = request.args.get('game')
+    if not game:
+        return jsonify({'error': 'game required'}), 400
+    start = max(1, request.args.get('start', 1, type=int))
+    end = request.args.get('end', start + 9, type=int)
+    if end < start:
+        return jsonify({'error': 'end must be >= start'}), 400
+    end = min(end, start + MAX_RANK_WINDOW - 1)
+    entries = leaderboard.board.range(game, start, end)
+    return jsonify({'game': game, 'start': start, 'end': end, 'ranking': _rank_items(entries)})
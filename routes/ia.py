@@ -1,61 +1,183 @@
 '''
 Blueprint para a rota de chat com IA.
 '''
-from datetime import datetime
-from flask import Blueprint, render_template, request, redirect, url_for, current_app
-import requests
+import json
+from contextlib import closing
+from flask import Blueprint, render_template, request, redirect, url_for, current_app, jsonify, Response, stream_with_context
 
 import db
-from db import get_db_connection, current_user, login_required
+import ia_cache
+from db import get_db_connection, current_user, login_required, encode_cursor, decode_cursor
 
 ia_bp = Blueprint('ia', __name__)
 
+EMPTY_REPLY = 'Resposta da IA vazia.'
+
+
+def _client():
+    '''ia_client (e com ele o requests) só é importado na primeira conversa com a IA.'''
+    import ia_client
+    return ia_client
+
+
+def _error_reply(exc, user_id):
+    '''Converte falhas na chamada ao modelo na mensagem mostrada ao usuário.'''
+    import requests
+    ia_client = _client()
+    if isinstance(exc, ia_client.ModelBusy):
+        current_app.logger.warning("IA busy user_id=%s", user_id)
+        return 'A IA está ocupada agora. Tente novamente em alguns segundos.'
+    if isinstance(exc, ia_cache.LeaderGone):
+        current_app.logger.warning("IA shared stream abandoned user_id=%s", user_id)
+        return 'A resposta da IA foi interrompida. Tente novamente.'
+    if isinstance(exc, ia_client.ModelError):
+        current_app.logger.warning("IA bad status user_id=%s status=%s", user_id, exc.status_code)
+        return 'Desculpe, a IA não respondeu como esperado (Status: {}).'.format(exc.status_code)
+    if isinstance(exc, requests.exceptions.Timeout):
+        current_app.logger.warning("IA request timed out user_id=%s", user_id)
+        return 'A IA demorou demais para responder. Tente novamente.'
+    if isinstance(exc, requests.exceptions.ConnectionError):
+        current_app.logger.exception("IA request failed user_id=%s (Connection Error)", user_id)
+        return 'Erro ao conectar à IA local. Verifique se o LM Studio está rodando em {}.'.format(ia_client.IA_URL)
+    current_app.logger.exception("IA request failed user_id=%s (Unknown Error)", user_id)
+    return 'Erro desconhecido ao processar a resposta da IA local.'
+
+
+def _cache_key(message):
+    ia_client = _client()
+    return ia_cache.make_key(message, max_tokens=ia_client.DEFAULT_MAX_TOKENS, url=ia_client.IA_URL)
+
+
+def _complete(message):
+    '''Resposta completa do modelo, passando pelo cache de respostas quando ativo.'''
+    complete = _client().complete
+    if not ia_cache.ENABLED:
+        return complete(message)
+    return ia_cache.cache.get_or_compute(_cache_key(message), lambda: complete(message))
+
+
+def _save_message(conn, user_id, role, content):
+    conn.execute('INSERT INTO ai_chats (user_id, role, content) VALUES (?, ?, ?)',
+                 (user_id, role, content))
+    conn.commit()
+
+
+DEFAULT_HISTORY_SIZE = 30
+
+
+def fetch_history(conn, user_id, before=None, limit=DEFAULT_HISTORY_SIZE):
+    '''Busca a janela mais recente do histórico (ou a anterior ao cursor), em ordem cronológica.
+
+    Retorna (rows, older_cursor); older_cursor é None quando não há mensagens mais antigas.
+    '''
+    sql = 'SELECT * FROM ai_chats WHERE user_id = ?'
+    params = [user_id]
+    if before:
+        sql += ' AND (created_at, id) < (?, ?)'
+        params.extend(before)
+    sql += ' ORDER BY created_at DESC, id DESC LIMIT ?'
+    params.append(limit + 1)
+    rows = conn.execute(sql, params).fetchall()
+    older_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        older_cursor = encode_cursor(rows[-1]['created_at'], rows[-1]['id'])
+    rows.reverse()
+    return rows, older_cursor
+
+
 @ia_bp.route('/ia', methods=['GET', 'POST'])
 @login_required
 def ia_chat():
     user = current_user()
     conn = get_db_connection()
-    
-    # Fetch chat history
-    history = conn.execute('SELECT * FROM ai_chats WHERE user_id = ? ORDER BY created_at ASC',
-                          (user['id'],)).fetchall()
-    messages = []
-    for msg in history:
-        messages.append({
-            'role': msg['role'],
-            'content': msg['content'],
-            'created_at_human': datetime.fromisoformat(msg['created_at']).strftime('%d/%m/%Y %H:%M')
-        })
-        
+
     if request.method == 'POST':
         message = request.form['message'].strip()
         if message:
             # save user message to DB
-            conn.execute('INSERT INTO ai_chats (user_id, role, content) VALUES (?, ?, ?)',
-                         (user['id'], 'user', message))
-            conn.commit()
+            _save_message(conn, user['id'], 'user', message)
             
-            # send to LM Studio (assume it's running on localhost:1234)
+            # send to LM Studio (pooled session, timeouts and concurrency limit in ia_client)
             try:
-                response = requests.post('http://127.0.0.1:1234', json={'prompt': message, 'max_tokens': 100})
-                if response.ok:
-                    # Assumindo que a resposta do LM Studio tem um campo 'response'
-                    ai_reply = response.json().get('response', 'Resposta da IA vazia.')
-                else:
-                    ai_reply = 'Desculpe, a IA não respondeu como esperado (Status: {}).'.format(response.status_code)
+                ai_reply = _complete(message) or EMPTY_REPLY
                 current_app.logger.info("IA request ok user_id=%s", user['id'])
-            except requests.exceptions.ConnectionError:
-                ai_reply = 'Erro ao conectar à IA local. Verifique se o LM Studio está rodando em http://127.0.0.1:1234.'
-                current_app.logger.exception("IA request failed user_id=%s (Connection Error)", user['id'])
-            except Exception:
-                ai_reply = 'Erro desconhecido ao processar a resposta da IA local.'
-                current_app.logger.exception("IA request failed user_id=%s (Unknown Error)", user['id'])
+            except Exception as exc:
+                ai_reply = _error_reply(exc, user['id'])
                 
             # save AI response
-            conn.execute('INSERT INTO ai_chats (user_id, role, content) VALUES (?, ?, ?)',
-                         (user['id'], 'ai', ai_reply))
-            conn.commit()
-            return redirect(url_for('ia.ia_chat'))
-            
+            _save_message(conn, user['id'], 'ai', ai_reply)
+        conn.close()
+        return redirect(url_for('ia.ia_chat'))
+
+    # Blocos compactados por compact_ia_history.py, um por página (?arquivo=<id>)
+    archive_id = request.args.get('arquivo', type=int)
+    if archive_id is not None:
+        history = db.read_ai_chat_archive(conn, user['id'], archive_id)
+        older_archive = db.previous_ai_chat_archive(conn, user['id'], archive_id)
+        conn.close()
+        return render_template('ia.html', user=user, history=history, older_cursor=None,
+                               older_archive=older_archive, archived=True)
+
+    # Fetch only the latest window of the chat history (scroll-back via ?before=)
+    history, older_cursor = fetch_history(conn, user['id'], decode_cursor(request.args.get('before')),
+                                          current_app.config.get('IA_HISTORY_SIZE', DEFAULT_HISTORY_SIZE))
+    # Fim do histórico em ai_chats: o próximo passo para trás é o arquivo
+    older_archive = None if older_cursor else db.previous_ai_chat_archive(conn, user['id'])
     conn.close()
-    return render_template('ia.html', user=user, history=messages)
+    return render_template('ia.html', user=user, history=history, older_cursor=older_cursor,
+                           older_archive=older_archive, archived=False)
+
+
+def _sse(event, data):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+@ia_bp.route('/ia/stream', methods=['POST'])
+@login_required
+def ia_chat_stream():
+    '''Envia a mensagem ao modelo e repassa a resposta em Server-Sent Events.
+
+    Eventos: "token" (pedaço de texto), "error" (mensagem de falha) e "done".
+    '''
+    user = current_user()
+    data = request.get_json(silent=True) or request.form
+    message = (data.get('message') or '').strip()
+    if not message:
+        return jsonify({'error': 'message required'}), 400
+    conn = get_db_connection()
+    _save_message(conn, user['id'], 'user', message)
+    conn.close()
+
+    def generate():
+        parts = []
+        stream = _client().stream
+        if ia_cache.ENABLED:
+            # Cache e single-flight: prompts iguais em andamento acompanham o mesmo stream do modelo
+            chunks = ia_cache.cache.stream_or_compute(_cache_key(message), lambda: stream(message))
+        else:
+            chunks = stream(message)
+        try:
+            with closing(chunks):
+                for text in chunks:
+                    parts.append(text)
+                    yield _sse('token', text)
+            current_app.logger.info("IA stream ok user_id=%s", user['id'])
+        except Exception as exc:
+            parts = [_error_reply(exc, user['id'])]
+            yield _sse('error', parts[0])
+        reply = ''.join(parts) or EMPTY_REPLY
+        conn = get_db_connection()
+        _save_message(conn, user['id'], 'ai', reply)
+        conn.close()
+        yield _sse('done', reply)
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@ia_bp.route('/api/ia/cache', methods=['GET'])
+@login_required
+def api_ia_cache_stats():
+    '''Contadores do cache de respostas da IA (hits, misses, coalesced, evictions...).'''
+    return jsonify(ia_cache.cache.snapshot())
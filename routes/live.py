@@ -0,0 +1,123 @@
+'''
+Blueprint das atualizações ao vivo (Server-Sent Events).
+
+Cada conexão SSE prende uma thread do worker enquanto a aba fica aberta
+(no perfil sync, o worker inteiro). Só no gevent e no live (processo à
+parte só para /api/eventos), onde a conexão é um greenlet, o limite é o do
+barramento; nos outros perfis o gunicorn.conf.py define
+EVENT_SSE_MAX_CONNECTIONS como uma fração das threads, e quem passa do
+limite recebe 503 e faz polling em /api/eventos/recentes.
+'''
+import os
+import json
+import threading
+from flask import Blueprint, Response, request, jsonify, current_app
+
+import events
+from db import login_required
+
+live_bp = Blueprint("live", __name__)
+
+HEARTBEAT_SECONDS = 20
+EVENT_TYPES = ("post", "comment", "ranking")
+SSE_MAX_CONNECTIONS = int(os.environ.get('EVENT_SSE_MAX_CONNECTIONS', events.MAX_SUBSCRIBERS))
+POLL_SECONDS = 15  # intervalo sugerido ao polling de quem ficou sem SSE
+
+_sse_open = 0
+_sse_lock = threading.Lock()
+
+
+def _acquire_sse_slot(limit):
+    global _sse_open
+    with _sse_lock:
+        if _sse_open >= limit:
+            return False
+        _sse_open += 1
+        return True
+
+
+def _release_sse_slot():
+    global _sse_open
+    with _sse_lock:
+        _sse_open -= 1
+
+
+def _event_types():
+    return [t for t in request.args.get("tipos", "").split(",") if t in EVENT_TYPES] or None
+
+
+def _format_event(event):
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+
+
+def _stream(sub, heartbeat):
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            batch, overflowed = sub.get(timeout=heartbeat)
+            if overflowed:
+                yield "event: resync\ndata: {}\n\n"
+            elif batch:
+                yield "".join(_format_event(event) for event in batch)
+            else:
+                yield ": ping\n\n"  # mantém proxies e o navegador sabendo que a conexão vive
+    finally:
+        events.bus.unsubscribe(sub)
+
+
+@live_bp.route("/api/eventos")
+@login_required
+def event_stream():
+    '''Envia novos posts, comentários e mudanças de ranking como SSE.
+
+    ?tipos=post,comment filtra os eventos; Last-Event-ID (enviado pelo
+    EventSource ao reconectar) reenvia o que ficou no buffer de replay.
+    '''
+    try:
+        last_id = int(request.headers.get("Last-Event-ID", ""))
+    except ValueError:
+        last_id = None
+    limit = current_app.config.get("EVENT_SSE_MAX_CONNECTIONS", SSE_MAX_CONNECTIONS)
+    if not _acquire_sse_slot(limit):
+        current_app.logger.info("Event stream rejected: %s SSE connections open, client falls back to polling",
+                                limit)
+        return _poll_instead()
+    sub = events.bus.subscribe(_event_types(), last_id)
+    if sub is None:
+        _release_sse_slot()
+        current_app.logger.warning("Event stream rejected: subscriber limit reached")
+        return _poll_instead()
+    # Sem stream_with_context: o gerador não usa a requisição e o teardown
+    # devolve a conexão do banco ao pool antes de a conexão ficar ociosa
+    heartbeat = current_app.config.get("EVENT_HEARTBEAT", HEARTBEAT_SECONDS)
+    response = Response(_stream(sub, heartbeat), mimetype="text/event-stream",
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # call_on_close roda mesmo se o gerador nunca chegou a começar
+    response.call_on_close(lambda: (events.bus.unsubscribe(sub), _release_sse_slot()))
+    return response
+
+
+def _poll_instead():
+    # O EventSource desiste num 503 (não reconecta); a página passa a fazer polling
+    return (jsonify({'error': 'live stream unavailable', 'poll': '/api/eventos/recentes',
+                     'poll_seconds': POLL_SECONDS}),
+            503, {'Retry-After': str(POLL_SECONDS)})
+
+
+@live_bp.route("/api/eventos/recentes")
+@login_required
+def recent_events():
+    '''Polling para quem ficou sem SSE: eventos depois de ?desde=<id>.
+
+    Sem ?desde= devolve só last_id, de onde a próxima chamada parte;
+    resync=true quando o buffer de replay já não cobre o intervalo.
+    '''
+    batch, last_id, overflowed = events.bus.since(request.args.get("desde", type=int), _event_types())
+    return jsonify({'events': batch, 'last_id': last_id, 'resync': overflowed, 'poll_seconds': POLL_SECONDS})
+
+
+@live_bp.route("/api/eventos/status")
+@login_required
+def event_status():
+    '''Contadores do barramento de eventos deste processo.'''
+    return jsonify(events.bus.snapshot())
@@ -0,0 +1,148 @@
+'''
+Blueprint da busca textual (FTS5) em posts, comentários e usuários.
+'''
+import re
+from flask import Blueprint, render_template, request, jsonify, current_app
+from markupsafe import Markup, escape
+
+from db import get_db_connection, current_user, login_required, api_login_required, format_timestamp
+
+search_bp = Blueprint("search", __name__)
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 50
+MAX_PAGE = 50  # bm25 pagina por OFFSET; páginas muito fundas não valem o custo
+MAX_TERMS = 8
+# bm25 só ordena os MAX_CANDIDATES acertos mais recentes: um termo comum casa
+# com centenas de milhares de posts e pontuar todos custaria segundos
+MAX_CANDIDATES = 10000
+SEARCH_TYPES = ("posts", "comentarios", "usuarios")
+
+# Marcadores do snippet(): caracteres de controle que não aparecem no texto,
+# trocados por <mark> depois de escapar o HTML do conteúdo
+_MARK_OPEN, _MARK_CLOSE = "\x02", "\x03"
+_TOKEN_RE = re.compile(r"(\w+)(\*?)", re.UNICODE)
+
+FTS_TABLE = {"posts": "posts_fts", "comentarios": "comments_fts", "usuarios": "users_fts"}
+
+SEARCH_SQL = {
+    "posts": f'''SELECT p.id, p.user_id, p.created_at, u.username, u.display_name,
+                        snippet(posts_fts, 0, '{_MARK_OPEN}', '{_MARK_CLOSE}', '…', 16) AS snippet
+                 FROM posts_fts
+                 JOIN posts p ON p.id = posts_fts.rowid
+                 JOIN users u ON u.id = p.user_id
+                 WHERE posts_fts MATCH ? AND posts_fts.rowid >= ?
+                 ORDER BY bm25(posts_fts) LIMIT ? OFFSET ?''',
+    "comentarios": f'''SELECT c.id, c.post_id, c.user_id, c.created_at, u.username, u.display_name,
+                              snippet(comments_fts, 0, '{_MARK_OPEN}', '{_MARK_CLOSE}', '…', 16) AS snippet
+                       FROM comments_fts
+                       JOIN comments c ON c.id = comments_fts.rowid
+                       JOIN users u ON u.id = c.user_id
+                       WHERE comments_fts MATCH ? AND comments_fts.rowid >= ?
+                       ORDER BY bm25(comments_fts) LIMIT ? OFFSET ?''',
+    # Nome de usuário e nome de exibição pesam mais que bio e cidade
+    "usuarios": f'''SELECT u.id, u.username, u.display_name, u.city,
+                           snippet(users_fts, -1, '{_MARK_OPEN}', '{_MARK_CLOSE}', '…', 12) AS snippet
+                    FROM users_fts
+                    JOIN users u ON u.id = users_fts.rowid
+                    WHERE users_fts MATCH ? AND users_fts.rowid >= ?
+                    ORDER BY bm25(users_fts, 10.0, 5.0, 1.0, 2.0) LIMIT ? OFFSET ?''',
+}
+
+
+def build_match(query):
+    '''Converte o texto digitado em uma expressão MATCH segura.
+
+    Cada palavra vira um termo entre aspas (sem operadores do FTS5 vindos do
+    usuário); um * colado no fim da palavra vira busca por prefixo ("mag*").
+    Retorna None se não houver nenhuma palavra.
+    '''
+    terms = _TOKEN_RE.findall(query or "")[:MAX_TERMS]
+    if not terms:
+        return None
+    return " ".join(f'"{word}"' + ("*" if len(word) >= 2 and star else "") for word, star in terms)
+
+
+def _highlight(snippet):
+    return Markup(str(escape(snippet or "")).replace(_MARK_OPEN, "<mark>").replace(_MARK_CLOSE, "</mark>"))
+
+
+def _format_result(kind, row):
+    result = {'id': row['id'], 'snippet': _highlight(row['snippet'])}
+    if kind == "usuarios":
+        result.update(username=row['username'], display_name=row['display_name'], city=row['city'])
+    else:
+        result.update(
+            created_at_human=format_timestamp(row['created_at']),
+            author={'id': row['user_id'], 'username': row['username'], 'display_name': row['display_name']}
+        )
+        if kind == "comentarios":
+            result['post_id'] = row['post_id']
+    return result
+
+
+def search(conn, kind, query, page=1, limit=DEFAULT_PAGE_SIZE):
+    '''Busca `query` em um dos SEARCH_TYPES, ordenado por relevância (bm25).
+
+    A relevância é calculada entre os MAX_CANDIDATES acertos mais novos (maior
+    rowid); o limite é achado percorrendo só a lista de rowids do termo.
+    Retorna (resultados, has_more).
+    '''
+    match = build_match(query)
+    if match is None:
+        return [], False
+    fts = FTS_TABLE[kind]
+    floor = conn.execute(f'SELECT rowid FROM {fts} WHERE {fts} MATCH ? ORDER BY rowid DESC LIMIT 1 OFFSET ?',
+                         (match, MAX_CANDIDATES)).fetchone()
+    rows = conn.execute(SEARCH_SQL[kind], (match, floor[0] if floor else 0, limit + 1, (page - 1) * limit)).fetchall()
+    return [_format_result(kind, row) for row in rows[:limit]], len(rows) > limit
+
+
+def _search_args():
+    kind = request.args.get("tipo", "posts")
+    if kind not in SEARCH_TYPES:
+        kind = "posts"
+    try:
+        page = max(1, min(int(request.args.get("page", 1)), MAX_PAGE))
+    except ValueError:
+        page = 1
+    try:
+        limit = max(1, min(int(request.args.get("limit", DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE))
+    except ValueError:
+        limit = DEFAULT_PAGE_SIZE
+    return request.args.get("q", "").strip(), kind, page, limit
+
+
+@search_bp.route("/buscar")
+@login_required
+def search_page():
+    '''Página de busca em posts, comentários e usuários.'''
+    user = current_user()
+    query, kind, page, limit = _search_args()
+    results, has_more = [], False
+    if query:
+        conn = get_db_connection()
+        results, has_more = search(conn, kind, query, page, limit)
+        conn.close()
+        current_app.logger.info("Search tipo=%s results=%s page=%s", kind, len(results), page)
+    return render_template("search.html", user=user, query=query, kind=kind, page=page,
+                           results=results, has_more=has_more and page < MAX_PAGE)
+
+
+@search_bp.route("/api/buscar")
+@api_login_required
+def api_search():
+    '''Retorna resultados da busca em JSON, com snippets em HTML (<mark> nos termos).'''
+    query, kind, page, limit = _search_args()
+    conn = get_db_connection()
+    results, has_more = search(conn, kind, query, page, limit)
+    conn.close()
+    for result in results:
+        result['snippet'] = str(result['snippet'])
+    return jsonify({
+        'query': query,
+        'tipo': kind,
+        'page': page,
+        'results': results,
+        'next_page': page + 1 if has_more and page < MAX_PAGE else None
+    })
@@ -0,0 +1,162 @@
+'''
+Fila write-behind para os scores dos jogos.
+
+Os scores enviados por requisições concorrentes entram em uma fila limitada e
+uma thread de escrita os agrupa em uma única transação (executemany) a cada
+FLUSH_INTERVAL ou BATCH_SIZE linhas, trocando um commit por score por um commit
+por lote. A fila é esvaziada no encerramento do processo (atexit).
+
+save() é a entrada única para gravar scores (rotas de score e sessões de jogo
+validadas), escolhendo entre o commit direto e a fila.
+'''
+import os
+import queue
+import atexit
+import logging
+import threading
+import time
+
+import db
+import events
+import leaderboard
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = int(os.environ.get('SCORE_BATCH_SIZE', 200))
+FLUSH_INTERVAL = float(os.environ.get('SCORE_FLUSH_INTERVAL_MS', 5)) / 1000
+MAX_QUEUE = int(os.environ.get('SCORE_MAX_QUEUE', 10000))
+
+_STOP = object()
+
+
+class ScoreWriter:
+    """Agrupa inserts de scores em transações por lote, numa thread própria."""
+
+    def __init__(self, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL, max_queue=MAX_QUEUE):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.stats = {'enqueued': 0, 'written': 0, 'batches': 0, 'rejected': 0}
+
+    def _ensure_started(self):
+        # Iniciada sob demanda e recriada após fork (cada worker tem a sua)
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self._queue.maxsize)
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='score-writer', daemon=True)
+            self._thread.start()
+
+    def submit(self, rows):
+        """Enfileira [(user_id, game, score)].
+
+        Retorna um threading.Event marcado quando o lote for processado (com
+        done.ok indicando sucesso), ou None se a fila estiver cheia (quem chamou
+        deve gravar diretamente).
+        """
+        self._ensure_started()
+        done = threading.Event()
+        done.ok = False
+        try:
+            self._queue.put_nowait((rows, done))
+        except queue.Full:
+            self.stats['rejected'] += 1
+            return None
+        self.stats['enqueued'] += len(rows)
+        return done
+
+    def _run(self):
+        conn = db.get_db_connection()
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _STOP:
+                    return
+                pending = [item]
+                count = len(item[0])
+                deadline = time.monotonic() + self.flush_interval
+                stop = False
+                while count < self.batch_size:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=timeout)
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stop = True
+                        break
+                    pending.append(item)
+                    count += len(item[0])
+                self._write(conn, pending)
+                if stop:
+                    return
+        finally:
+            conn.close()
+
+    def _write(self, conn, pending):
+        rows = [row for batch, _ in pending for row in batch]
+        try:
+            with conn:
+                db.record_scores(conn, rows)
+        except Exception:
+            logger.exception("Score batch failed (%s rows)", len(rows))
+        else:
+            self.stats['written'] += len(rows)
+            self.stats['batches'] += 1
+            for _, done in pending:
+                done.ok = True
+            improved = {game for user_id, game, score in rows if leaderboard.board.record(game, user_id, score)}
+            for game in improved:
+                events.publish('ranking', {'game': game})
+        finally:
+            for _, done in pending:
+                done.set()
+
+    def flush(self, timeout=5.0):
+        """Para a thread depois de gravar tudo o que estiver na fila."""
+        thread = self._thread
+        if thread is None or not thread.is_alive() or self._pid != os.getpid():
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+
+
+writer = ScoreWriter()
+atexit.register(writer.flush)
+
+
+def save(rows, mode='direct', timeout=5.0):
+    """Grava [(user_id, game, score)] conforme o modo (SCORE_WRITE_MODE).
+
+    direct: commit na hora; group: entra na fila e espera o commit do lote (até
+    `timeout` segundos); async: entra na fila e retorna sem esperar. Com a fila
+    cheia grava direto. Retorna 'ok' (gravado) ou 'queued' (pendente na fila).
+    """
+    if mode in ('group', 'async'):
+        done = writer.submit(rows)
+        if done is not None:
+            if mode == 'async':
+                return 'queued'
+            if not done.wait(timeout):
+                return 'queued'
+            if done.ok:
+                return 'ok'
+        logger.warning("Score queue unavailable, writing %s rows directly", len(rows))
+    conn = db.get_db_connection()
+    try:
+        with conn:
+            db.record_scores(conn, rows)
+    finally:
+        conn.close()
+    improved = {game for user_id, game, score in rows if leaderboard.board.record(game, user_id, score)}
+    for game in improved:
+        events.publish('ranking', {'game': game})
+    return 'ok'
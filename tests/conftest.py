@@ -0,0 +1,55 @@
+'''
+Fixtures dos testes: aplicação com banco temporário, cliente já logado e o
+servidor de modelo falso (bench/stub_model_server.py) numa porta livre.
+'''
+import os
+import threading
+
+import pytest
+
+# Hash de senha na própria thread: os testes não precisam do pool de processos
+os.environ.setdefault('PASSWORD_HASH_WORKERS', '0')
+
+import db  # noqa: E402
+import stub_model_server  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DB_PATH', str(tmp_path / 'database.db'))
+    import app as app_module
+    application = app_module.create_app({'TESTING': True, 'UPLOAD_FOLDER': str(tmp_path / 'uploads')})
+    db.init_db()
+    conn = db.get_db_connection()
+    with conn:
+        conn.execute("INSERT INTO users (username, email, password_hash) VALUES ('ana', 'ana@teste', 'x')")
+    conn.close()
+    yield application
+    db.close_pool()
+
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = 1
+    return client
+
+
+@pytest.fixture
+def stub_model(monkeypatch):
+    """Fábrica: stub_model(delay=..., status=...) sobe o servidor falso e aponta o ia_client para ele."""
+    import ia_client
+    servers = []
+
+    def start(delay=0.0, status=200):
+        server = stub_model_server.serve(port=0, delay=delay, status=status)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        monkeypatch.setattr(ia_client, 'IA_URL', f'http://127.0.0.1:{server.server_address[1]}')
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
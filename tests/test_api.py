@@ -0,0 +1,65 @@
+'''
+API JSON: autenticação, validação do corpo e paginação por cursor do feed e dos comentários.
+'''
+import pytest
+
+import db
+
+
+@pytest.mark.parametrize('url', ['/api/posts', '/api/buscar?q=teste'])
+def test_api_without_session_is_401_json(app, url):
+    resp = app.test_client().get(url)
+    assert resp.status_code == 401
+    assert resp.get_json() == {'error': 'authentication required'}
+
+
+@pytest.mark.parametrize('body', [{'content': 42}, {'content': ['a']}, {'content': {'a': 1}}, ['a'], 'texto'])
+def test_non_string_content_is_400(client, body):
+    assert client.post('/api/posts', json=body).status_code == 400
+    assert client.post('/api/posts/1/comments', json=body).status_code == 400
+
+
+def test_pages_still_redirect_to_login(app):
+    resp = app.test_client().get('/feed')
+    assert resp.status_code == 302 and '/login' in resp.headers['Location']
+
+
+def test_post_comments_paginate(client):
+    conn = db.get_db_connection()
+    with conn:
+        post_id = conn.execute("INSERT INTO posts (user_id, content) VALUES (1, 'oi')").lastrowid
+        for i in range(3):
+            conn.execute('INSERT INTO comments (post_id, user_id, content, created_at) VALUES (?, 1, ?, ?)',
+                         (post_id, f'c{i}', f'2025-01-01 10:0{i}:00'))
+    conn.close()
+    first = client.get(f'/api/posts/{post_id}/comments?limit=2').get_json()
+    assert [c['content'] for c in first['comments']] == ['c2', 'c1']
+    rest = client.get(f"/api/posts/{post_id}/comments?limit=2&before={first['next_cursor']}").get_json()
+    assert [c['content'] for c in rest['comments']] == ['c0'] and rest['next_cursor'] is None
+    assert client.get(f'/api/feed/posts/{post_id}/comments').status_code == 404
+
+
+def _feed_ids(client, limit):
+    pages, cursor = [], None
+    while True:
+        data = client.get(f'/api/posts?limit={limit}' + (f'&before={cursor}' if cursor else '')).get_json()
+        pages.append([p['id'] for p in data['posts']])
+        cursor = data['next_cursor']
+        if cursor is None:
+            return pages
+
+
+def test_feed_keyset_pagination_boundaries(client):
+    conn = db.get_db_connection()
+    with conn:
+        times = ['2025-01-01 10:00:00'] * 4 + ['2025-01-01 09:00:00', '2025-01-01 11:00:00', '2025-01-01 10:00:00']
+        ids = [conn.execute('INSERT INTO posts (user_id, content, created_at) VALUES (1, ?, ?)',
+                            (f'p{i}', created_at)).lastrowid for i, created_at in enumerate(times)]
+    conn.close()
+    expected = [ids[5], ids[6], ids[3], ids[2], ids[1], ids[0], ids[4]]
+    assert _feed_ids(client, 3) == [expected[:3], expected[3:6], expected[6:]]
+    assert _feed_ids(client, 7) == [expected]  # página exata: sem cursor para uma página vazia
+    assert _feed_ids(client, 1) == [[post_id] for post_id in expected]
+    for cursor in ('lixo', '2025-01-01_x', ''):
+        assert [p['id'] for p in client.get(f'/api/posts?limit=2&before={cursor}').get_json()['posts']] == expected[:2]
+    assert len(client.get('/api/posts?limit=0').get_json()['posts']) == 1
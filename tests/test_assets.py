@@ -0,0 +1,69 @@
+'''
+Irmãos .gz pré-comprimidos: só servidos enquanto correspondem ao original.
+'''
+import os
+import gzip
+
+import pytest
+from flask import Flask
+
+import assets
+
+
+def _app(static_root):
+    app = Flask(__name__, static_folder=str(static_root), static_url_path='/static')
+    assets.init_app(app)
+    return app
+
+
+def test_precompressed_sibling_is_served_while_fresh(tmp_path):
+    original = tmp_path / 'app.js'
+    original.write_text('console.log(1);')
+    assets.precompress(str(tmp_path), assets.build_manifest(str(tmp_path)))
+    client = _app(tmp_path).test_client()
+    resp = client.get('/static/app.js', headers={'Accept-Encoding': 'gzip'})
+    assert resp.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(resp.get_data()) == b'console.log(1);'
+    resp.close()
+
+
+def test_stale_sibling_is_ignored(tmp_path):
+    original = tmp_path / 'app.js'
+    original.write_text('console.log(1);')
+    assets.precompress(str(tmp_path), assets.build_manifest(str(tmp_path)))
+    stat = os.stat(original)
+    original.write_text('console.log(2);')
+    # Docker COPY e rsync -t preservam o mtime: só o hash do conteúdo denuncia o irmão velho
+    os.utime(original, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    client = _app(tmp_path).test_client()
+    resp = client.get('/static/app.js', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in resp.headers
+    assert resp.get_data() == b'console.log(2);'
+    resp.close()
+
+
+def test_precompress_replaces_previous_build(tmp_path):
+    original = tmp_path / 'app.js'
+    original.write_text('console.log(1);')
+    assets.precompress(str(tmp_path), assets.build_manifest(str(tmp_path)))
+    original.write_text('console.log(2);')
+    manifest = assets.build_manifest(str(tmp_path))
+    assets.precompress(str(tmp_path), manifest)
+    assert sorted(p.name for p in tmp_path.glob('app.js.*.gz')) == [f"app.js.{manifest['app.js']}.gz"]
+
+
+@pytest.mark.parametrize('accept, encoding', [
+    ('gzip;q=0', None),
+    ('gzip; q=0.0, identity', None),
+    ('br;q=1, gzip;q=0.5', 'gzip'),
+    ('*', 'gzip'),
+    ('*, gzip;q=0', None),
+    ('GZIP;Q=0.8', 'gzip'),
+])
+def test_accept_encoding_quality(tmp_path, accept, encoding):
+    (tmp_path / 'app.js').write_text('console.log(1);')
+    assets.precompress(str(tmp_path), assets.build_manifest(str(tmp_path)))
+    client = _app(tmp_path).test_client()
+    resp = client.get('/static/app.js', headers={'Accept-Encoding': accept})
+    assert resp.headers.get('Content-Encoding') == encoding
+    resp.close()
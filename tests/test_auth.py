@@ -0,0 +1,37 @@
+'''
+Edição de perfil com o cache de usuários ligado (linha possivelmente defasada).
+'''
+import io
+
+import db
+import media
+
+OLD = f'uploads/{media.CAS_DIR}/aa/aa/{"a" * 64}.png'
+OTHER = f'uploads/{media.CAS_DIR}/bb/bb/{"b" * 64}.png'
+
+
+def _refcounts(conn):
+    return dict(conn.execute('SELECT path, refcount FROM media_blobs').fetchall())
+
+
+def test_edit_profile_releases_the_stored_avatar_not_the_cached_one(app, client):
+    app.config['USER_CACHE_TTL'] = 60
+    conn = db.get_db_connection()
+    with conn:
+        conn.execute('UPDATE users SET avatar_path = ? WHERE id = 1', (OLD,))
+        media.acquire(conn, OLD)
+    assert client.get('/profile').status_code == 200  # linha com OLD fica no cache
+    # Outro worker troca o avatar; o cache deste processo não fica sabendo
+    with conn:
+        conn.execute('UPDATE users SET avatar_path = ? WHERE id = 1', (OTHER,))
+        media.acquire(conn, OTHER)
+        media.release(conn, OLD)
+    resp = client.post('/profile/edit', data={'display_name': 'Ana', 'avatar': (io.BytesIO(b'novo'), 'a.png')},
+                       content_type='multipart/form-data')
+    assert resp.status_code == 302
+    media.shutdown()
+    new_path = conn.execute('SELECT avatar_path FROM users WHERE id = 1').fetchone()[0]
+    counts = _refcounts(conn)
+    conn.close()
+    assert new_path not in (OLD, OTHER)
+    assert counts[OLD] == 0 and counts[OTHER] == 0 and counts[new_path] == 1
@@ -0,0 +1,53 @@
+'''
+Ferramentas de bench: o banco sintético do seed_db e o resumo do load_routes.
+'''
+import pytest
+
+import db
+import load_routes
+import seed_db
+
+SIZES = dict(users=30, posts=60, comments=120, scores=300, follows=3)
+
+
+@pytest.fixture
+def seeded(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DB_PATH', db.DB_PATH)  # seed() troca o caminho global
+    path = str(tmp_path / 'bench.db')
+    seed_db.seed(path, **SIZES)
+    conn = db.get_db_connection()
+    yield conn
+    conn.close()
+
+
+def _count(conn, table):
+    return conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+
+
+def test_seed_fills_every_table(seeded):
+    assert db.get_schema_version(seeded) == db.SCHEMA_VERSION
+    assert [_count(seeded, t) for t in ('users', 'posts', 'comments', 'scores')] == [30, 60, 120, 300]
+    assert 0 < _count(seeded, 'follows') <= 30 * 3
+    best = seeded.execute('SELECT user_id, game, best_score FROM best_scores ORDER BY 1, 2').fetchall()
+    assert [tuple(row) for row in best] == [tuple(row) for row in seeded.execute(
+        'SELECT user_id, game, MAX(score) FROM scores GROUP BY 1, 2 ORDER BY 1, 2')]
+    assert _count(seeded, 'timeline') == seeded.execute(
+        'SELECT COUNT(*) FROM (SELECT user_id, id FROM posts UNION '
+        'SELECT f.follower_id, p.id FROM follows f JOIN posts p ON p.user_id = f.followee_id)').fetchone()[0]
+
+
+def test_seed_restores_search_triggers(seeded):
+    assert seeded.execute("SELECT COUNT(*) FROM posts_fts WHERE posts_fts MATCH 'orkut'").fetchone()[0] > 0
+    with seeded:
+        post_id = seeded.execute("INSERT INTO posts (user_id, content) VALUES (1, 'palavrainedita')").lastrowid
+    assert [row[0] for row in seeded.execute("SELECT rowid FROM posts_fts WHERE posts_fts MATCH 'palavrainedita'")] == [post_id]
+
+
+def test_summarize_and_compare():
+    samples = {'GET /feed': [0.001 * i for i in range(1, 101)], 'POST /ia': []}
+    report = load_routes.summarize(samples, {'GET /feed': 2}, elapsed=10)
+    assert report['GET /feed'] == {'requests': 100, 'p50_ms': 51.0, 'p99_ms': 100.0, 'rps': 10.0, 'errors': 2}
+    assert 'POST /ia' not in report and report['total']['requests'] == 100
+    baseline = {'GET /feed': {'p50_ms': 50.0, 'p99_ms': 80.0}}
+    assert load_routes.compare(report, baseline, tolerance=0.1) == ['GET /feed p99_ms: 80.00 -> 100.00']
+    assert load_routes.compare(report, baseline, tolerance=0.5) == []
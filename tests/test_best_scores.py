@@ -0,0 +1,43 @@
+'''
+Tabela materializada best_scores: atualização incremental e recálculo.
+'''
+import db
+
+SCORES = [(1, 'tetris', 50), (2, 'tetris', 80), (1, 'tetris', 120), (1, 'tetris', 30), (1, 'snake', 7)]
+
+
+def _add_user(conn, name):
+    return conn.execute("INSERT INTO users (username, email, password_hash) VALUES (?, ?, 'x')",
+                        (name, f'{name}@teste')).lastrowid
+
+
+def _best(conn):
+    return {(row['user_id'], row['game']): row['best_score']
+            for row in conn.execute('SELECT user_id, game, best_score FROM best_scores')}
+
+
+def test_record_scores_keeps_best_per_user_and_game(app):
+    conn = db.get_db_connection()
+    with conn:
+        _add_user(conn, 'bia')
+        db.record_scores(conn, SCORES[:3])
+        db.record_score(conn, *SCORES[3])
+        db.record_score(conn, *SCORES[4])
+    assert _best(conn) == {(1, 'tetris'): 120, (2, 'tetris'): 80, (1, 'snake'): 7}
+    versions = db.fragment_versions(conn, ['ranking:tetris', 'ranking:snake', 'ranking:pong'])
+    assert versions == {'ranking:tetris': 2, 'ranking:snake': 1, 'ranking:pong': 0}
+    incremental = _best(conn)
+    assert db.rebuild_best_scores(conn) == 3
+    assert _best(conn) == incremental
+    conn.close()
+
+
+def test_rankings_read_best_scores(app):
+    conn = db.get_db_connection()
+    with conn:
+        _add_user(conn, 'bia')
+        db.record_scores(conn, SCORES)
+    conn.close()
+    assert [(row['username'], row['best_score']) for row in db.top_scores('tetris')] == [('ana', 120), ('bia', 80)]
+    assert [row['username'] for row in db.top_scores('tetris', limit=1)] == ['ana']
+    assert sorted((s['game'], s['score']) for s in db.user_best_scores(1)) == [('snake', 7), ('tetris', 120)]
@@ -0,0 +1,114 @@
+'''
+Pool de conexões SQLite por thread (reaproveitamento, pragmas e devolução)
+e o usuário logado memoizado na requisição e no cache do processo.
+'''
+from flask import session
+
+import db
+
+
+def test_connection_is_reused_across_requests(app):
+    before = db.pool_stats()
+    with app.app_context():
+        conn = db.get_db_connection()
+        conn.close()  # no pool, close() mantém a conexão aberta
+        assert db.get_db_connection() is conn
+    with app.app_context():
+        assert db.get_db_connection() is conn
+        assert conn.execute('SELECT COUNT(*) FROM users').fetchone()[0] == 1
+    stats = db.pool_stats()
+    assert stats['opened'] - before['opened'] <= 1
+    assert stats['reused'] - before['reused'] >= 2
+
+
+def test_pooled_connection_pragmas(app):
+    with app.app_context():
+        conn = db.get_db_connection()
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        assert conn.execute('PRAGMA synchronous').fetchone()[0] == 1  # NORMAL
+        assert conn.execute('PRAGMA busy_timeout').fetchone()[0] > 0
+
+
+def test_release_rolls_back_open_transaction(app):
+    with app.app_context():
+        conn = db.get_db_connection()
+        conn.execute("INSERT INTO users (username, email, password_hash) VALUES ('bia', 'bia@teste', 'x')")
+        assert conn.in_transaction
+    with app.app_context():
+        conn = db.get_db_connection()
+        assert not conn.in_transaction
+        assert conn.execute("SELECT COUNT(*) FROM users WHERE username = 'bia'").fetchone()[0] == 0
+
+
+def test_pool_disabled_closes_connection(app):
+    app.config['DB_POOL_ENABLED'] = False
+    with app.app_context():
+        first = db.get_db_connection()
+    with app.app_context():
+        assert db.get_db_connection() is not first
+
+
+def test_new_db_path_opens_new_connection(app, tmp_path, monkeypatch):
+    with app.app_context():
+        first = db.get_db_connection()
+    monkeypatch.setattr(db, 'DB_PATH', str(tmp_path / 'outro.db'))
+    with app.app_context():
+        second = db.get_db_connection()
+        assert second is not first and second.db_path == db.DB_PATH
+
+
+def test_connection_outside_app_context_is_not_pooled(app):
+    conn = db.get_db_connection()
+    assert not conn.pooled
+    assert db.get_db_connection() is not conn
+    conn.close()
+
+
+def _user_queries(conn):
+    statements = []
+    conn.set_trace_callback(statements.append)
+    return lambda: [sql for sql in statements if sql.startswith('SELECT * FROM users')]
+
+
+def test_current_user_is_memoized_per_request(app):
+    with app.test_request_context():
+        session['user_id'] = 1
+        queries = _user_queries(db.get_db_connection())
+        assert db.current_user()['username'] == 'ana'
+        assert db.current_user() is db.current_user()
+        assert len(queries()) == 1
+        db.invalidate_user(1)
+        db.current_user()
+        assert len(queries()) == 2
+        db.get_db_connection().set_trace_callback(None)
+
+
+def test_user_cache_spans_requests_until_bump(app):
+    app.config['USER_CACHE_TTL'] = 60
+    db.user_cache.clear()
+    with app.test_request_context():
+        session['user_id'] = 1
+        queries = _user_queries(db.get_db_connection())
+        db.current_user()
+    with app.test_request_context():
+        session['user_id'] = 1
+        db.current_user()
+        assert len(queries()) == 1
+        db.invalidate_user(1)
+        db.current_user()
+        assert len(queries()) == 2
+        db.get_db_connection().set_trace_callback(None)
+    db.user_cache.clear()
+
+
+def test_user_cache_expires_and_evicts(monkeypatch):
+    cache = db.UserCache(max_entries=2)
+    now = [100.0]
+    monkeypatch.setattr(db.time, 'monotonic', lambda: now[0])
+    cache.set(1, 'ana', ttl=10)
+    cache.set(2, 'bia', ttl=10)
+    cache.get(1)
+    cache.set(3, 'caio', ttl=10)  # 2 é o menos usado
+    assert (cache.get(1), cache.get(2), cache.get(3)) == ('ana', None, 'caio')
+    now[0] += 11
+    assert cache.get(1) is None
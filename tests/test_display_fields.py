@@ -0,0 +1,45 @@
+'''
+Campos de exibição pré-calculados: data formatada, tipo da mídia e URL do avatar.
+'''
+from datetime import datetime
+
+import pytest
+
+import db
+from routes import common
+
+
+@pytest.mark.parametrize('value', ['2026-10-18 06:50:56', '2026-01-02T03:04:05', '2026-01-02 03:04:05.123456',
+                                   '2026-01-02T03:04:05+00:00', '2026-01-02'])
+def test_format_timestamp_matches_strftime(value):
+    assert db.format_timestamp(value) == datetime.fromisoformat(value).strftime('%d/%m/%Y %H:%M')
+
+
+def test_format_timestamp_empty():
+    assert db.format_timestamp(None) == '' and db.format_timestamp('') == ''
+
+
+def test_media_type_backfill(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DB_PATH', str(tmp_path / 'database.db'))
+    conn = db.get_db_connection()
+    db.create_base_schema(conn)
+    db.run_migrations(conn, target=7)
+    with conn:
+        conn.execute("INSERT INTO users (username, email, password_hash) VALUES ('ana', 'ana@teste', 'x')")
+        conn.executemany('INSERT INTO posts (user_id, content, media_path) VALUES (1, ?, ?)',
+                         [('a', 'uploads/FOTO.JPG'), ('b', 'uploads/clip.webm'), ('c', None), ('d', 'uploads/x.txt')])
+    db.run_migrations(conn, target=8)
+    assert [row[0] for row in conn.execute('SELECT media_type FROM posts ORDER BY id')] == ['image', 'video', None, None]
+    conn.close()
+
+
+def test_avatar_url_resolved_once_per_user(app, monkeypatch):
+    calls = []
+    url_for = common.url_for
+    monkeypatch.setattr(common, 'url_for', lambda *args, **kwargs: calls.append(kwargs) or url_for(*args, **kwargs))
+    with app.test_request_context():
+        urls = [common.avatar_url(path, thumb) for path, thumb in
+                [('a.png', None), ('a.png', 'a_thumb.png'), (None, None), ('a.png', None), (None, None)]]
+    assert urls[0] == urls[3] and urls[2] == urls[4]
+    assert urls[1].startswith('/static/a_thumb.png') and urls[2].startswith('/static/img/default-avatar.png')
+    assert len(calls) == 3
@@ -0,0 +1,63 @@
+'''
+Cache de fragmentos: chaves versionadas pelos contadores de fragment_versions.
+'''
+import pytest
+
+import db
+import fragment_cache
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    backend = fragment_cache.LRUBackend(max_entries=100, ttl=60)
+    monkeypatch.setattr(fragment_cache, 'backend', backend)
+    return backend
+
+
+def _render_posts(conn, post_ids, rendered):
+    def render(missing):
+        rendered.extend(missing)
+        return [f'<p>{post_id}</p>' for post_id in missing]
+    return fragment_cache.render_many(conn, post_ids, lambda post_id: ('card', [f'post:{post_id}', 'user:1']), render)
+
+
+def test_bump_rerenders_only_dependent_fragments(app, backend):
+    conn = db.get_db_connection()
+    rendered = []
+    assert _render_posts(conn, [1, 2, 3], rendered) == ['<p>1</p>', '<p>2</p>', '<p>3</p>']
+    assert _render_posts(conn, [3, 1], rendered) == ['<p>3</p>', '<p>1</p>']
+    assert rendered == [1, 2, 3]
+    with conn:
+        fragment_cache.bump(conn, 'post:2')
+    _render_posts(conn, [1, 2, 3], rendered)
+    assert rendered == [1, 2, 3, 2]
+    with conn:
+        fragment_cache.bump(conn, 'user:1')
+    _render_posts(conn, [1, 2, 3], rendered)
+    assert rendered == [1, 2, 3, 2, 1, 2, 3]
+    assert backend.stats['hits'] == 4
+    conn.close()
+
+
+def test_lru_backend_evicts_and_expires(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(fragment_cache.time, 'monotonic', lambda: now[0])
+    backend = fragment_cache.LRUBackend(max_entries=2, ttl=10)
+    backend.set('a', 'A')
+    backend.set('b', 'B')
+    backend.get_many(['a'])
+    backend.set('c', 'C')
+    assert backend.get_many(['a', 'b', 'c']) == {'a': 'A', 'c': 'C'}
+    assert backend.stats['evictions'] == 1
+    now[0] += 11
+    assert backend.get_many(['a', 'c']) == {}
+
+
+def test_new_comment_invalidates_cached_post_card(client, backend):
+    post = client.post('/api/posts', json={'content': 'post em cache'}).get_json()
+    assert 'post em cache' in client.get('/feed').get_data(as_text=True)
+    client.post(f"/api/posts/{post['id']}/comments", json={'content': 'comentário novo'})
+    assert 'comentário novo' in client.get('/feed').get_data(as_text=True)
+    assert backend.stats['hits'] == 0 and backend.stats['misses'] == 2
+    client.get('/feed')
+    assert backend.stats['hits'] == 1
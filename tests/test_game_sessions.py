@@ -0,0 +1,46 @@
+'''
+Sessões de jogo: score aceito passa pela fila write-behind e limite de
+velocidade do Pac-Man.
+'''
+import base64
+
+import pytest
+
+import db
+import game_sessions as gs
+import score_writer
+
+# Três pastilhas em linha (uma célula por tick) e as três mortes do fim de jogo
+PACMAN_RUN = ([(0, gs.PELLET, gs.PACMAN_START), (200, gs.PELLET, gs.PACMAN_START + 1),
+               (200, gs.PELLET, gs.PACMAN_START + 2)] + [(10, gs.DEATH, 0)] * 3 + [(0, gs.END, 0)])
+
+
+def _pacman_log(step_ms):
+    return gs.encode_log('pacman', [(0, gs.PELLET, gs.PACMAN_START), (step_ms, gs.PELLET, gs.PACMAN_START + 1)]
+                         + [(10, gs.DEATH, 0)] * 3 + [(0, gs.END, 0)])
+
+
+@pytest.mark.parametrize('step_ms, ok', [(200, True), (100, True), (99, False), (0, False)])
+def test_pacman_allows_half_a_tick_of_slack(step_ms, ok):
+    assert gs.validate('pacman', _pacman_log(step_ms), 20, 10000)[0] is ok
+
+
+def test_accepted_score_goes_through_score_writer(app, client, monkeypatch):
+    app.config['SCORE_WRITE_MODE'] = 'group'
+    app.config['GAME_REQUIRE_SESSION'] = True
+    writer = score_writer.ScoreWriter()
+    monkeypatch.setattr(score_writer, 'writer', writer)
+    token = client.post('/api/jogos/sessoes', json={'game': 'pacman'}).get_json()['token']
+    log = base64.b64encode(gs.encode_log('pacman', PACMAN_RUN)).decode()
+    conn = db.get_db_connection()
+    with conn:  # a partida "durou" o que o log diz
+        conn.execute('UPDATE game_sessions SET started_at = started_at - 1 WHERE token = ?', (token,))
+    conn.close()
+    resp = client.post(f'/api/jogos/sessoes/{token}', json={'score': 30, 'log': log})
+    assert resp.status_code == 202
+    gs.shutdown()
+    writer.flush()
+    assert writer.stats['enqueued'] == 1 and writer.stats['written'] == 1
+    assert client.get(f'/api/jogos/sessoes/{token}').get_json()['status'] == 'accepted'
+    ranking = client.get('/api/jogos/score?game=pacman').get_json()['ranking']
+    assert [r['score'] for r in ranking] == [30]
@@ -0,0 +1,38 @@
+'''
+Envio de scores: validação do payload, exigência de sessão e lote de sessões.
+'''
+import base64
+
+import pytest
+
+import game_sessions as gs
+import score_writer
+from test_game_sessions import PACMAN_RUN
+
+
+@pytest.mark.parametrize('score', [[1], {'a': 1}, 'x'])
+def test_score_must_be_an_integer(app, client, score):
+    app.config['GAME_REQUIRE_SESSION'] = False
+    resp = client.post('/api/jogos/score', json={'game': 'tetris', 'score': score})
+    assert resp.status_code == 400
+    assert client.post('/api/jogos/score', json=[1]).status_code == 400
+
+
+def test_direct_scores_need_a_session_by_default(client):
+    assert client.post('/api/jogos/score', json={'game': 'tetris', 'score': 10}).status_code == 403
+    resp = client.post('/api/jogos/scores', json={'scores': [{'game': 'tetris', 'score': 10}]})
+    assert resp.status_code == 403
+
+
+def test_batch_closes_game_sessions(app, client, monkeypatch):
+    monkeypatch.setattr(score_writer, 'writer', score_writer.ScoreWriter())
+    log = base64.b64encode(gs.encode_log('pacman', PACMAN_RUN)).decode()
+    tokens = [client.post('/api/jogos/sessoes', json={'game': 'pacman'}).get_json()['token']]
+    items = [{'token': tokens[0], 'score': 30, 'log': log}, {'token': 'nope', 'score': 30, 'log': log}]
+    resp = client.post('/api/jogos/scores', json={'scores': items})
+    assert resp.status_code == 202
+    assert [item['http_status'] for item in resp.get_json()['sessions']] == [202, 404]
+    gs.shutdown()
+    # O log diz que a partida durou ~400 ms e ela foi enviada na hora: cabe na folga do relógio
+    assert client.get(f'/api/jogos/sessoes/{tokens[0]}').get_json()['status'] == 'accepted'
+    assert [r['score'] for r in client.get('/api/jogos/score?game=pacman').get_json()['ranking']] == [30]
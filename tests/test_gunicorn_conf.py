@@ -0,0 +1,95 @@
+'''
+Perfis do gunicorn.conf.py e os hooks de fork e de início do worker.
+'''
+import os
+import runpy
+import logging
+import multiprocessing
+
+import pytest
+
+import db
+import leaderboard
+
+CONF = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'gunicorn.conf.py')
+CORES = multiprocessing.cpu_count()
+
+
+@pytest.fixture
+def load(monkeypatch):
+    for name in ('GUNICORN_PROFILE', 'GUNICORN_WORKERS', 'GUNICORN_THREADS', 'GUNICORN_WORKER_CONNECTIONS',
+                 'EVENT_BUS', 'EVENT_SSE_THREAD_SHARE', 'EVENT_SSE_MAX_CONNECTIONS'):
+        monkeypatch.delenv(name, raising=False)
+
+    def load(**env):
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+        return runpy.run_path(CONF)
+    return load
+
+
+def test_gthread_is_the_default(load):
+    conf = load()
+    assert (conf['worker_class'], conf['workers'], conf['threads'], conf['preload_app']) == \
+        ('gthread', CORES + 1, 4, True)
+    assert os.environ['EVENT_SSE_MAX_CONNECTIONS'] == '1'
+
+
+def test_sync_profile_disables_sse(load):
+    conf = load(GUNICORN_PROFILE='sync', GUNICORN_WORKERS='3')
+    assert (conf['worker_class'], conf['workers'], conf['threads']) == ('sync', 3, 1)
+    assert os.environ['EVENT_SSE_MAX_CONNECTIONS'] == '0'
+
+
+def test_gthread_sse_share(load):
+    load(GUNICORN_THREADS='16', EVENT_SSE_THREAD_SHARE='0.5')
+    assert os.environ['EVENT_SSE_MAX_CONNECTIONS'] == '8'
+
+
+def test_live_profile(load):
+    pytest.importorskip('gevent')
+    with pytest.raises(RuntimeError, match='EVENT_BUS=sqlite'):
+        load(GUNICORN_PROFILE='live')
+    conf = load(GUNICORN_PROFILE='live', EVENT_BUS='sqlite')
+    assert (conf['worker_class'], conf['worker_connections'], conf['preload_app']) == ('gevent', 10000, False)
+    assert 'EVENT_SSE_MAX_CONNECTIONS' not in os.environ
+    assert load(GUNICORN_PROFILE='gevent')['worker_connections'] == 1000
+
+
+def test_unknown_profile(load):
+    with pytest.raises(RuntimeError, match='desconhecido'):
+        load(GUNICORN_PROFILE='tornado')
+
+
+class _Worker:
+    log = logging.getLogger('gunicorn.error')
+
+
+def test_post_worker_init_warms_leaderboard(app, load, monkeypatch):
+    conn = db.get_db_connection()
+    with conn:
+        db.record_score(conn, 1, 'tetris', 100)
+    conn.close()
+    board = leaderboard.Leaderboard()
+    monkeypatch.setattr(leaderboard, 'board', board)
+    load()['post_worker_init'](_Worker())
+    assert board._warm and board.total('tetris') == 1
+
+
+def test_post_worker_init_survives_warm_failure(load, monkeypatch, caplog):
+    def broken():
+        raise RuntimeError('sem banco')
+    monkeypatch.setattr(leaderboard.board, 'warm', broken)
+    load()['post_worker_init'](_Worker())
+    assert 'Leaderboard warm-up failed' in caplog.text
+
+
+def test_fork_hooks_drop_master_connection(app, load):
+    conf = load()
+    with app.app_context():
+        master = db.get_db_connection()
+    conf['pre_fork'](None, None)
+    conf['post_fork'](None, None)
+    assert db.pool_stats()['opened'] == 0
+    with app.app_context():
+        assert db.get_db_connection() is not master
@@ -0,0 +1,154 @@
+'''
+ia_client e rotas /ia contra o servidor de modelo falso: resposta completa,
+streaming SSE, timeout de leitura, ModelBusy (limitador cheio) e 429 do modelo.
+'''
+import json
+import threading
+
+import pytest
+import requests
+
+import db
+import ia_client
+from stub_model_server import REPLY
+
+
+def _sse_events(body):
+    events = []
+    for block in body.decode().split('\n\n'):
+        if not block.strip():
+            continue
+        lines = dict(line.split(': ', 1) for line in block.splitlines())
+        events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+def _last_ai_message():
+    conn = db.get_db_connection()
+    row = conn.execute("SELECT content FROM ai_chats WHERE role = 'ai' ORDER BY id DESC LIMIT 1").fetchone()
+    conn.close()
+    return row['content']
+
+
+def test_complete_returns_model_reply(stub_model):
+    stub_model()
+    assert ia_client.complete('oi') == REPLY.format(prompt='oi')
+
+
+def test_stream_yields_chunks(stub_model):
+    stub_model()
+    chunks = list(ia_client.stream('oi'))
+    assert len(chunks) > 1
+    assert ''.join(chunks).strip() == REPLY.format(prompt='oi')
+
+
+def test_read_timeout(stub_model, monkeypatch):
+    stub_model(delay=0.1)
+    monkeypatch.setattr(ia_client, 'READ_TIMEOUT', 0.2)
+    with pytest.raises(requests.exceptions.Timeout):
+        ia_client.complete('oi')
+
+
+def test_read_timeout_message_on_route(app, client, stub_model, monkeypatch):
+    stub_model(delay=0.1)
+    monkeypatch.setattr(ia_client, 'READ_TIMEOUT', 0.2)
+    resp = client.post('/ia', data={'message': 'oi'})
+    assert resp.status_code == 302
+    assert _last_ai_message() == 'A IA demorou demais para responder. Tente novamente.'
+
+
+def test_model_busy_when_limiter_is_full(stub_model, monkeypatch):
+    stub_model()
+    limiter = threading.BoundedSemaphore(1)
+    monkeypatch.setattr(ia_client, '_limiter', limiter)
+    monkeypatch.setattr(ia_client, 'QUEUE_TIMEOUT', 0.05)
+    limiter.acquire()
+    try:
+        with pytest.raises(ia_client.ModelBusy):
+            ia_client.complete('oi')
+    finally:
+        limiter.release()
+    assert ia_client.complete('oi') == REPLY.format(prompt='oi')
+
+
+def test_model_busy_on_stream_route(app, client, stub_model, monkeypatch):
+    stub_model()
+    limiter = threading.BoundedSemaphore(1)
+    monkeypatch.setattr(ia_client, '_limiter', limiter)
+    monkeypatch.setattr(ia_client, 'QUEUE_TIMEOUT', 0.05)
+    limiter.acquire()
+    try:
+        resp = client.post('/ia/stream', json={'message': 'oi'})
+        events = _sse_events(resp.get_data())
+    finally:
+        limiter.release()
+    assert events[0] == ('error', 'A IA está ocupada agora. Tente novamente em alguns segundos.')
+    assert events[-1][0] == 'done'
+
+
+def test_model_429_is_model_error(stub_model):
+    stub_model(status=429)
+    with pytest.raises(ia_client.ModelError) as excinfo:
+        ia_client.complete('oi')
+    assert excinfo.value.status_code == 429
+    with pytest.raises(ia_client.ModelError):
+        list(ia_client.stream('oi'))
+
+
+def test_model_429_message_on_route(app, client, stub_model):
+    stub_model(status=429)
+    client.post('/ia', data={'message': 'oi'})
+    assert _last_ai_message() == 'Desculpe, a IA não respondeu como esperado (Status: 429).'
+
+
+def test_stream_route_sends_sse(app, client, stub_model):
+    stub_model()
+    resp = client.post('/ia/stream', json={'message': 'oi'})
+    assert resp.status_code == 200
+    assert resp.mimetype == 'text/event-stream'
+    events = _sse_events(resp.get_data())
+    tokens = [data for event, data in events if event == 'token']
+    assert len(tokens) > 1
+    assert events[-1] == ('done', ''.join(tokens))
+    assert ''.join(tokens).strip() == REPLY.format(prompt='oi')
+    assert _last_ai_message() == ''.join(tokens)
+
+
+def test_history_reaches_archived_messages(app, client):
+    conn = db.get_db_connection()
+    with conn:
+        for i in range(5):
+            conn.execute("INSERT INTO ai_chats (user_id, role, content, created_at) VALUES (1, 'user', ?, ?)",
+                         (f'msg{i}', f'2025-01-01 10:0{i}:00'))
+    db.compact_ai_chats(conn, keep=2)
+    archive_id = db.previous_ai_chat_archive(conn, 1)
+    conn.close()
+    page = client.get('/ia').get_data(as_text=True)
+    assert 'msg4' in page and 'msg0' not in page
+    assert f'arquivo={archive_id}' in page
+    page = client.get(f'/ia?arquivo={archive_id}').get_data(as_text=True)
+    assert all(f'msg{i}' in page for i in range(3)) and 'msg4' not in page
+
+
+def test_stream_single_flight(app, stub_model, monkeypatch):
+    import ia_cache
+    server = stub_model(delay=0.02)
+    monkeypatch.setattr(ia_cache, 'ENABLED', True)
+    monkeypatch.setattr(ia_cache, 'cache', ia_cache.ResponseCache(persist=False))
+    results = []
+
+    def ask():
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+        resp = client.post('/ia/stream', json={'message': 'Oi  de novo'})
+        results.append(_sse_events(resp.get_data())[-1])
+
+    threads = [threading.Thread(target=ask) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert server.RequestHandlerClass.calls == 1
+    assert ia_cache.cache.stats['coalesced'] == 3
+    assert results == [('done', REPLY.format(prompt='Oi  de novo') + ' ')] * 4
@@ -0,0 +1,77 @@
+'''
+Cache de respostas da IA: chave normalizada, TTL, limite em bytes, persistência e single-flight.
+'''
+import time
+import threading
+
+import pytest
+
+import ia_cache
+
+
+def test_key_normalizes_prompt_and_includes_params():
+    assert ia_cache.make_key('Oi,  TUDO bem?', model='m') == ia_cache.make_key(' oi, tudo\nbem? ', model='m')
+    assert ia_cache.make_key('oi', model='m') != ia_cache.make_key('oi', model='outro')
+
+
+def test_ttl_and_byte_limit(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ia_cache.time, 'time', lambda: now[0])
+    cache = ia_cache.ResponseCache(ttl=10, max_bytes=10, persist=False)
+    cache.set('a', 'aaaa')
+    cache.set('b', 'bbbb')
+    cache.get('a')
+    cache.set('c', 'cccc')  # passa de 10 bytes: sai o menos usado (b)
+    cache.set('grande', 'x' * 11)  # maior que o limite: nem entra
+    assert [cache.get(key) for key in ('a', 'b', 'c', 'grande')] == ['aaaa', None, 'cccc', None]
+    assert cache.snapshot()['bytes'] == 8 and cache.stats['evictions'] == 1
+    now[0] += 11
+    assert cache.get('a') is None and cache.snapshot()['bytes'] == 4
+
+
+def test_persisted_replies_survive_restart(app, monkeypatch):
+    ia_cache.ResponseCache(ttl=60, persist=True).set('chave', 'resposta')
+    restarted = ia_cache.ResponseCache(ttl=60, persist=True)
+    assert restarted.get('chave') == 'resposta'
+    assert restarted.stats['persisted_hits'] == 1
+    assert restarted.purge_expired() == 0
+    now = ia_cache.time.time() + 61
+    monkeypatch.setattr(ia_cache.time, 'time', lambda: now)
+    assert ia_cache.ResponseCache(persist=True).get('chave') is None
+    assert restarted.purge_expired() == 1
+
+
+def test_get_or_compute_single_flight():
+    cache = ia_cache.ResponseCache(persist=False)
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return 'resposta'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute('k', compute))) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while cache.stats['coalesced'] < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert calls == [1] and results == ['resposta'] * 3
+    assert cache.get_or_compute('k', compute) == 'resposta' and calls == [1]
+
+
+def test_failed_compute_is_not_cached():
+    cache = ia_cache.ResponseCache(persist=False)
+
+    def compute():
+        raise RuntimeError('modelo fora')
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute('k', compute)
+    assert cache.get('k') is None
+    assert cache.get_or_compute('k', lambda: 'ok') == 'ok'
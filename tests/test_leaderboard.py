@@ -0,0 +1,102 @@
+'''
+IndexableSkipList e Leaderboard comparados com uma lista ordenada.
+'''
+import bisect
+import random
+
+import pytest
+
+import db
+import leaderboard
+from leaderboard import IndexableSkipList
+
+
+def _check(skip, expected):
+    assert len(skip) == len(expected)
+    assert skip.slice(0, len(expected)) == expected
+    for i, key in enumerate(expected):
+        assert skip.index(key) == i
+        assert skip.slice(i, i + 1) == [key]
+
+
+def test_insert_remove_rank_select_against_sorted_list():
+    rng = random.Random(7)
+    skip, expected = IndexableSkipList(), []
+    for _ in range(600):
+        if expected and rng.random() < 0.4:
+            key = rng.choice(expected)
+            skip.remove(key)
+            expected.remove(key)
+        else:
+            # Empates no score (poucos valores) desempatados pelo user_id
+            key = (-rng.randrange(20), rng.randrange(10 ** 6))
+            if key in expected:
+                continue
+            skip.insert(key)
+            bisect.insort(expected, key)
+        assert len(skip) == len(expected)
+    _check(skip, expected)
+    for start, stop in [(0, 5), (3, 17), (len(expected) - 4, len(expected) + 10), (-3, 2), (8, 8), (9, 3)]:
+        assert skip.slice(start, stop) == expected[max(start, 0):stop]
+
+
+def test_remove_head_and_tail():
+    skip = IndexableSkipList()
+    keys = [(-s, u) for s, u in [(50, 1), (50, 2), (40, 3), (30, 4), (30, 5)]]
+    for key in reversed(keys):
+        skip.insert(key)
+    _check(skip, sorted(keys))
+    skip.remove(sorted(keys)[0])
+    skip.remove(sorted(keys)[-1])
+    _check(skip, sorted(keys)[1:-1])
+    for key in sorted(keys)[1:-1]:
+        skip.remove(key)
+    _check(skip, [])
+    assert skip.slice(0, 1) == []
+
+
+def test_missing_keys_raise_key_error():
+    skip = IndexableSkipList()
+    skip.insert((-10, 1))
+    with pytest.raises(KeyError):
+        skip.index((-10, 2))
+    with pytest.raises(KeyError):
+        skip.remove((-11, 1))
+    _check(skip, [(-10, 1)])
+
+
+def test_board_update_keeps_personal_best():
+    board = leaderboard._GameBoard()
+    assert board.update(1, 10) and board.update(2, 10) and board.update(3, 5)
+    assert not board.update(1, 7)
+    assert board.update(3, 20)
+    assert board.entries.slice(0, 3) == [(-20, 3), (-10, 1), (-10, 2)]
+    assert board.best == {1: 10, 2: 10, 3: 20}
+
+
+def test_leaderboard_rank_range_around(app):
+    rng = random.Random(3)
+    best = {user_id: rng.randrange(30) for user_id in range(1, 41)}
+    conn = db.get_db_connection()
+    with conn:
+        conn.executemany("INSERT OR IGNORE INTO users (id, username, email, password_hash) VALUES (?, ?, ?, 'x')",
+                         [(u, f'u{u}', f'u{u}@teste') for u in best])
+        db.record_scores(conn, [(u, 'tetris', s) for u, s in best.items()])
+    conn.close()
+    board = leaderboard.Leaderboard()
+    assert board.warm() == len(best)
+    ordered = sorted(best, key=lambda u: (-best[u], u))
+    for position, user_id in enumerate(ordered, 1):
+        assert board.rank('tetris', user_id) == (position, best[user_id])
+    assert board.range('tetris', 1, 3) == [(i + 1, u, best[u]) for i, u in enumerate(ordered[:3])]
+    assert [u for _, u, _ in board.around('tetris', ordered[0], radius=2)] == ordered[:3]
+    assert [u for _, u, _ in board.around('tetris', ordered[-1], radius=2)] == ordered[-3:]
+    assert board.rank('tetris', 999) is None and board.around('tetris', 999) == []
+    assert board.total('tetris') == len(best) and board.range('pacman', 1, 5) == []
+    # Um recorde de outro worker chega pelo sync (scores.id maior que o último visto)
+    conn = db.get_db_connection()
+    with conn:
+        db.record_scores(conn, [(ordered[-1], 'tetris', 100)])
+    conn.close()
+    board.sync(force=True)
+    assert board.rank('tetris', ordered[-1]) == (1, 100)
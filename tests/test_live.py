@@ -0,0 +1,53 @@
+'''
+Limite de conexões SSE por processo e o polling de /api/eventos/recentes.
+'''
+import pytest
+
+import events
+from routes import live
+
+
+@pytest.fixture
+def bus(monkeypatch):
+    bus = events.EventBus()
+    monkeypatch.setattr(events, 'bus', bus)
+    return bus
+
+
+def test_stream_over_the_limit_falls_back_to_polling(app, client, bus):
+    app.config['EVENT_SSE_MAX_CONNECTIONS'] = 1
+    first = client.get('/api/eventos?tipos=post', buffered=False)
+    assert first.status_code == 200
+    second = client.get('/api/eventos?tipos=post')
+    assert second.status_code == 503
+    assert second.get_json()['poll'] == '/api/eventos/recentes'
+    assert bus.snapshot()['subscribers'] == 1
+    first.close()  # fecha sem o gerador ter rodado: a vaga e a inscrição voltam
+    assert live._sse_open == 0 and bus.snapshot()['subscribers'] == 0
+    third = client.get('/api/eventos?tipos=post', buffered=False)
+    assert third.status_code == 200
+    third.close()
+
+
+def test_sse_disabled_under_sync_workers(app, client, bus):
+    app.config['EVENT_SSE_MAX_CONNECTIONS'] = 0
+    assert client.get('/api/eventos').status_code == 503
+
+
+def test_recent_events_polling(client, bus):
+    start = client.get('/api/eventos/recentes?tipos=post').get_json()
+    assert start == {'events': [], 'last_id': 0, 'resync': False, 'poll_seconds': live.POLL_SECONDS}
+    bus.publish('post', {'id': 1})
+    bus.publish('comment', {'post_id': 1})
+    bus.publish('post', {'id': 2})
+    data = client.get('/api/eventos/recentes?tipos=post&desde=1').get_json()
+    assert [event['data'] for event in data['events']] == [{'id': 2}]
+    assert data['last_id'] == 3 and not data['resync']
+
+
+def test_recent_events_resync_after_replay_buffer(client, bus):
+    for i in range(events.REPLAY_SIZE + 2):
+        bus.publish('post', {'id': i})
+    data = client.get('/api/eventos/recentes?desde=1').get_json()
+    assert data['resync'] and data['events'] == []
+    assert data['last_id'] == events.REPLAY_SIZE + 2
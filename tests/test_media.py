@@ -0,0 +1,122 @@
+'''
+Coleta de lixo do store de mídia e gravação das variantes.
+'''
+import io
+import os
+import time
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+import db
+import media
+
+KEPT = 'a' * 64
+ORPHAN = 'b' * 64
+
+
+def _touch(path, age=7200):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(b'x')
+    old = os.path.getmtime(path) - age
+    os.utime(path, (old, old))
+
+
+def test_collect_garbage_removes_orphaned_variants_and_parts(app, tmp_path):
+    cas = tmp_path / 'uploads' / media.CAS_DIR
+    kept = f'uploads/{media.CAS_DIR}/aa/aa/{KEPT}.jpg'
+    for rel in (kept, f'uploads/{media.CAS_DIR}/aa/aa/{KEPT}_w640.jpg',
+                f'uploads/{media.CAS_DIR}/bb/bb/{ORPHAN}_thumb.jpg', f'uploads/{media.CAS_DIR}/tmp/tmpx_y1.part'):
+        _touch(str(tmp_path / rel))
+    conn = db.get_db_connection()
+    with conn:
+        media.acquire(conn, kept)
+    unreferenced, orphans, deleted = media.collect_garbage(conn, str(tmp_path), grace=3600)
+    conn.close()
+    remaining = sorted(name for _, _, files in os.walk(cas) for name in files)
+    assert remaining == [f'{KEPT}.jpg', f'{KEPT}_w640.jpg']
+    assert (unreferenced, orphans, deleted) == (0, 2, 2)
+
+
+def _upload(content, upload_root):
+    return media.store_upload(FileStorage(io.BytesIO(content), filename='foto.jpg'), upload_root)
+
+
+def _unreferenced_blob(conn, tmp_path, content):
+    rel = _upload(content, str(tmp_path / 'uploads'))
+    old = time.time() - 7200
+    os.utime(tmp_path / rel, (old, old))
+    with conn:
+        media.acquire(conn, rel)
+        media.release(conn, rel)
+    return rel
+
+
+def test_collect_garbage_keeps_blob_acquired_during_collection(app, tmp_path, monkeypatch):
+    conn = db.get_db_connection()
+    rel = _unreferenced_blob(conn, tmp_path, b'foto')
+    bury = media._bury
+
+    def upload_between_rename_and_delete(full_path):
+        buried = bury(full_path)
+        other = db.get_db_connection()
+        with other:
+            assert _upload(b'foto', str(tmp_path / 'uploads')) == rel
+            media.acquire(other, rel)
+        other.close()
+        return buried
+
+    monkeypatch.setattr(media, '_bury', upload_between_rename_and_delete)
+    assert media.collect_garbage(conn, str(tmp_path), grace=3600) == (1, 0, 0)
+    assert (tmp_path / rel).read_bytes() == b'foto'
+    assert conn.execute('SELECT refcount FROM media_blobs').fetchone()[0] == 1
+    conn.close()
+
+
+def test_collect_garbage_keeps_blob_touched_before_rename(app, tmp_path, monkeypatch):
+    conn = db.get_db_connection()
+    rel = _unreferenced_blob(conn, tmp_path, b'foto')
+    bury = media._bury
+
+    def upload_before_rename(full_path):
+        _upload(b'foto', str(tmp_path / 'uploads'))  # achou o arquivo: só renova o mtime
+        return bury(full_path)
+
+    monkeypatch.setattr(media, '_bury', upload_before_rename)
+    media.collect_garbage(conn, str(tmp_path), grace=3600)
+    assert (tmp_path / rel).read_bytes() == b'foto'
+    assert conn.execute('SELECT COUNT(*) FROM media_blobs').fetchone()[0] == 1
+    conn.close()
+
+
+def test_collect_garbage_deletes_unreferenced_blob(app, tmp_path):
+    conn = db.get_db_connection()
+    rel = _unreferenced_blob(conn, tmp_path, b'foto')
+    assert media.collect_garbage(conn, str(tmp_path), grace=3600) == (1, 0, 1)
+    assert os.listdir(os.path.dirname(tmp_path / rel)) == []
+    assert conn.execute('SELECT COUNT(*) FROM media_blobs').fetchone()[0] == 0
+    conn.close()
+
+
+def test_resize_replaces_variant_atomically(tmp_path, monkeypatch):
+    Image = pytest.importorskip('PIL.Image')
+    rel = 'uploads/foto.png'
+    os.makedirs(tmp_path / 'uploads')
+    Image.new('RGB', (1200, 800), 'red').save(tmp_path / rel)
+
+    def broken_save(self, fp, *args, **kwargs):
+        with open(fp, 'wb') as f:
+            f.write(b'pela metade')
+        raise OSError('disco cheio')
+
+    with monkeypatch.context() as m:
+        m.setattr(Image.Image, 'save', broken_save)
+        with pytest.raises(OSError):
+            media._resize(str(tmp_path), rel, 'w640', 640)
+    assert os.listdir(tmp_path / 'uploads') == ['foto.png']
+
+    assert media._resize(str(tmp_path), rel, 'w640', 640) == 'uploads/foto_w640.png'
+    assert sorted(os.listdir(tmp_path / 'uploads')) == ['foto.png', 'foto_w640.png']
+    with Image.open(tmp_path / 'uploads/foto_w640.png') as img:
+        assert img.width == 640
@@ -0,0 +1,90 @@
+'''
+/metrics: histograma, acesso (token ou só local), requisições lentas e o
+cursor que mede o SQL.
+'''
+import cProfile
+
+import pytest
+
+import db
+import metrics
+
+
+def test_histogram_is_cumulative():
+    histogram = metrics.Histogram((0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(('feed', 'GET'), value)
+    lines = list(histogram.lines('lat', ('endpoint', 'method')))
+    assert lines == [
+        'lat_bucket{endpoint="feed",method="GET",le="0.1"} 2',
+        'lat_bucket{endpoint="feed",method="GET",le="1.0"} 3',
+        'lat_bucket{endpoint="feed",method="GET",le="+Inf"} 4',
+        'lat_sum{endpoint="feed",method="GET"} 3.650000',
+        'lat_count{endpoint="feed",method="GET"} 4',
+    ]
+
+
+def test_metrics_counts_requests_and_sql(client, monkeypatch):
+    monkeypatch.setattr(metrics, 'registry', metrics.Registry())
+    client.get('/feed')
+    body = client.get('/metrics').get_data(as_text=True)
+    assert 'flavinho_request_duration_seconds_count{endpoint="feed.feed",method="GET"} 1' in body
+    sql_count = [line for line in body.splitlines()
+                 if line.startswith('flavinho_request_sql_statements_sum{endpoint="feed.feed"')]
+    assert sql_count and float(sql_count[0].split()[-1]) > 0
+
+
+@pytest.mark.parametrize('environ, headers, status', [
+    ({'REMOTE_ADDR': '127.0.0.1'}, {}, 200),
+    ({'REMOTE_ADDR': '10.0.0.5'}, {}, 404),
+    ({'REMOTE_ADDR': '127.0.0.1'}, {'X-Forwarded-For': '203.0.113.9'}, 404),
+])
+def test_metrics_local_only_without_token(app, monkeypatch, environ, headers, status):
+    monkeypatch.setattr(metrics, 'TOKEN', None)
+    client = app.test_client()
+    assert client.get('/metrics', environ_base=environ, headers=headers).status_code == status
+    assert client.get('/metrics/slow', environ_base=environ, headers=headers).status_code == status
+
+
+def test_metrics_token(app, monkeypatch):
+    monkeypatch.setattr(metrics, 'TOKEN', 's3gredo')
+    client = app.test_client()
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer errado'}).status_code == 401
+    remote = {'REMOTE_ADDR': '10.0.0.5'}
+    assert client.get('/metrics', headers={'Authorization': 'Bearer s3gredo'}, environ_base=remote).status_code == 200
+
+
+def test_slow_requests_keep_the_slowest(tmp_path):
+    slow = metrics.SlowRequests(keep=2, directory=str(tmp_path))
+    for elapsed in (0.3, 0.1, 0.5, 0.2):
+        profiler = cProfile.Profile()
+        profiler.enable()
+        sum(range(100))
+        profiler.disable()
+        slow.offer(profiler, elapsed, {'endpoint': f'e{elapsed}'})
+    listing = slow.listing()
+    assert [info['endpoint'] for info in listing] == ['e0.5', 'e0.3']
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(info['file'] for info in listing)
+
+
+def test_sql_fetch_timing_is_opt_in(app):
+    calls = []
+
+    def observer(seconds, statements):
+        calls.append(statements)
+
+    db.set_sql_observer(observer)
+    conn = db.get_db_connection()
+    try:
+        assert type(conn.cursor()) is db.TimedCursor
+        calls.clear()  # PRAGMAs da conexão
+        rows = list(conn.execute('SELECT 1 UNION ALL SELECT 2'))
+        assert len(rows) == 2 and calls == [1]
+        db.set_sql_observer(observer, fetch=True)
+        calls.clear()
+        list(conn.execute('SELECT 1 UNION ALL SELECT 2'))
+        assert calls[0] == 1 and len(calls) == 4  # execute + 2 linhas + StopIteration
+    finally:
+        conn.close()
+        db.set_sql_observer(metrics._observe_sql)
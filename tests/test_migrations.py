@@ -0,0 +1,62 @@
+'''
+Migrações versionadas: migrate_db.py em banco novo, versão a versão, e o runner.
+'''
+import os
+import sys
+import sqlite3
+import subprocess
+
+import pytest
+
+import db
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize('target', [m['version'] for m in db.MIGRATIONS])
+def test_migrate_db_check_on_fresh_db(tmp_path, target):
+    env = dict(os.environ, DATABASE_PATH=str(tmp_path / 'novo.db'))
+    result = subprocess.run([sys.executable, os.path.join(ROOT, 'migrate_db.py'), '--target', str(target), '--check'],
+                            cwd=ROOT, env=env, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert f'Versão atual: {target} ' in result.stdout
+    assert 'FALHOU' not in result.stdout
+
+
+def _fresh_schema(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DB_PATH', str(tmp_path / 'database.db'))
+    conn = db.get_db_connection()
+    db.create_base_schema(conn)
+    return conn
+
+
+def test_run_migrations_is_idempotent(tmp_path, monkeypatch):
+    conn = _fresh_schema(tmp_path, monkeypatch)
+    try:
+        assert db.run_migrations(conn, target=3) == [1, 2, 3]
+        assert db.get_schema_version(conn) == 3
+        assert db.run_migrations(conn) == [m['version'] for m in db.MIGRATIONS[3:]]
+        assert db.run_migrations(conn) == []
+        assert db.get_schema_version(conn) == db.SCHEMA_VERSION
+        indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert {'idx_posts_created_at', 'idx_comments_post_created', 'idx_scores_game_user'} <= indexes
+        for migration in db.MIGRATIONS:
+            assert all(ok for _, ok, _ in db.check_query_plans(conn, migration))
+    finally:
+        conn.close()
+        db.close_pool()
+
+
+def test_failed_migration_rolls_back(tmp_path, monkeypatch):
+    conn = _fresh_schema(tmp_path, monkeypatch)
+    broken = {'version': db.SCHEMA_VERSION + 1, 'description': 'quebrada', 'checks': [],
+              'statements': ['CREATE TABLE meia_migracao (id INTEGER)', 'SELECT * FROM tabela_que_nao_existe']}
+    monkeypatch.setattr(db, 'MIGRATIONS', db.MIGRATIONS + [broken])
+    try:
+        with pytest.raises(sqlite3.OperationalError):
+            db.run_migrations(conn, target=broken['version'])
+        assert db.get_schema_version(conn) == db.SCHEMA_VERSION
+        assert conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'meia_migracao'").fetchone() is None
+    finally:
+        conn.close()
+        db.close_pool()
@@ -0,0 +1,89 @@
+'''
+Hash de senhas: pool limitado, rehash no login e cache negativo de identificadores.
+'''
+import threading
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+import db
+import passwords
+from executors import LazyExecutor
+
+
+def _set_password(password_hash):
+    conn = db.get_db_connection()
+    with conn:
+        conn.execute('UPDATE users SET password_hash = ? WHERE id = 1', (password_hash,))
+    conn.close()
+
+
+def _stored_hash():
+    conn = db.get_db_connection()
+    password_hash = conn.execute('SELECT password_hash FROM users WHERE id = 1').fetchone()[0]
+    conn.close()
+    return password_hash
+
+
+def _login(app, password):
+    return app.test_client().post('/login', data={'identifier': 'ana', 'password': password})
+
+
+def test_login_rehashes_outdated_hash(app):
+    old = generate_password_hash('segredo', 'pbkdf2:sha256:1000')
+    _set_password(old)
+    assert passwords.needs_rehash(old)
+    assert _login(app, 'errada').status_code == 200
+    assert _stored_hash() == old
+    assert _login(app, 'segredo').status_code == 302
+    new = _stored_hash()
+    assert new != old and not passwords.needs_rehash(new)
+    assert passwords.verify_password(new, 'segredo')
+
+
+def test_full_queue_answers_429(app, monkeypatch):
+    _set_password(passwords.hash_password('segredo'))
+    monkeypatch.setattr(passwords, '_slots', threading.BoundedSemaphore(1))
+    passwords._slots.acquire()  # um hash em andamento ocupa a única vaga
+    rejected = passwords.stats['rejected']
+    assert _login(app, 'segredo').status_code == 429
+    assert passwords.stats['rejected'] == rejected + 1
+    passwords._slots.release()
+    assert _login(app, 'segredo').status_code == 302
+
+
+def test_hashing_runs_in_process_pool(monkeypatch):
+    monkeypatch.setattr(passwords, 'WORKERS', 1)
+    monkeypatch.setattr(passwords, '_pool', LazyExecutor(passwords._pool._factory))
+    try:
+        password_hash = passwords.hash_password('segredo')
+        assert passwords.verify_password(password_hash, 'segredo')
+        assert not passwords.verify_password(password_hash, 'outra')
+    finally:
+        passwords._pool.shutdown()
+
+
+def test_negative_cache(app, monkeypatch):
+    monkeypatch.setattr(passwords, 'NEGATIVE_THRESHOLD', 2)
+    for _ in range(2):
+        assert not passwords.known_missing('fantasma')
+        app.test_client().post('/login', data={'identifier': 'fantasma', 'password': 'x'})
+    assert passwords.known_missing('fantasma')
+    passwords.forget_missing('fantasma')
+    assert not passwords.known_missing('fantasma')
+
+
+def test_negative_cache_expires(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(passwords.time, 'monotonic', lambda: now[0])
+    monkeypatch.setattr(passwords, 'NEGATIVE_THRESHOLD', 1)
+    passwords.remember_missing('sumido')
+    assert passwords.known_missing('sumido')
+    now[0] += passwords.NEGATIVE_TTL + 1
+    assert not passwords.known_missing('sumido')
+
+
+@pytest.mark.parametrize('method, outdated', [(passwords.METHOD, False), ('pbkdf2:sha256', True),
+                                               ('scrypt:16384:8:1', True)])
+def test_needs_rehash(method, outdated):
+    assert passwords.needs_rehash(generate_password_hash('x', method)) == outdated
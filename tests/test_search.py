@@ -0,0 +1,77 @@
+'''
+Busca FTS5: triggers de sincronia, expressão MATCH segura e a API /api/buscar.
+'''
+import pytest
+
+import db
+from routes import search
+
+
+def _search(kind, query, **kwargs):
+    conn = db.get_db_connection()
+    results, has_more = search.search(conn, kind, query, **kwargs)
+    conn.close()
+    return results, has_more
+
+
+def _post(conn, content):
+    return conn.execute('INSERT INTO posts (user_id, content) VALUES (1, ?)', (content,)).lastrowid
+
+
+@pytest.mark.parametrize('query, match', [
+    ('Café com pão', '"Café" "com" "pão"'),
+    ('mag*', '"mag"*'),
+    ('a* "x" OR NEAR(y)', '"a" "x" "OR" "NEAR" "y"'),
+    ('  -- ', None),
+])
+def test_build_match_quotes_every_term(query, match):
+    assert search.build_match(query) == match
+
+
+def test_triggers_keep_index_in_sync(app):
+    conn = db.get_db_connection()
+    with conn:
+        post_id = _post(conn, 'Receita de pão de queijo')
+        other = _post(conn, 'Jogo de xadrez')
+        conn.execute('INSERT INTO comments (post_id, user_id, content) VALUES (?, 1, ?)', (other, 'Que pão bonito'))
+    assert [r['id'] for r in _search('posts', 'pao')[0]] == [post_id]  # remove_diacritics
+    assert [r['post_id'] for r in _search('comentarios', 'PÃO')[0]] == [other]
+    with conn:
+        conn.execute('UPDATE posts SET content = ? WHERE id = ?', ('Receita de bolo', post_id))
+    assert _search('posts', 'pão')[0] == []
+    assert [r['id'] for r in _search('posts', 'bolo')[0]] == [post_id]
+    with conn:
+        conn.execute('DELETE FROM posts WHERE id = ?', (post_id,))
+    assert _search('posts', 'bolo')[0] == []
+    with conn:
+        conn.execute("UPDATE users SET display_name = 'Ana Maria', city = 'Recife' WHERE id = 1")
+    assert [r['username'] for r in _search('usuarios', 'recife')[0]] == ['ana']
+    conn.close()
+
+
+def test_snippet_escapes_html_and_marks_terms(app):
+    conn = db.get_db_connection()
+    with conn:
+        _post(conn, '<script>alert(1)</script> xadrez')
+    conn.close()
+    snippet = str(_search('posts', 'xadrez')[0][0]['snippet'])
+    assert '<script>' not in snippet and '&lt;script&gt;' in snippet
+    assert '<mark>xadrez</mark>' in snippet
+
+
+def test_prefix_search_and_pagination(app):
+    conn = db.get_db_connection()
+    with conn:
+        for i in range(5):
+            _post(conn, f'magia número {i}')
+    conn.close()
+    first, more = _search('posts', 'mag*', limit=3)
+    second, last_more = _search('posts', 'mag*', page=2, limit=3)
+    assert len(first) == 3 and more and len(second) == 2 and not last_more
+    assert not {r['id'] for r in first} & {r['id'] for r in second}
+
+
+def test_api_search(client):
+    client.post('/api/posts', json={'content': 'Torneio de xadrez amanhã'})
+    data = client.get('/api/buscar?q=xadrez').get_json()
+    assert len(data['results']) == 1 and '<mark>xadrez</mark>' in data['results'][0]['snippet']
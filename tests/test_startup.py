@@ -0,0 +1,43 @@
+'''
+Inicialização: create_app, imports sob demanda e init_db sem DDL em schema atual.
+'''
+import os
+import sys
+import subprocess
+
+import db
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_app_defers_heavy_modules(tmp_path):
+    code = "import sys, app; print(' '.join(m for m in ('requests', 'PIL', 'ia_client') if m in sys.modules))"
+    env = dict(os.environ, DATABASE_PATH=str(tmp_path / 'database.db'))
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env, capture_output=True, text=True,
+                            timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == ''
+
+
+def test_create_app_builds_independent_apps(app):
+    import app as app_module
+    other = app_module.create_app({'TESTING': True, 'FEED_PAGE_SIZE': 5})
+    assert other is not app and other.config['FEED_PAGE_SIZE'] == 5
+    assert app.config['FEED_PAGE_SIZE'] == int(os.environ.get('FEED_PAGE_SIZE', 20))
+    assert {'auth', 'feed', 'games', 'ia', 'search', 'live', 'api'} <= set(other.blueprints)
+    assert other.test_client().get('/login').status_code == 200
+
+
+def test_init_db_skips_ddl_when_schema_is_current(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DB_PATH', str(tmp_path / 'database.db'))
+    calls = []
+    for name in ('create_base_schema', 'run_migrations'):
+        original = getattr(db, name)
+        monkeypatch.setattr(db, name, lambda conn, *args, _f=original, _n=name: calls.append(_n) or _f(conn, *args))
+    db.init_db()
+    assert calls == ['create_base_schema', 'run_migrations']
+    db.init_db()
+    assert calls == ['create_base_schema', 'run_migrations']
+    conn = db.get_db_connection()
+    assert db.get_schema_version(conn) == db.SCHEMA_VERSION
+    conn.close()
@@ -0,0 +1,76 @@
+'''
+Timeline "Seguindo": fan-out na escrita, fan-out na leitura acima do limite e paginação.
+'''
+import db
+import timeline
+from db import decode_cursor
+
+
+def _users(conn, *names):
+    return [conn.execute("INSERT INTO users (username, email, password_hash) VALUES (?, ?, 'x')",
+                         (name, f'{name}@teste')).lastrowid for name in names]
+
+
+def _post(conn, user_id, created_at):
+    return conn.execute('INSERT INTO posts (user_id, content, created_at) VALUES (?, ?, ?)',
+                        (user_id, f'post de {user_id}', created_at)).lastrowid
+
+
+def _read_all(conn, user_id, limit):
+    pages, before = [], None
+    while True:
+        entries, next_cursor = timeline.read_timeline(conn, user_id, before, limit)
+        pages.append([post_id for post_id, _ in entries])
+        if next_cursor is None:
+            return pages
+        before = decode_cursor(next_cursor)
+
+
+def test_fan_out_follow_and_unfollow(app):
+    conn = db.get_db_connection()
+    with conn:
+        bia, caio = _users(conn, 'bia', 'caio')
+        old = _post(conn, bia, '2026-01-01 10:00:00')
+        assert timeline.follow(conn, 1, bia)
+        assert not timeline.follow(conn, 1, bia) and not timeline.follow(conn, 1, 1)
+        timeline.follow(conn, caio, bia)
+        new = _post(conn, bia, '2026-01-02 10:00:00')
+    assert timeline.fan_out(new) == 3  # autor e dois seguidores
+    assert timeline.read_timeline(conn, 1)[0] == [(new, '2026-01-02 10:00:00'), (old, '2026-01-01 10:00:00')]
+    assert (timeline.follower_count(conn, bia), timeline.following_count(conn, 1)) == (2, 1)
+    with conn:
+        assert timeline.unfollow(conn, 1, bia)
+    assert timeline.read_timeline(conn, 1) == ([], None)
+    assert [post_id for post_id, _ in timeline.read_timeline(conn, bia)[0]] == [new]
+    conn.close()
+
+
+def test_pagination_with_equal_timestamps(app):
+    conn = db.get_db_connection()
+    with conn:
+        (bia,) = _users(conn, 'bia')
+        timeline.follow(conn, 1, bia)
+        posts = [_post(conn, bia, '2026-01-01 10:00:00') for _ in range(5)]
+    for post_id in posts:
+        timeline.fan_out(post_id)
+    pages = _read_all(conn, 1, limit=2)
+    assert pages == [posts[:2:-1], posts[2:0:-1], posts[:1]]
+    conn.close()
+
+
+def test_authors_over_threshold_are_read_on_demand(app, monkeypatch):
+    conn = db.get_db_connection()
+    with conn:
+        bia, star = _users(conn, 'bia', 'estrela')
+        timeline.follow(conn, 1, bia)
+        timeline.follow(conn, 1, star)
+        timeline.follow(conn, bia, star)
+    monkeypatch.setattr(timeline, 'FANOUT_THRESHOLD', 1)
+    with conn:
+        posts = [_post(conn, author, f'2026-01-01 10:00:0{i}') for i, author in enumerate([bia, star, bia, star])]
+    for post_id in posts:
+        timeline.fan_out(post_id)
+    copied = conn.execute('SELECT post_id FROM timeline WHERE user_id = 1 ORDER BY post_id').fetchall()
+    assert [row[0] for row in copied] == [posts[0], posts[2]]
+    assert _read_all(conn, 1, limit=3) == [posts[:0:-1], posts[:1]]
+    conn.close()
@@ -0,0 +1,158 @@
+'''
+Seguidores e timeline pessoal ("Seguindo") com fan-out na escrita.
+
+Quando alguém posta, um worker em segundo plano copia (usuário, post,
+created_at) para a tabela timeline de cada seguidor e do próprio autor, e a
+leitura da timeline vira uma única varredura de faixa na chave primária.
+Contas com mais de FANOUT_THRESHOLD seguidores não são copiadas: seus posts
+são buscados na leitura (fan-out na leitura, pelo índice posts(user_id,
+created_at)) e intercalados com a timeline materializada.
+'''
+import os
+import heapq
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import db
+from db import encode_cursor
+from executors import LazyExecutor
+
+logger = logging.getLogger(__name__)
+
+FANOUT_THRESHOLD = int(os.environ.get('TIMELINE_FANOUT_THRESHOLD', 5000))
+BACKFILL = int(os.environ.get('TIMELINE_BACKFILL', 50))  # posts copiados ao começar a seguir
+
+TIMELINE_PAGE_SQL = (
+    'SELECT post_id, created_at FROM timeline WHERE user_id = ? AND (created_at, post_id) < (?, ?) '
+    'ORDER BY created_at DESC, post_id DESC LIMIT ?'
+)
+AUTHOR_PAGE_SQL = (
+    'SELECT id AS post_id, created_at FROM posts WHERE user_id = ? AND (created_at, id) < (?, ?) '
+    'ORDER BY created_at DESC, id DESC LIMIT ?'
+)
+# Cursor inicial: maior que qualquer (created_at, id) gravado
+_NEWEST = ('9999-12-31 23:59:59', 0)
+
+# Um único worker: as cópias saem em ordem e não disputam o lock de escrita
+_pool = LazyExecutor(lambda: ThreadPoolExecutor(max_workers=1, thread_name_prefix='timeline'))
+
+
+def follower_count(conn, user_id):
+    row = conn.execute('SELECT followers FROM follow_counts WHERE user_id = ?', (user_id,)).fetchone()
+    return row['followers'] if row else 0
+
+
+def following_count(conn, user_id):
+    return conn.execute('SELECT COUNT(*) FROM follows WHERE follower_id = ?', (user_id,)).fetchone()[0]
+
+
+def is_following(conn, follower_id, followee_id):
+    return conn.execute('SELECT 1 FROM follows WHERE follower_id = ? AND followee_id = ?',
+                        (follower_id, followee_id)).fetchone() is not None
+
+
+def follow(conn, follower_id, followee_id):
+    """Passa a seguir e copia os posts recentes do seguido para a timeline (sem commit).
+
+    Retorna False se já seguia (ou se for a própria conta).
+    """
+    if follower_id == followee_id:
+        return False
+    added = conn.execute('INSERT OR IGNORE INTO follows (follower_id, followee_id) VALUES (?, ?)',
+                         (follower_id, followee_id)).rowcount
+    if added and follower_count(conn, followee_id) <= FANOUT_THRESHOLD:
+        conn.execute(
+            'INSERT OR IGNORE INTO timeline (user_id, post_id, created_at) '
+            'SELECT ?, id, created_at FROM posts WHERE user_id = ? ORDER BY created_at DESC, id DESC LIMIT ?',
+            (follower_id, followee_id, BACKFILL)
+        )
+    return bool(added)
+
+
+def unfollow(conn, follower_id, followee_id):
+    """Deixa de seguir e tira os posts do seguido da timeline (sem commit)."""
+    removed = conn.execute('DELETE FROM follows WHERE follower_id = ? AND followee_id = ?',
+                           (follower_id, followee_id)).rowcount
+    if removed:
+        conn.execute('DELETE FROM timeline WHERE user_id = ? AND post_id IN (SELECT id FROM posts WHERE user_id = ?)',
+                     (follower_id, followee_id))
+    return bool(removed)
+
+
+def add_own_post(conn, post_id):
+    """Põe o post na timeline do próprio autor, na transação do INSERT (sem commit)."""
+    conn.execute('INSERT OR IGNORE INTO timeline (user_id, post_id, created_at) '
+                 'SELECT user_id, id, created_at FROM posts WHERE id = ?', (post_id,))
+
+
+def fan_out(post_id):
+    """Copia o post para a timeline do autor e, se ele não for "celebridade", dos seguidores."""
+    conn = db.get_db_connection()
+    try:
+        with conn:
+            post = conn.execute('SELECT user_id, created_at FROM posts WHERE id = ?', (post_id,)).fetchone()
+            if post is None:
+                return 0
+            conn.execute('INSERT OR IGNORE INTO timeline (user_id, post_id, created_at) VALUES (?, ?, ?)',
+                         (post['user_id'], post_id, post['created_at']))
+            if follower_count(conn, post['user_id']) > FANOUT_THRESHOLD:
+                return 1
+            copied = conn.execute(
+                'INSERT OR IGNORE INTO timeline (user_id, post_id, created_at) '
+                'SELECT follower_id, ?, ? FROM follows WHERE followee_id = ?',
+                (post_id, post['created_at'], post['user_id'])
+            ).rowcount
+        return copied + 1
+    finally:
+        conn.close()
+
+
+def read_timeline(conn, user_id, before=None, limit=20):
+    """Retorna ([(post_id, created_at)], next_cursor) da timeline, do mais novo para o mais antigo.
+
+    A parte materializada é uma varredura na chave primária; os autores
+    seguidos acima de FANOUT_THRESHOLD entram por uma varredura cada no
+    índice de posts por autor, e tudo é intercalado por (created_at, id).
+    """
+    cursor = tuple(before) if before else _NEWEST
+    sources = [conn.execute(TIMELINE_PAGE_SQL, (user_id, *cursor, limit + 1)).fetchall()]
+    pulled = conn.execute(
+        'SELECT f.followee_id FROM follows f JOIN follow_counts c ON c.user_id = f.followee_id '
+        'WHERE f.follower_id = ? AND c.followers > ?',
+        (user_id, FANOUT_THRESHOLD)
+    ).fetchall()
+    for row in pulled:
+        sources.append(conn.execute(AUTHOR_PAGE_SQL, (row['followee_id'], *cursor, limit + 1)).fetchall())
+    entries = []
+    seen = set()
+    if len(sources) == 1:
+        merged = sources[0]
+    else:
+        merged = heapq.merge(*sources, key=lambda r: (r['created_at'], r['post_id']), reverse=True)
+    for row in merged:
+        if row['post_id'] in seen:
+            continue  # post copiado antes de o autor passar do limite
+        seen.add(row['post_id'])
+        entries.append((row['post_id'], row['created_at']))
+        if len(entries) > limit:
+            break
+    next_cursor = None
+    if len(entries) > limit:
+        entries = entries[:limit]
+        next_cursor = encode_cursor(entries[-1][1], entries[-1][0])
+    return entries, next_cursor
+
+
+def _run(post_id):
+    try:
+        fan_out(post_id)
+    except Exception:
+        logger.exception("Timeline fan-out failed for post_id=%s", post_id)
+
+
+def submit_fan_out(post_id):
+    """Agenda a cópia de um post recém-criado para as timelines."""
+    return _pool.submit(_run, post_id)
+
+
+shutdown = _pool.shutdown